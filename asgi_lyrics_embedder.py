@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Asynchronous serving mode for the web interface.
+
+Exposes the Flask application as an ASGI app. The ``/stream`` endpoint is
+served natively as a coroutine, so an idle SSE viewer costs a small listener
+object instead of a blocked thread. Every other route (``/``, ``/process``,
+static files) is bridged to the Flask WSGI app and runs on a bounded thread
+pool, which keeps the blocking upload, tag I/O and scraping work off the event
+loop. Routes and SSE event names are the same as in the threaded server.
+
+Usage:
+    uvicorn asgi_lyrics_embedder:app --host 0.0.0.0 --port 5000
+    python asgi_lyrics_embedder.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+from web_lyrics_embedder import app as flask_app, announcer, workspace, HEARTBEAT_INTERVAL, parse_last_event_id
+from message_announcer import DEFAULT_CHANNEL, format_heartbeat, is_valid_channel_id
+from metrics import SSE_DELIVERY_SECONDS
+import parse_pool
+from tracing import configure_logging
+
+# Threads available to the bridged Flask routes (uploads, processing jobs)
+WSGI_THREADS = int(os.environ.get('LYRICS_WSGI_THREADS', '32'))
+
+class _RequestBody:
+    """File-like wsgi.input that pulls the ASGI request body on demand.
+
+    Runs in a worker thread; each chunk is awaited on the event loop, so large
+    uploads are streamed to Flask instead of being buffered up front.
+    """
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = bytearray()
+        self._more_body = True
+
+    def _fill(self) -> bool:
+        if not self._more_body:
+            return False
+        message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+        if message['type'] == 'http.disconnect':
+            self._more_body = False
+            return False
+        self._buffer.extend(message.get('body', b''))
+        self._more_body = message.get('more_body', False)
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            while self._fill():
+                pass
+            size = len(self._buffer)
+        while len(self._buffer) < size and self._fill():
+            pass
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readline(self, size=-1):
+        while b'\n' not in self._buffer and (size < 0 or len(self._buffer) < size) and self._fill():
+            pass
+        end = self._buffer.find(b'\n') + 1 or len(self._buffer)
+        if size >= 0:
+            end = min(end, size)
+        data = bytes(self._buffer[:end])
+        del self._buffer[:end]
+        return data
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+def build_environ(scope, body) -> dict:
+    """Translate an ASGI HTTP scope into a WSGI environ."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin1').upper().replace('-', '_')
+        value = raw_value.decode('latin1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+class LyricsEmbedderASGI:
+    """ASGI entry point: native SSE streaming plus a thread-pool bridge to Flask."""
+
+    def __init__(self, wsgi_app, max_threads=WSGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'] == '/stream' and scope['method'] == 'GET':
+            await self.stream(scope, receive, send)
+        elif scope['type'] == 'http':
+            await self.call_wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                configure_logging()
+                workspace.start_cleanup()
+                # Here rather than under __main__, so that `uvicorn asgi_lyrics_embedder:app` starts it too
+                parse_pool.configure(flask_app.config['PARSE_PROCESSES'])
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                parse_pool.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def stream(self, scope, receive, send):
+        """Serve /stream?job=<id> as a coroutine."""
+        query = parse_qs(scope.get('query_string', b'').decode('latin1'))
+        channel_id = query.get('job', [DEFAULT_CHANNEL])[0]
+        if not is_valid_channel_id(channel_id):
+            await self._send_simple(send, 400, b'{"success": false, "error": "Invalid job id"}', b'application/json')
+            return
+        headers = dict(scope.get('headers', []))
+        last_event_id = parse_last_event_id(
+            headers.get(b'last-event-id', b'').decode('latin1') or query.get('last_event_id', [None])[0])
+
+        listener = announcer.listen_async(channel_id, last_event_id)
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    disconnected.set()
+                    listener.close()
+                    return
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream; charset=utf-8'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                ],
+            })
+            await send({'type': 'http.response.body', 'body': f'retry: {HEARTBEAT_INTERVAL * 1000}\n\n'.encode(), 'more_body': True})
+            while not listener.closed and not disconnected.is_set():
+                event = await listener.get_async(timeout=HEARTBEAT_INTERVAL)
+                if event is None:
+                    chunk = format_heartbeat()
+                else:
+                    SSE_DELIVERY_SECONDS.observe(time.monotonic() - event.published)
+                    chunk = event.encode()
+                if listener.closed:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            if not disconnected.is_set():
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        except OSError:
+            pass
+        finally:
+            watcher.cancel()
+            announcer.unlisten(listener)
+
+    async def _send_simple(self, send, status, body, content_type):
+        await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', content_type)]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def call_wsgi(self, scope, receive, send):
+        """Run a Flask request on the thread pool, streaming its response back."""
+        loop = asyncio.get_running_loop()
+        environ = build_environ(scope, _RequestBody(receive, loop))
+        await loop.run_in_executor(self.executor, self._run_wsgi, environ, send, loop)
+
+    def _run_wsgi(self, environ, send, loop):
+        response = {'started': False}
+
+        def send_sync(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def send_body(data, more_body=True):
+            if not response['started']:
+                status, headers = response['status'], response['headers']
+                send_sync({
+                    'type': 'http.response.start',
+                    'status': int(status.split(' ', 1)[0]),
+                    'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers],
+                })
+                response['started'] = True
+            if data or not more_body:
+                send_sync({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+        def start_response(status, headers, exc_info=None):
+            response['status'], response['headers'] = status, headers
+            return send_body
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                send_body(chunk)
+            send_body(b'', more_body=False)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+app = LyricsEmbedderASGI(flask_app)
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        print("The asynchronous server requires uvicorn: pip install uvicorn")
+        sys.exit(1)
+    print("Starting Lyrics Embedder server (ASGI)...")
+    uvicorn.run(app, host='0.0.0.0', port=5000)
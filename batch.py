@@ -0,0 +1,245 @@
+"""
+Batch processing of several albums.
+
+A manifest maps album URLs to audio files or folders, either as CSV
+(``url,path`` rows, one file or folder per row) or as JSON lines
+(``{"url": ..., "paths": [...]}``). Albums run concurrently under one global
+budget: network requests share one semaphore and tag reads/writes another.
+Each album runs as an AlbumPipeline, so its lyrics are embedded while its
+next tracks are fetched. The result is a per-album and per-track report that
+can be saved as JSON. With a journal, a restarted run skips the scans, fetches and
+embeds that already finished. With an album deadline, the tracks of an album
+still unfetched when its time budget runs out are reported as ``timeout``.
+"""
+
+import contextvars
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from providers.factory import ProviderFactory
+from providers.http import deadline
+from utilities import get_track_number
+from journal import Journal
+from pipeline import AlbumPipeline
+from tracing import get_logger, span
+
+AUDIO_EXTENSIONS = ('.mp3', '.m4a')
+
+log = get_logger('batch')
+
+class ManifestError(ValueError):
+    """Raised when a manifest cannot be read."""
+
+@dataclass
+class BatchItem:
+    """One album of a batch and the audio files or folders that belong to it."""
+    url: str
+    paths: List[str] = field(default_factory=list)
+
+def expand_paths(paths: List[str]) -> List[str]:
+    """Expand folders into the audio files they contain, keeping the order stable."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.lower().endswith(AUDIO_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+def _add(items: Dict[str, BatchItem], url: str, paths: List[str], base_dir: str) -> None:
+    url = (url or '').strip()
+    if not url:
+        raise ManifestError('Manifest entry without an album URL')
+    item = items.setdefault(url, BatchItem(url))
+    item.paths.extend(os.path.join(base_dir, str(path).strip()) for path in paths if str(path).strip())
+
+def load_manifest(path: str) -> List[BatchItem]:
+    """Read a CSV or JSONL manifest; relative paths are resolved from its folder.
+
+    Rows with the same URL are merged into one album.
+
+    Raises:
+        ManifestError: If the manifest is malformed
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    items: Dict[str, BatchItem] = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith(('.jsonl', '.json')):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ManifestError(f'Line {line_number}: {e}')
+                if not isinstance(entry, dict):
+                    raise ManifestError(f'Line {line_number}: expected an object')
+                paths = entry.get('paths') or []
+                if isinstance(paths, str):
+                    paths = [paths]
+                for key in ('path', 'folder'):
+                    if entry.get(key):
+                        paths.append(entry[key])
+                _add(items, entry.get('url'), paths, base_dir)
+        else:
+            reader = csv.DictReader(f)
+            if not reader.fieldnames or 'url' not in reader.fieldnames or 'path' not in reader.fieldnames:
+                raise ManifestError('CSV manifests need a header with url and path columns')
+            for row in reader:
+                _add(items, row.get('url'), [row.get('path') or ''], base_dir)
+    return list(items.values())
+
+class _Throttled:
+    """A provider whose requests take a slot of the batch's shared network budget."""
+
+    def __init__(self, provider, network: threading.BoundedSemaphore):
+        self.provider = provider
+        self.network = network
+
+    @property
+    def name(self) -> str:
+        return self.provider.name
+
+    def get_track_info_without_lyrics_list_from_album(self, album_url: str):
+        with self.network:
+            return self.provider.get_track_info_without_lyrics_list_from_album(album_url)
+
+    def get_track_info(self, track_url: str, track_number: int):
+        with self.network:
+            return self.provider.get_track_info(track_url, track_number)
+
+class BatchRunner:
+    """Process albums concurrently under a shared network and disk budget.
+
+    Every album runs as an AlbumPipeline whose provider requests and tag
+    writes take slots of the shared budgets, and the pipeline's events become
+    the rows of the album report.
+
+    Args:
+        network_concurrency: Provider requests in flight across all albums
+        disk_concurrency: Tag reads and writes in flight across all albums
+        album_concurrency: Albums being scraped at the same time
+        on_album: Called with each album report as soon as it is finished
+        journal: Steps recorded by an earlier run are skipped, new ones recorded
+        album_deadline: Seconds an album may spend scraping before its
+            remaining tracks time out; unlimited by default
+    """
+
+    def __init__(self, network_concurrency: int = 4, disk_concurrency: int = 2, album_concurrency: int = 2,
+                 on_album: Optional[Callable[[dict], None]] = None, journal: Optional[Journal] = None,
+                 album_deadline: Optional[float] = None):
+        self.journal = journal or Journal(None)
+        self.network = threading.BoundedSemaphore(network_concurrency)
+        self.disk = threading.BoundedSemaphore(disk_concurrency)
+        self.network_concurrency = network_concurrency
+        self.album_concurrency = album_concurrency
+        self.on_album = on_album
+        self.album_deadline = album_deadline
+
+    def run(self, items: List[BatchItem]) -> dict:
+        """Process every album and return the report."""
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.album_concurrency, thread_name_prefix='batch-album') as albums:
+            futures = [albums.submit(contextvars.copy_context().run, self._process_album, item)
+                       for item in items]
+            reports = [future.result() for future in futures]
+        tracks = [track for report in reports for track in report['tracks']]
+        return {
+            'albums': reports,
+            'summary': {
+                'albums': len(reports),
+                'albums_succeeded': sum(1 for report in reports if report['status'] == 'success'),
+                'tracks': len(tracks),
+                'tracks_embedded': sum(1 for track in tracks if track['status'] == 'embedded'),
+                'tracks_timed_out': sum(1 for track in tracks if track['status'] == 'timeout'),
+                'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+            },
+        }
+
+    def _process_album(self, item: BatchItem) -> dict:
+        start = time.perf_counter()
+        report = {'url': item.url, 'provider': None, 'status': 'error', 'message': '', 'tracks': []}
+        try:
+            with deadline(self.album_deadline), span('album', url=item.url):
+                self._scrape_and_embed(item, report)
+        except Exception as e:
+            log.exception('Album failed', url=item.url)
+            report['message'] = str(e)
+        report['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        if self.on_album:
+            self.on_album(report)
+        return report
+
+    def _scrape_and_embed(self, item: BatchItem, report: dict) -> None:
+        provider = ProviderFactory.get_provider_for_url(item.url)
+        if not provider:
+            report['message'] = 'Unsupported URL'
+            return
+        report['provider'] = provider.name
+
+        files = {}
+        for path in expand_paths(item.paths):
+            with self.disk:
+                track_number = self.journal.track_number(path, get_track_number) if os.path.isfile(path) else None
+            if track_number is None:
+                report['tracks'].append(self._track(path, None, 'no_track_number',
+                                                    'File does not have a track number in its metadata'))
+            else:
+                files[track_number] = {'path': path, 'filename': os.path.basename(path),
+                                       'size': os.path.getsize(path)}
+        if not files:
+            report['message'] = 'No tracks with valid track numbers were found'
+            return
+
+        def on_event(name: str, data: dict) -> None:
+            if name == 'fetched' and data['info'] is None:
+                track = data['track']
+                status, message = ('timeout', 'Album time budget exceeded') if data['timed_out'] else \
+                    ('no_lyrics', 'No lyrics found')
+                report['tracks'].append(self._track(files[track.track_number]['path'], track.track_number,
+                                                    status, message, track))
+            elif name == 'embedded':
+                info = data['info']
+                status, message = ('embedded', 'Lyrics successfully embedded') if data['success'] else \
+                    ('error', 'Failed to embed lyrics')
+                report['tracks'].append(self._track(data['file']['path'], info.track_number, status, message, info))
+
+        pipeline = AlbumPipeline(_Throttled(provider, self.network), on_event=on_event,
+                                 fetch_workers=self.network_concurrency, journal=self.journal, disk=self.disk)
+        result = pipeline.run(item.url, files)
+        if not result.album_tracks:
+            report['message'] = 'No tracks found for this album URL'
+            return
+        matched = {track.track_number for track in result.matched}
+        for track_number, file_info in files.items():
+            if track_number not in matched:
+                report['tracks'].append(self._track(file_info['path'], track_number, 'not_in_album',
+                                                    'Track not found in album'))
+
+        report['tracks'].sort(key=lambda track: (track['track_number'] is None, track['track_number'] or 0))
+        embedded = sum(1 for track in report['tracks'] if track['status'] == 'embedded')
+        report['status'] = 'success' if embedded else 'error'
+        report['message'] = f'Embedded lyrics in {embedded} of {len(report["tracks"])} files'
+
+    @staticmethod
+    def _track(path: str, track_number: Optional[int], status: str, message: str, track_info=None) -> dict:
+        return {
+            'file': path,
+            'track_number': track_number,
+            'title': track_info.title if track_info else None,
+            'artist': track_info.artist if track_info else None,
+            'url': track_info.url if track_info else None,
+            'status': status,
+            'message': message,
+        }
+
+def save_report(report: dict, path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
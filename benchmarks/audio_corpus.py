@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Synthetic MP3 and M4A files for the tag benchmarks.
+
+The audio payload is silence: valid MPEG frames for MP3 and an empty ``mdat``
+for M4A, so no real recordings are needed. Each layout varies what makes tag
+writes cheap or expensive: ID3 version and padding, embedded cover art,
+existing lyrics, and whether the MP4 ``moov`` box comes before or after the
+media data.
+
+Usage:
+    python -m benchmarks.audio_corpus <output_dir> [--size-mb 5] [--files 5]
+"""
+
+import argparse
+import os
+import struct
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.append(str(Path(__file__).parent.parent))
+from mutagen.id3 import ID3, APIC, TIT2, TPE1, TRCK, USLT
+from mutagen.mp4 import MP4, MP4Cover
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz: 417 bytes per frame
+MP3_FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+
+COVER_SIZE = 300 * 1024
+
+@dataclass
+class Layout:
+    name: str
+    extension: str
+    description: str
+    build: Callable[[str, int, int], None]
+
+def _cover() -> bytes:
+    # JPEG markers around filler; tag writers do not decode the image
+    return b'\xff\xd8\xff\xe0' + os.urandom(COVER_SIZE) + b'\xff\xd9'
+
+def _write_mp3(path: str, size: int, track_number: int, version: int, padding: int,
+               cover: bool = False, lyrics: bool = False) -> None:
+    with open(path, 'wb') as f:
+        f.write(MP3_FRAME * max(1, size // len(MP3_FRAME)))
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text=f'Song {track_number}'))
+    tags.add(TPE1(encoding=3, text='Bench Artist'))
+    tags.add(TRCK(encoding=3, text=f'{track_number}/99'))
+    if cover:
+        tags.add(APIC(encoding=0, mime='image/jpeg', type=3, desc='', data=_cover()))
+    if lyrics:
+        tags.add(USLT(encoding=3, lang='eng', desc='', text='Old lyrics line\n' * 400))
+    tags.save(path, v2_version=version, padding=lambda info: padding)
+
+def _box(kind: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I', 8 + len(payload)) + kind + payload
+
+def _full_box(kind: bytes, payload: bytes, flags: int = 0) -> bytes:
+    return _box(kind, struct.pack('>I', flags) + payload)
+
+def _moov(chunk_offset: int) -> bytes:
+    """A movie box with one AAC audio track whose single chunk starts at chunk_offset."""
+    mvhd = _full_box(b'mvhd', struct.pack('>IIII', 0, 0, 44100, 44100 * 240) + b'\x00' * 80)
+    tkhd = _full_box(b'tkhd', b'\x00' * 80, flags=7)
+    mdhd = _full_box(b'mdhd', struct.pack('>IIIIHH', 0, 0, 44100, 44100 * 240, 0x55c4, 0))
+    hdlr = _full_box(b'hdlr', struct.pack('>I4s12s', 0, b'soun', b'\x00' * 12) + b'SoundHandler\x00')
+    esds = _full_box(b'esds', bytes.fromhex('03190000000411401500000000000000000000000502121006010102'))
+    mp4a = _box(b'mp4a', b'\x00' * 6 + struct.pack('>H', 1) + b'\x00' * 8
+                + struct.pack('>HHHHI', 2, 16, 0, 0, 44100 << 16) + esds)
+    stbl = _box(b'stbl', _full_box(b'stsd', struct.pack('>I', 1) + mp4a)
+                + _full_box(b'stts', struct.pack('>I', 0))
+                + _full_box(b'stsc', struct.pack('>I', 0))
+                + _full_box(b'stsz', struct.pack('>II', 0, 0))
+                + _full_box(b'stco', struct.pack('>II', 1, chunk_offset)))
+    minf = _box(b'minf', _full_box(b'smhd', b'\x00' * 4) + stbl)
+    trak = _box(b'trak', tkhd + _box(b'mdia', mdhd + hdlr + minf))
+    return _box(b'moov', mvhd + trak)
+
+def _write_m4a(path: str, size: int, track_number: int, moov_first: bool, padding: int,
+               cover: bool = False) -> None:
+    ftyp = _box(b'ftyp', b'M4A \x00\x00\x02\x00M4A mp42isom')
+    mdat = _box(b'mdat', b'\x00' * max(0, size))
+    if moov_first:
+        # Faststart layout: growing moov moves the media data and its chunk offsets
+        data = ftyp + _moov(len(ftyp) + len(_moov(0)) + 8) + mdat
+    else:
+        data = ftyp + mdat + _moov(len(ftyp) + 8)
+    with open(path, 'wb') as f:
+        f.write(data)
+    audio = MP4(path)
+    audio['\xa9nam'] = f'Song {track_number}'
+    audio['\xa9ART'] = 'Bench Artist'
+    audio['trkn'] = [(track_number, 99)]
+    if cover:
+        audio['covr'] = [MP4Cover(_cover(), imageformat=MP4Cover.FORMAT_JPEG)]
+    audio.save(padding=lambda info: padding)
+
+LAYOUTS: Dict[str, Layout] = {layout.name: layout for layout in [
+    Layout('mp3-id3v24-padded', '.mp3', 'ID3v2.4 with 8 KiB of padding',
+           lambda path, size, n: _write_mp3(path, size, n, 4, 8192)),
+    Layout('mp3-id3v23-nopad', '.mp3', 'ID3v2.3 without padding',
+           lambda path, size, n: _write_mp3(path, size, n, 3, 0)),
+    Layout('mp3-id3v24-cover', '.mp3', 'ID3v2.4 with 300 KiB cover art and 1 KiB of padding',
+           lambda path, size, n: _write_mp3(path, size, n, 4, 1024, cover=True)),
+    Layout('mp3-id3v24-lyrics', '.mp3', 'ID3v2.4 with existing lyrics and no padding',
+           lambda path, size, n: _write_mp3(path, size, n, 4, 0, lyrics=True)),
+    Layout('m4a-moov-front-padded', '.m4a', 'moov before mdat with 8 KiB of free space',
+           lambda path, size, n: _write_m4a(path, size, n, True, 8192)),
+    Layout('m4a-moov-front-nopad', '.m4a', 'moov before mdat without free space',
+           lambda path, size, n: _write_m4a(path, size, n, True, 0)),
+    Layout('m4a-moov-end', '.m4a', 'moov after mdat',
+           lambda path, size, n: _write_m4a(path, size, n, False, 0)),
+    Layout('m4a-moov-front-cover', '.m4a', 'moov before mdat with 300 KiB cover art',
+           lambda path, size, n: _write_m4a(path, size, n, True, 1024, cover=True)),
+]}
+
+def generate(output_dir: str, size_bytes: int = 5 * 1024 * 1024, files: int = 5,
+             layouts: Optional[List[str]] = None) -> Dict[str, List[str]]:
+    """Write ``files`` files per layout to ``output_dir/<layout>/`` and return their paths."""
+    corpus = {}
+    for name in layouts or list(LAYOUTS):
+        layout = LAYOUTS[name]
+        directory = os.path.join(output_dir, name)
+        os.makedirs(directory, exist_ok=True)
+        corpus[name] = []
+        for track_number in range(1, files + 1):
+            path = os.path.join(directory, f'{track_number:02d}{layout.extension}')
+            layout.build(path, size_bytes, track_number)
+            corpus[name].append(path)
+    return corpus
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic MP3 and M4A files.')
+    parser.add_argument('output_dir')
+    parser.add_argument('--size-mb', type=float, default=5, help='Approximate audio size per file')
+    parser.add_argument('--files', type=int, default=5, help='Files per layout')
+    parser.add_argument('--layout', choices=sorted(LAYOUTS), action='append', help='Only generate this layout')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    corpus = generate(args.output_dir, int(args.size_mb * 1024 * 1024), args.files, args.layout)
+    for name, paths in corpus.items():
+        print(f'{name}: {len(paths)} files ({LAYOUTS[name].description})')
+
+if __name__ == '__main__':
+    main()
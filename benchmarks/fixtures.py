@@ -0,0 +1,204 @@
+"""
+Album and track pages for the offline provider benchmarks.
+
+Recorded pages live in ``benchmarks/fixtures/<provider>/`` with a
+``manifest.json`` and are used when present. Otherwise synthetic pages are
+generated with the same structure the provider parsers expect, padded with
+scripts and navigation markup to the size of real pages. Links in the pages
+use the ``{{origin}}`` placeholder so the stub server can point them at itself.
+"""
+
+import json
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from benchmarks.stub_server import ORIGIN_PLACEHOLDER
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+WORDS = ('night', 'light', 'river', 'heart', 'shadow', 'morning', 'fire', 'road', 'dream', 'city', 'rain',
+         'golden', 'falling', 'home', 'again', 'forever', 'slow', 'wild', 'quiet', 'stars', 'running', 'cold')
+
+@dataclass
+class FixtureSet:
+    """Pages of one album: the album page path and every page by request path."""
+    provider: str
+    album_path: str
+    pages: Dict[str, str] = field(default_factory=dict)
+    recorded: bool = False
+
+    @property
+    def track_paths(self) -> List[str]:
+        return [path for path in self.pages if path != self.album_path]
+
+def chain(steps: Sequence[Tuple[str, int]], inner: str) -> str:
+    """Nest ``inner`` so that it is reached by an XPath like ``div/div[3]/span``.
+
+    Each step is (tag, position); empty siblings are added before the element
+    so that positional predicates match.
+    """
+    html = inner
+    for tag, position in reversed(steps):
+        html = f'<{tag}></{tag}>' * (position - 1) + f'<{tag}>{html}</{tag}>'
+    return html
+
+def _padding(rng: random.Random, kib: int) -> str:
+    """Scripts and navigation markup that the parsers have to skip."""
+    parts = []
+    size = 0
+    while size < kib * 1024:
+        if rng.random() < 0.5:
+            payload = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(2000))
+            part = f'<script>window.__STATE__ = {{"chunk": "{payload}"}};</script>'
+        else:
+            part = '<ul class="nav">' + ''.join(
+                f'<li class="nav-item"><a href="{ORIGIN_PLACEHOLDER}/nav/{rng.randint(0, 10**6)}">'
+                f'{rng.choice(WORDS).title()}</a></li>' for _ in range(20)) + '</ul>'
+        parts.append(part)
+        size += len(part)
+    return ''.join(parts)
+
+def _lyrics(rng: random.Random, verses: int) -> List[List[str]]:
+    return [[' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 9))).capitalize()
+             for _ in range(rng.randint(4, 8))] for _ in range(verses)]
+
+def _page(title: str, body: str) -> str:
+    return f'<!DOCTYPE html><html><head><title>{title}</title></head><body>{body}</body></html>'
+
+def synthetic_genius(tracks: int = 12, padding_kib: int = 200, seed: int = 1) -> FixtureSet:
+    """An album page with a chart row per track, and one page per track."""
+    rng = random.Random(seed)
+    album_path = '/genius/albums/Bench-artist/Bench-album'
+    fixtures = FixtureSet('genius', album_path)
+    rows = []
+    for number in range(1, tracks + 1):
+        track_path = f'/genius/Bench-artist-song-{number}-lyrics'
+        title = f'Song {number}'
+        rows.append(
+            '<div class="chart_row chart_row--light_border">'
+            f'<div class="chart_row-number_container"><span><span>{number}</span></span></div>'
+            f'<div class="chart_row-content"><a href="{ORIGIN_PLACEHOLDER}{track_path}" class="u-display_block">'
+            f'<h3 class="chart_row-content-title">{title}<span class="chart_row-content-title-subtitle"></span></h3></a></div>'
+            '<div class="chart_row-metadata_element">1.2K views</div></div>')
+
+        containers = []
+        for index, verse in enumerate(_lyrics(rng, rng.randint(3, 6))):
+            lines = [f'{line}<br/>' for line in verse]
+            # Annotated lines are links wrapping a span, as on genius.com
+            lines[1] = f'<a href="{ORIGIN_PLACEHOLDER}/annotation/{number}-{index}"><span>{verse[1]}<br/><i>{verse[2]}</i></span></a><br/>'
+            containers.append(f'<div data-lyrics-container="true"><div class="ad-header">Advertisement</div>{"".join(lines)}</div>')
+        artist = chain([('div', 1), ('div', 3), ('div', 1), ('div', 1), ('div', 1), ('div', 1), ('span', 1), ('span', 1)],
+                       '<a href="#">Bench Artist</a>')
+        heading = f'<h1><div><div><div><span>{title}</span></div></div></div></h1>'
+        lyrics = f'<div id="lyrics-root">{"".join(containers)}</div>'
+        body = (f'<div id="application"><main>{artist}<div>{heading}{lyrics}</div></main></div>'
+                + _padding(rng, padding_kib))
+        fixtures.pages[track_path] = _page(title, body)
+
+    header = ('<h1 class="header_with_cover_art-primary_info-title">Bench Album</h1>'
+              '<h2><a class="header_with_cover_art-primary_info-primary_artist" href="#">Bench Artist</a></h2>')
+    fixtures.pages[album_path] = _page('Bench Album', header + ''.join(rows) + _padding(rng, padding_kib))
+    return fixtures
+
+# Paths below id="__next" that the Musixmatch parsers look for
+MUSIXMATCH_ALBUM_STEPS = [('div', 1)] * 7 + [('div', 2), ('div', 1), ('div', 1), ('div', 2), ('div', 2), ('div', 1)]
+MUSIXMATCH_LYRICS_STEPS = [('div', 1)] * 7 + [('div', 2), ('div', 1), ('div', 1), ('div', 2), ('div', 1)]
+
+def synthetic_musixmatch(tracks: int = 12, padding_kib: int = 150, seed: int = 2) -> FixtureSet:
+    """An album page listing track links, and one page per track.
+
+    Every third track uses the layout with section headings.
+    """
+    rng = random.Random(seed)
+    album_path = '/musixmatch/album/Bench-Artist/Bench-Album'
+    fixtures = FixtureSet('musixmatch', album_path)
+    items = []
+    for number in range(1, tracks + 1):
+        href = f'/lyrics/Bench-Artist/Song-{number}'
+        items.append(f'<div><div><a href="{href}"><div>Song {number}</div></a></div></div>')
+
+        verses = _lyrics(rng, rng.randint(3, 6))
+        if number % 3 == 0:
+            paragraphs = ''.join(
+                f'<div><div><h3>{"Verse" if i % 2 == 0 else "Chorus"} {i // 2 + 1}</h3></div>'
+                + ''.join(f'<div><div>{line}</div></div>' for line in verse) + '</div>'
+                for i, verse in enumerate(verses))
+            container = paragraphs
+        else:
+            paragraphs = ''.join('<div>' + ''.join(f'<div><div>{line}</div></div>' for line in verse) + '</div>'
+                                 for verse in verses)
+            container = f'<div>{paragraphs}</div>'
+        body = f'<div id="__next">{chain(MUSIXMATCH_LYRICS_STEPS, container)}</div>' + _padding(rng, padding_kib)
+        fixtures.pages['/musixmatch' + href] = _page(f'Song {number}', body)
+
+    body = f'<div id="__next">{chain(MUSIXMATCH_ALBUM_STEPS, "".join(items))}</div>' + _padding(rng, padding_kib)
+    fixtures.pages[album_path] = _page('Bench Album', body)
+    return fixtures
+
+def load_recorded(provider: str, fixtures_dir: str = FIXTURES_DIR) -> Optional[FixtureSet]:
+    """Recorded pages for a provider, or None when none were recorded."""
+    directory = os.path.join(fixtures_dir, provider)
+    manifest_path = os.path.join(directory, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    fixtures = FixtureSet(provider, manifest['album'], recorded=True)
+    for path, filename in manifest['pages'].items():
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            fixtures.pages[path] = f.read()
+    return fixtures
+
+def load_fixtures(provider: str, synthetic_only: bool = False) -> FixtureSet:
+    recorded = None if synthetic_only else load_recorded(provider)
+    if recorded:
+        return recorded
+    return synthetic_genius() if provider == 'genius' else synthetic_musixmatch()
+
+def record(provider: str, album_url: str, max_tracks: int = 5, fixtures_dir: str = FIXTURES_DIR) -> FixtureSet:
+    """Download an album page and its first track pages into the fixtures folder.
+
+    Needs network access; the benchmarks themselves never do.
+    """
+    from providers.genius_provider import GeniusProvider
+    from providers.musixmatch_provider import MusixmatchProvider
+
+    if provider == 'genius':
+        provider_obj = GeniusProvider()
+        headers = provider_obj.headers
+        origin = 'https://genius.com'
+    else:
+        provider_obj = MusixmatchProvider()
+        headers = provider_obj.headers
+        origin = provider_obj.BASE_URL
+    prefix = '/' + provider
+
+    def get(url):
+        response = requests.get(url, headers=headers, timeout=30)
+        response.raise_for_status()
+        return response.text
+
+    album_html = get(album_url)
+    tracks = provider_obj._parse_album(album_html if provider == 'genius' else album_html.encode('utf-8'))
+    album_path = prefix + urlparse(album_url).path
+    fixtures = FixtureSet(provider, album_path, recorded=True)
+    fixtures.pages[album_path] = album_html.replace(origin, ORIGIN_PLACEHOLDER + prefix)
+    for track in tracks[:max_tracks]:
+        fixtures.pages[prefix + urlparse(track.url).path] = get(track.url).replace(origin, ORIGIN_PLACEHOLDER + prefix)
+
+    directory = os.path.join(fixtures_dir, provider)
+    os.makedirs(directory, exist_ok=True)
+    manifest = {'album': album_path, 'source': album_url, 'pages': {}}
+    for index, (path, html) in enumerate(fixtures.pages.items()):
+        filename = 'album.html' if path == album_path else f'track-{index}.html'
+        with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+            f.write(html)
+        manifest['pages'][path] = filename
+    with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return fixtures
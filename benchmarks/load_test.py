@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Load test of the web interface against a stub provider.
+
+Starts the web server in a child process, with the Genius provider pointed at
+a local stub server that serves synthetic album and track pages after a
+configurable latency. Simulated browsers then each run jobs the way the page
+does: open ``/stream`` for the job, attach the album's files in parallel
+through ``/jobs/<id>/files``, POST ``/process`` and wait for the last track
+update. The report covers:
+
+- request latency percentiles and error counts per endpoint
+- job duration and the time until the first SSE event of a job
+- SSE delivery lag on the server, from ``lyrics_sse_delivery_seconds``
+- resident memory of the server before, during and after the run
+
+Usage:
+    python -m benchmarks.load_test --users 20 --rounds 3 [--server asgi] [--latency 0.2] [--output load.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+sys.path.append(str(Path(__file__).parent.parent))
+from benchmarks.audio_corpus import generate
+from benchmarks.fixtures import synthetic_genius
+from benchmarks.provider_benchmark import compare
+from benchmarks.stub_server import StubServer
+from tracing import configure_logging
+
+REPO_ROOT = str(Path(__file__).parent.parent)
+
+# Host of the stub server, which the server process routes to the Genius provider
+STUB_HOST = '127.0.0.1'
+
+def percentiles(values: List[float]) -> dict:
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+
+    def at(fraction):
+        return round(values[min(len(values) - 1, int(len(values) * fraction))], 1)
+
+    return {
+        'count': len(values),
+        'median_ms': round(statistics.median(values), 1),
+        'p95_ms': at(0.95),
+        'p99_ms': at(0.99),
+        'max_ms': round(values[-1], 1),
+    }
+
+def read_rss_kib(pid: int) -> Dict[str, int]:
+    """Current and peak resident memory of a process, from /proc (Linux only)."""
+    result = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    name, value = line.split(':', 1)
+                    result['rss_kib' if name == 'VmRSS' else 'peak_kib'] = int(value.split()[0])
+    except OSError:
+        pass
+    return result
+
+def histogram_buckets(metrics_text: str, name: str) -> Dict[float, int]:
+    """Cumulative bucket counts of an unlabeled histogram in Prometheus text format."""
+    buckets = {}
+    pattern = re.compile(rf'^{name}_bucket\{{le="([^"]+)"\}} (\d+)$', re.MULTILINE)
+    for bound, count in pattern.findall(metrics_text):
+        buckets[float(bound)] = int(count)
+    return buckets
+
+def histogram_quantile(before: Dict[float, int], after: Dict[float, int], quantile: float) -> Optional[float]:
+    """Upper bound of the bucket holding a quantile of the observations made between two scrapes."""
+    bounds = sorted(after)
+    deltas = [after[bound] - before.get(bound, 0) for bound in bounds]
+    if not deltas or deltas[-1] == 0:
+        return None
+    target = quantile * deltas[-1]
+    for bound, cumulative in zip(bounds, deltas):
+        if cumulative >= target:
+            return bound
+    return bounds[-1]
+
+class SSEClient:
+    """Minimal EventSource: reads one /stream response on a background thread.
+
+    Speaks HTTP/1.0 so the response body is the plain event stream, and polls
+    a stop flag between reads so it can be closed at any time.
+    """
+
+    def __init__(self, host: str, port: int, job_id: str):
+        self.events = []
+        self.connected = threading.Event()
+        self.error: Optional[str] = None
+        self._stop = threading.Event()
+        self._sock = socket.create_connection((host, port), timeout=10)
+        self._sock.sendall(f'GET /stream?job={job_id}&last_event_id=0 HTTP/1.0\r\nHost: {host}\r\n'
+                           'Accept: text/event-stream\r\n\r\n'.encode())
+        self._sock.settimeout(0.2)
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        buffer = b''
+        headers_done = False
+        try:
+            while not self._stop.is_set():
+                try:
+                    chunk = self._sock.recv(65536)
+                except socket.timeout:
+                    continue
+                if not chunk:
+                    break
+                buffer += chunk
+                if not headers_done:
+                    if b'\r\n\r\n' not in buffer:
+                        continue
+                    head, buffer = buffer.split(b'\r\n\r\n', 1)
+                    if b' 200 ' not in head.split(b'\r\n', 1)[0]:
+                        self.error = head.split(b'\r\n', 1)[0].decode('latin1')
+                        break
+                    headers_done = True
+                while b'\n\n' in buffer:
+                    block, buffer = buffer.split(b'\n\n', 1)
+                    self._parse(block.decode('utf-8'), time.perf_counter())
+        except OSError as e:
+            self.error = str(e)
+        finally:
+            self.connected.set()
+
+    def _parse(self, block: str, received: float):
+        name, data = 'message', []
+        for line in block.split('\n'):
+            if line.startswith('retry:'):
+                self.connected.set()
+            elif line.startswith('event:'):
+                name = line[6:].strip()
+            elif line.startswith('data:'):
+                data.append(line[5:].strip())
+        if data:
+            self.events.append((received, name, json.loads('\n'.join(data))))
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=2)
+        self._sock.close()
+
+class LoadTest:
+    """Run simulated browsers against a server and collect their measurements."""
+
+    def __init__(self, base_url: str, album_urls: List[str], files: List[str], upload_concurrency: int = 4,
+                 job_timeout: float = 120.0):
+        self.base_url = base_url
+        self.album_urls = album_urls
+        self.files = files
+        self.upload_concurrency = upload_concurrency
+        self.job_timeout = job_timeout
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _record(self, name: str, started: float, ok: bool, ended: Optional[float] = None) -> None:
+        with self._lock:
+            self.latencies[name].append(((ended or time.perf_counter()) - started) * 1000)
+            if not ok:
+                self.errors[name] += 1
+
+    def _error(self, name: str) -> None:
+        with self._lock:
+            self.errors[name] += 1
+
+    def _attach(self, session: requests.Session, job_id: str, path: str) -> bool:
+        started = time.perf_counter()
+        try:
+            with open(path, 'rb') as f:
+                response = session.post(f'{self.base_url}/jobs/{job_id}/files',
+                                        files={'file': (os.path.basename(path), f, 'audio/mpeg')}, timeout=60)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        self._record('attach', started, ok)
+        return ok
+
+    def run_job(self, user: int) -> None:
+        """One job: stream, parallel attach, process, then wait for the last track update."""
+        job_id = f'load-{user}-{uuid.uuid4().hex[:12]}'
+        host, port = self.base_url.split('//', 1)[1].split(':')
+        started = time.perf_counter()
+        try:
+            stream = SSEClient(host, int(port), job_id)
+        except OSError:
+            self._error('stream')
+            return
+        try:
+            if not stream.connected.wait(10) or stream.error:
+                self._error('stream')
+                return
+            self._record('stream_connect', started, True)
+
+            session = requests.Session()
+            with ThreadPoolExecutor(self.upload_concurrency) as pool:
+                attached = list(pool.map(lambda path: self._attach(session, job_id, path), self.files))
+            if not any(attached):
+                self._error('job')
+                return
+
+            process_started = time.perf_counter()
+            try:
+                response = session.post(f'{self.base_url}/process', timeout=self.job_timeout,
+                                        data={'job_id': job_id, 'url': self.album_urls[user % len(self.album_urls)]})
+                ok = response.status_code == 200 and response.json().get('success')
+            except (requests.RequestException, ValueError):
+                ok = False
+            self._record('process', process_started, ok)
+
+            # The last success update may still be on its way when /process returns
+            deadline = time.perf_counter() + 5
+            while time.perf_counter() < deadline:
+                done = sum(1 for _, name, data in stream.events
+                           if name == 'track_update' and data.get('status') == 'success')
+                if done >= len(self.files):
+                    break
+                time.sleep(0.05)
+            else:
+                ok = False
+            self._record('job', started, ok)
+            job_events = [received for received, name, _ in stream.events if name == 'track_update']
+            if job_events:
+                self._record('first_track_update', process_started, True, ended=job_events[0])
+            if stream.error:
+                self._error('stream')
+        finally:
+            stream.close()
+
+    def run_round(self, users: int) -> None:
+        threads = [threading.Thread(target=self.run_job, args=(user,)) for user in range(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+def start_server(kind: str, port: int, upload_folder: str) -> subprocess.Popen:
+    env = dict(os.environ, LYRICS_UPLOAD_FOLDER=upload_folder, LYRICS_LOG_LEVEL='WARNING', PYTHONPATH=REPO_ROOT)
+    command = [sys.executable, '-m', 'benchmarks.load_test', '--serve', '--server', kind, '--port', str(port)]
+    return subprocess.Popen(command, cwd=REPO_ROOT, env=env)
+
+def wait_for_server(base_url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with status {process.returncode}')
+        try:
+            requests.get(f'{base_url}/metrics', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError('Server did not start in time')
+
+def serve(kind: str, port: int) -> None:
+    """Run the threaded or ASGI server, as the load test's child process."""
+    from providers.genius_provider import GeniusProvider
+
+    # Providers only handle their own hosts; the stub stands in for Genius
+    GeniusProvider.DOMAINS = GeniusProvider.DOMAINS + [STUB_HOST]
+    if kind == 'asgi':
+        import uvicorn
+        uvicorn.run('asgi_lyrics_embedder:app', host='127.0.0.1', port=port, log_level='warning', access_log=False)
+        return
+    from werkzeug.serving import make_server
+    from web_lyrics_embedder import app
+
+    configure_logging()
+    try:
+        make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def run_load_test(users: int = 10, rounds: int = 2, tracks: int = 4, latency: float = 0.05,
+                  file_size: int = 1024 * 1024, server: str = 'threaded', shared_album: bool = False,
+                  upload_concurrency: int = 4) -> dict:
+    fixtures = synthetic_genius(tracks=tracks, padding_kib=100)
+    with tempfile.TemporaryDirectory(prefix='load-test-') as temp_dir, \
+            StubServer(fixtures.pages, latency=latency) as stub:
+        # A distinct album page per user, unless they should share in-flight fetches
+        album_html = fixtures.pages[fixtures.album_path]
+        album_urls = []
+        for user in range(1 if shared_album else users):
+            path = f'{fixtures.album_path}-{user}'
+            stub.add_page(path, album_html)
+            album_urls.append(stub.url(path))
+
+        files = generate(os.path.join(temp_dir, 'corpus'), file_size, tracks, ['mp3-id3v24-padded'])['mp3-id3v24-padded']
+        port = free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        process = start_server(server, port, os.path.join(temp_dir, 'media'))
+        try:
+            wait_for_server(base_url, process)
+            test = LoadTest(base_url, album_urls, files, upload_concurrency)
+            memory = {'start': read_rss_kib(process.pid), 'rounds': []}
+            metrics_before = requests.get(f'{base_url}/metrics', timeout=10).text
+            started = time.perf_counter()
+            for _ in range(rounds):
+                test.run_round(users)
+                memory['rounds'].append(read_rss_kib(process.pid).get('rss_kib'))
+            duration = time.perf_counter() - started
+            metrics_after = requests.get(f'{base_url}/metrics', timeout=10).text
+            memory['end'] = read_rss_kib(process.pid)
+        finally:
+            process.send_signal(signal.SIGINT)
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    results = {f'request.{name}': {**percentiles(values), 'errors': test.errors.get(name, 0)}
+               for name, values in sorted(test.latencies.items())}
+    for name, count in test.errors.items():
+        results.setdefault(f'request.{name}', {'count': 0, 'errors': count})
+    before = histogram_buckets(metrics_before, 'lyrics_sse_delivery_seconds')
+    after = histogram_buckets(metrics_after, 'lyrics_sse_delivery_seconds')
+    results['sse.delivery'] = {
+        'events': int(after.get(float('inf'), 0) - before.get(float('inf'), 0)),
+        'p50_le_ms': _ms(histogram_quantile(before, after, 0.5)),
+        'p95_le_ms': _ms(histogram_quantile(before, after, 0.95)),
+        'p99_le_ms': _ms(histogram_quantile(before, after, 0.99)),
+    }
+    start_rss = memory['start'].get('rss_kib')
+    end_rss = memory['end'].get('rss_kib')
+    if start_rss and end_rss:
+        results['server.memory'] = {
+            'start_kib': start_rss,
+            'end_kib': end_rss,
+            'peak_kib': memory['end']['peak_kib'],
+            'growth_kib': end_rss - start_rss,
+            'after_round_kib': memory['rounds'],
+        }
+    jobs = len(test.latencies.get('job', []))
+    results['throughput'] = {
+        'jobs': jobs,
+        'jobs_per_second': round(jobs / duration, 2),
+        'error_rate': round(sum(test.errors.values()) / max(1, sum(len(v) for v in test.latencies.values())), 4),
+    }
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'server': server,
+            'users': users,
+            'rounds': rounds,
+            'tracks': tracks,
+            'file_bytes': file_size,
+            'latency': latency,
+            'shared_album': shared_album,
+        },
+        'results': results,
+    }
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    if seconds is None:
+        return None
+    return None if seconds == float('inf') else round(seconds * 1000, 1)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the web interface against a stub provider.')
+    parser.add_argument('--users', type=int, default=10, help='Concurrent simulated browsers')
+    parser.add_argument('--rounds', type=int, default=2, help='Jobs each browser runs, one after the other')
+    parser.add_argument('--tracks', type=int, default=4, help='Tracks (and uploaded files) per album')
+    parser.add_argument('--size-mb', type=float, default=1, help='Size of each uploaded file')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds the stub provider waits per request')
+    parser.add_argument('--server', choices=('threaded', 'asgi'), default='threaded', help='How to serve the app')
+    parser.add_argument('--shared-album', action='store_true', help='Every browser processes the same album URL')
+    parser.add_argument('--upload-concurrency', type=int, default=4, help='Parallel file uploads per browser')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown over the baseline (0.25 = 25%%)')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.serve:
+        serve(args.server, args.port)
+        return 0
+    configure_logging('WARNING')
+    results = run_load_test(args.users, args.rounds, args.tracks, args.latency, int(args.size_mb * 1024 * 1024),
+                            args.server, args.shared_album, args.upload_concurrency)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    print(output)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the Genius and Musixmatch providers.
+
+Replays album and track pages (recorded, or synthetic when none were recorded)
+from a local stub server and measures:
+
+- parse time and peak memory per page type (album, track, lyrics)
+- end-to-end album throughput: the album page plus every track page
+
+Usage:
+    python -m benchmarks.provider_benchmark [--output results.json] [--baseline baseline.json]
+    python -m benchmarks.provider_benchmark --record genius <album_url>
+
+With --baseline, every time and memory figure is compared to the baseline
+and the exit status is 1 when one of them regressed by more than --tolerance.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.append(str(Path(__file__).parent.parent))
+from benchmarks.fixtures import FixtureSet, load_fixtures, record
+from benchmarks.stub_server import StubServer
+from providers.genius_provider import GeniusProvider
+from providers.musixmatch_provider import MusixmatchProvider
+from tracing import configure_logging
+
+PROVIDERS = ('genius', 'musixmatch')
+
+def measure(fn: Callable[[], object], iterations: int) -> dict:
+    """Median and p95 wall time in milliseconds, and the peak traced memory of one call."""
+    fn()  # warm up
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    times.sort()
+    return {
+        'median_ms': round(statistics.median(times), 3),
+        'p95_ms': round(times[min(len(times) - 1, int(len(times) * 0.95))], 3),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+def make_provider(name: str, server: StubServer):
+    if name == 'genius':
+        return GeniusProvider()
+    return MusixmatchProvider(base_url=server.origin + '/musixmatch')
+
+def bench_parsers(provider, fixtures: FixtureSet, server: StubServer, iterations: int) -> Dict[str, dict]:
+    """Time the parsers on pages as served, so links match what a live run sees."""
+    album_html = fixtures.pages[fixtures.album_path].replace('{{origin}}', server.origin)
+    track_html = fixtures.pages[fixtures.track_paths[0]].replace('{{origin}}', server.origin)
+    results = {}
+    if isinstance(provider, GeniusProvider):
+        results['parse.album'] = measure(lambda: provider._parse_album(album_html), iterations)
+        results['parse.track'] = measure(lambda: provider._parse_track_page(track_html.encode('utf-8')), iterations)
+    else:
+        results['parse.album'] = measure(lambda: provider._parse_album(album_html.encode('utf-8')), iterations)
+    results['parse.lyrics'] = measure(lambda: provider._parse_lyrics(track_html), iterations)
+    return results
+
+def bench_album(provider, fixtures: FixtureSet, server: StubServer, iterations: int) -> dict:
+    """Fetch and parse the album page and every track page, one after the other."""
+    album_url = server.url(fixtures.album_path)
+    track_count = 0
+
+    def run():
+        nonlocal track_count
+        tracks = provider.get_track_info_without_lyrics_list_from_album(album_url)
+        if not tracks:
+            raise RuntimeError(f'No tracks parsed from {album_url}')
+        for track in tracks:
+            info = provider.get_track_info(track.url, track.track_number)
+            if not info or not info.lyrics:
+                raise RuntimeError(f'No lyrics parsed from {track.url}')
+        track_count = len(tracks)
+
+    result = measure(run, iterations)
+    result['tracks'] = track_count
+    result['tracks_per_second'] = round(track_count / (result['median_ms'] / 1000), 2)
+    return result
+
+def run_benchmarks(iterations: int = 10, latency: float = 0.0, synthetic_only: bool = False,
+                   providers: List[str] = PROVIDERS) -> dict:
+    results = {}
+    sources = {}
+    for name in providers:
+        fixtures = load_fixtures(name, synthetic_only=synthetic_only)
+        sources[name] = 'recorded' if fixtures.recorded else 'synthetic'
+        with StubServer(fixtures.pages, latency=latency) as server:
+            provider = make_provider(name, server)
+            for key, value in bench_parsers(provider, fixtures, server, iterations).items():
+                results[f'{name}.{key}'] = value
+            results[f'{name}.album'] = bench_album(provider, fixtures, server, max(1, iterations // 5))
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'iterations': iterations,
+            'latency': latency,
+            'fixtures': sources,
+        },
+        'results': results,
+    }
+
+# Figures where larger is worse
+COMPARED_FIELDS = ('median_ms', 'p95_ms', 'peak_kib')
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """List the figures that are more than ``tolerance`` (a fraction) above the baseline."""
+    regressions = []
+    for key, current in results['results'].items():
+        previous = baseline.get('results', {}).get(key)
+        if not previous:
+            continue
+        for name in COMPARED_FIELDS:
+            if name in previous and previous[name] > 0 and current[name] > previous[name] * (1 + tolerance):
+                regressions.append(f'{key}.{name}: {previous[name]} -> {current[name]}')
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Offline benchmark of the lyrics providers.')
+    parser.add_argument('--iterations', type=int, default=10, help='Timed runs per parser benchmark')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds the stub server waits per request')
+    parser.add_argument('--provider', choices=PROVIDERS, action='append', help='Only benchmark this provider')
+    parser.add_argument('--synthetic', action='store_true', help='Ignore recorded fixtures')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown over the baseline (0.25 = 25%%)')
+    parser.add_argument('--record', nargs=2, metavar=('PROVIDER', 'ALBUM_URL'),
+                        help='Download an album and its track pages as fixtures (needs network access)')
+    parser.add_argument('--record-tracks', type=int, default=5, help='Track pages to record')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging('WARNING')
+    if args.record:
+        fixtures = record(args.record[0], args.record[1], max_tracks=args.record_tracks)
+        print(f'Recorded {len(fixtures.pages)} pages for {fixtures.provider}')
+        return 0
+
+    results = run_benchmarks(args.iterations, args.latency, args.synthetic, args.provider or PROVIDERS)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Local HTTP server that replays canned pages.
+
+Pages are registered by path and may contain ``{{origin}}``, which is replaced
+with the server's own address so recorded links point back at the stub. An
+optional latency is added to every response to imitate a remote site.
+Every page carries an ETag, and a request whose If-None-Match matches it gets
+a 304.
+"""
+
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+ORIGIN_PLACEHOLDER = '{{origin}}'
+
+class StubServer:
+    """Serve ``pages`` ({path: html}) on 127.0.0.1 from a background thread.
+
+    Args:
+        pages: HTML by request path, e.g. ``/genius/albums/Artist/Album``
+        latency: Seconds to wait before answering each request
+        port: Port to listen on; 0 picks a free one
+    """
+
+    def __init__(self, pages: Optional[Dict[str, str]] = None, latency: float = 0.0, port: int = 0):
+        self.latency = latency
+        self.requests = 0
+        self._pages: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+        for path, html in (pages or {}).items():
+            self.add_page(path, html)
+
+    @property
+    def origin(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def url(self, path: str) -> str:
+        return self.origin + path
+
+    def add_page(self, path: str, html: str) -> None:
+        self._pages[path] = html.replace(ORIGIN_PLACEHOLDER, self.origin).encode('utf-8')
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = stub._pages.get(self.path.split('?')[0])
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'StubServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
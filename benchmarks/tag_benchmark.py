@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark of track number scans and lyrics embedding on a synthetic corpus.
+
+For every corpus layout it measures the latency of ``get_track_number`` and
+``add_lyrics_to_audio``, their throughput, and how many bytes of each file the
+embed rewrote. With --cold, each file is evicted from the page cache before it
+is touched, which shows the disk-bound behavior.
+
+Usage:
+    python -m benchmarks.tag_benchmark [--corpus DIR] [--size-mb 5] [--files 5] [--cold] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.append(str(Path(__file__).parent.parent))
+from benchmarks.audio_corpus import LAYOUTS, generate
+from benchmarks.provider_benchmark import compare
+from lyrics_embedder import add_lyrics_to_audio
+from tracing import configure_logging
+from utilities import get_track_number
+
+COMPARE_BLOCK_SIZE = 1024 * 1024
+
+LYRICS = '\n\n'.join('\n'.join(f'Line {line} of verse {verse}, sung slowly into the night' for line in range(8))
+                     for verse in range(6))
+
+def evict_from_cache(path: str) -> bool:
+    """Ask the kernel to drop a file's cached pages; False where that is not supported."""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+def _first_difference(a: bytes, b: bytes) -> int:
+    """Offset of the first differing byte, found by bisecting on prefix equality."""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high) // 2
+        if a[low:middle + 1] == b[low:middle + 1]:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+def bytes_rewritten(original: str, modified: str) -> int:
+    """Bytes between the first and the last difference of two files.
+
+    When the size changed, everything from the first difference to the end
+    was rewritten.
+    """
+    original_size = os.path.getsize(original)
+    modified_size = os.path.getsize(modified)
+    first = last = None
+    offset = 0
+    with open(original, 'rb') as a, open(modified, 'rb') as b:
+        while True:
+            block_a = a.read(COMPARE_BLOCK_SIZE)
+            block_b = b.read(COMPARE_BLOCK_SIZE)
+            if not block_a and not block_b:
+                break
+            if block_a != block_b:
+                if first is None:
+                    first = offset + _first_difference(block_a, block_b)
+                if original_size != modified_size:
+                    break
+                last = offset + len(block_a) - 1 - _first_difference(block_a[::-1], block_b[::-1])
+            offset += COMPARE_BLOCK_SIZE
+    if first is None:
+        return 0
+    if original_size != modified_size:
+        return modified_size - first
+    return last - first + 1
+
+def _stats(values: List[float]) -> dict:
+    values = sorted(values)
+    return {
+        'median_ms': round(statistics.median(values), 3),
+        'p95_ms': round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+    }
+
+def bench_layout(paths: List[str], work_dir: str, cold: bool) -> dict:
+    scan_times, embed_times, rewritten = [], [], []
+    total_bytes = 0
+    for path in paths:
+        if cold:
+            evict_from_cache(path)
+        start = time.perf_counter()
+        track_number = get_track_number(path)
+        scan_times.append((time.perf_counter() - start) * 1000)
+        if track_number is None:
+            raise RuntimeError(f'No track number read from {path}')
+
+        # Embed into a copy so the corpus can be reused
+        working_copy = os.path.join(work_dir, os.path.basename(path))
+        shutil.copyfile(path, working_copy)
+        if cold:
+            evict_from_cache(working_copy)
+        start = time.perf_counter()
+        if not add_lyrics_to_audio(working_copy, LYRICS):
+            raise RuntimeError(f'Could not embed lyrics into {path}')
+        embed_times.append((time.perf_counter() - start) * 1000)
+        rewritten.append(bytes_rewritten(path, working_copy))
+        total_bytes += os.path.getsize(path)
+        os.remove(working_copy)
+
+    embed_seconds = sum(embed_times) / 1000
+    return {
+        'files': len(paths),
+        'file_bytes': total_bytes // max(1, len(paths)),
+        'scan': _stats(scan_times),
+        'embed': _stats(embed_times),
+        'scan_files_per_second': round(len(paths) / (sum(scan_times) / 1000), 1),
+        'embed_files_per_second': round(len(paths) / embed_seconds, 1),
+        'embed_mb_per_second': round(total_bytes / (1024 * 1024) / embed_seconds, 1),
+        'bytes_rewritten': round(statistics.mean(rewritten)),
+    }
+
+def run_benchmarks(corpus: Dict[str, List[str]], cold: bool = False) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='tag-bench-') as work_dir:
+        for name, paths in corpus.items():
+            layout = bench_layout(paths, work_dir, cold)
+            # Flattened like the provider benchmark so the same comparison applies
+            results[f'{name}.scan'] = {**layout['scan'], 'files_per_second': layout['scan_files_per_second']}
+            results[f'{name}.embed'] = {**layout['embed'], 'files_per_second': layout['embed_files_per_second'],
+                                        'mb_per_second': layout['embed_mb_per_second'],
+                                        'bytes_rewritten': layout['bytes_rewritten'],
+                                        'file_bytes': layout['file_bytes']}
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'cold_cache': cold,
+        },
+        'results': results,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark track number scans and lyrics embedding.')
+    parser.add_argument('--corpus', help='Corpus directory (generated there when missing; a temporary one by default)')
+    parser.add_argument('--size-mb', type=float, default=5, help='Audio size per generated file')
+    parser.add_argument('--files', type=int, default=5, help='Generated files per layout')
+    parser.add_argument('--layout', choices=sorted(LAYOUTS), action='append', help='Only benchmark this layout')
+    parser.add_argument('--cold', action='store_true', help='Evict each file from the page cache before touching it')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown over the baseline (0.25 = 25%%)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging('WARNING')
+    layouts = args.layout or list(LAYOUTS)
+    with tempfile.TemporaryDirectory(prefix='tag-corpus-') as temp_dir:
+        corpus_dir = args.corpus or temp_dir
+        corpus = {}
+        for name in layouts:
+            directory = os.path.join(corpus_dir, name)
+            existing = sorted(os.path.join(directory, f) for f in os.listdir(directory)) if os.path.isdir(directory) else []
+            corpus[name] = existing or generate(corpus_dir, int(args.size_mb * 1024 * 1024), args.files, [name])[name]
+        results = run_benchmarks(corpus, args.cold)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    print(output)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,191 +7,207 @@ This script automates the complete workflow of:
 2. Adding the downloaded lyrics to corresponding audio files
 
 Usage:
-    python3 lyrics_workflow.py [lyrics_url]
+    python3 cli_lyrics_embedder.py [lyrics_url] [--metrics] [--profile] [--trace-memory] [--log-level LEVEL]
+    python3 cli_lyrics_embedder.py --manifest albums.csv [--report report.json]
+    python3 cli_lyrics_embedder.py ... --resume
+    python3 cli_lyrics_embedder.py --refresh [--refresh-interval DAYS] [--domain-budget N]
+    python3 cli_lyrics_embedder.py ... --deadline SECONDS
 
 If no URL is provided, the user will be prompted to enter one.
+With --metrics, a summary of stage latencies and HTTP counters is printed
+at the end of the run. With --profile, a cProfile report and the stage
+timings of the run are saved in the media directory. With --trace-memory,
+the peak and retained memory of every stage are logged and saved with the
+stage timings.
+
+With --manifest, every album listed in a CSV (url,path) or JSONL
+({"url": ..., "paths": [...]}) manifest is processed concurrently and a
+JSON report of each album and track is written to --report (by default
+batch-report.json in the media directory).
+
+Every run records its finished steps in a journal (--journal, by default
+journal.jsonl or batch-journal.jsonl in the media directory). After a crash,
+run the same command with --resume to skip the tag scans, fetches and
+embeds that already finished.
+
+With --refresh, the files in the media directory are checked against the
+pages their lyrics came from, and only lyrics that changed are written again.
+
+With --deadline, an album gets that many seconds to fetch its lyrics; tracks
+not fetched by then are reported as timed out instead of waited for.
 """
 
 import os
-import time
 import sys
-from typing import List
+import argparse
+from typing import List, Optional
 from pathlib import Path
-from utilities import ensure_media_directory, get_provider_from_url, get_track_number
-from lyrics_embedder import add_lyrics_to_audio
+from utilities import ensure_media_directory, get_provider_from_url
 from providers.base_provider import LyricsProvider
+from providers.http import deadline
+from metrics import REGISTRY
+from batch import BatchRunner, ManifestError, load_manifest, save_report
+from journal import Journal
+from pipeline import AlbumPipeline, scan_files
+from refresh import Refresher
+from tracing import get_logger, configure_logging, trace, save_trace, profiled, memory_by_stage
+import parse_pool
 
-def embed_files(media_files: List[Path], provider: LyricsProvider, url: str):
+log = get_logger('cli')
+
+def log_pipeline_event(name: str, data: dict):
+    """Report album pipeline progress on the console."""
+    if name == 'fetched':
+        if data['info']:
+            log.info('Lyric downloaded', track=data['track'].track_number)
+        else:
+            log.warning('Timed out' if data.get('timed_out') else 'No lyric found',
+                        track=data['track'].track_number, error=data['error'])
+    elif name == 'embedded':
+        if data['success']:
+            log.info('Lyrics embedded', filename=data['file']['filename'])
+        else:
+            log.warning('Failed to embed lyrics', filename=data['file']['filename'], error=data['error'])
+
+def embed_files(media_files: List[Path], provider: LyricsProvider, url: str, journal: Optional[Journal] = None):
     if not url or len(url.strip()) == 0:
-        print("No URL provided")
+        log.error("No URL provided")
         return False
     if not media_files or len(media_files) == 0:
-        print("No files provided")
+        log.error("No files provided")
         return False
 
-    # Get the provider for the URL
     try:
-        print("\n=== Processing Request ===")
-        print(f"Provider: {type(provider).__name__}")
-        print(f"Files: {[f.name for f in media_files]}")
-        
-        tracks_uploaded_dictionary = {}
-        files_without_track_numbers = []
+        log.info('Processing request', provider=provider.name, files=len(media_files))
+        log.debug('Request files', files=[f.name for f in media_files])
         
-        success_count = 0
-            
-        print("\n=== Processing Uploaded Files ===")
-        for i, file in enumerate(media_files, 1):
-            # Extract track number from metadata
-            track_number = get_track_number(str(file))
-            if track_number is None:
-                error_msg = f"No track number found in metadata"
-                print(f"{file.name}: {error_msg}")
-                files_without_track_numbers.append({
-                    'filename': file.name,
-                    'error': error_msg
-                })
-                continue
-            file_size = file.stat().st_size
-            print(f"{file.name}: Track {track_number}, Size: {file_size} bytes")
-            tracks_uploaded_dictionary[track_number] = {
-                'path': file,
-                'filename': file.name,
-                'size': file_size
-            }
-        
-        # Sort tracks by track number
-        sorted_tracks = dict(sorted(tracks_uploaded_dictionary.items()))
-        
-        # Prepare unified tracks list with status information
-        unified_tracks = []
-        
-        # Add valid tracks with 'processing' status
-        for num, info in sorted_tracks.items():
-            unified_tracks.append({
-                'track_number': num,
-                'filename': info['filename'],
-                'size': info['size'],
-                'status': 'uploaded',
-                'message': 'File uploaded'
-            })
-        
-        # Add invalid tracks with error status
-        for track in files_without_track_numbers:
-            unified_tracks.append({
-                'track_number': None,
-                'filename': track['filename'],
-                'size': 0,
-                'status': 'error',
-                'message': 'File does not have a track number in its metadata'
-            })
-        
-        # Sort unified tracks by track number (valid tracks first, then invalid)
-        unified_tracks.sort(key=lambda x: (x['track_number'] is None, x['track_number']))
+        tracks_uploaded_dictionary, _ = scan_files([str(file) for file in media_files], journal)
         
         # If no tracks with track numbers were found, return early
         if not tracks_uploaded_dictionary:
-            print('No tracks with valid track numbers were found in the uploaded files')
+            log.error('No tracks with valid track numbers were found in the uploaded files')
             return False
         
-        # Fetch the list of urls for tracks lyrics from the album
-        print("\n=== Fetching Album Tracks ===")
-        unprocessed_track_info_list = provider.get_track_info_without_lyrics_list_from_album(url)
-        if not unprocessed_track_info_list:
-            print('No tracks found for this album URL')
+        # Fetch lyrics and embed them as they arrive
+        pipeline = AlbumPipeline(provider, on_event=log_pipeline_event, journal=journal)
+        result = pipeline.run(url, tracks_uploaded_dictionary)
+        if not result.album_tracks:
+            log.error('No tracks found for this album URL')
             return False
-        
-        # Create a list of track info that match the track numbers
-        matched_unprocessed_track_info_list = []
-        for unprocessed_track_info in unprocessed_track_info_list:
-            track_number = unprocessed_track_info.track_number
-            if track_number in tracks_uploaded_dictionary:
-                matched_unprocessed_track_info_list.append(unprocessed_track_info)
-        
-        # Print every unprocessed track_info from matched_unprocessed_track_info_list
-        for unprocessed_track_info in matched_unprocessed_track_info_list:
-            print(unprocessed_track_info)
-         
-        # Process each track and send updates
-        processed_count = 0
-        at_least_one_lyric_successfully_processed = False
-        matched_processed_track_info_dict = {}
-        for matched_unprocessed_track_info in matched_unprocessed_track_info_list:
-            processed_count += 1
-            track_number = matched_unprocessed_track_info.track_number
-            # Simulate processing time
-            time.sleep(0.5)
-
-            # Process the track
-            try:
-                # First get track info to display
-                track_info = provider.get_track_info(matched_unprocessed_track_info.url, track_number)
-                if track_info and track_info.lyrics and track_info.lyrics.strip() != '':
-                    at_least_one_lyric_successfully_processed = True
-                    # Success: processed update with track info
-                    # Update the track info in the list with the one that has lyrics
-                    matched_processed_track_info_dict[track_number] = track_info
-                    print(f"Lyric downloaded for track {track_number}")
-                    continue
-                
-                # If we get here, either track_info is None or process_track failed
-                error_msg = f'No lyric found for track {track_number}'
-                print(error_msg)
-           
-            except Exception as e:
-                error_msg = f'Error processing track {track_number}: {str(e)}'
-                print(error_msg)
-        
-        if not at_least_one_lyric_successfully_processed:
-            print('No tracks were successfully processed')
+        if not result.fetched:
+            log.error('No tracks were successfully processed')
             return False
-        print('At least one lyric was successfully downloaded')
-
-        for track_number, processed_track_info in matched_processed_track_info_dict.items():
-            # Get the saved file path from tracks_uploaded_dictionary
-            file_info = tracks_uploaded_dictionary.get(track_number)
-            if file_info:
-                print(f"\n=== Processing file: {file_info['path']} ===")
-            file_path = str(file_info['path'])
-            print(f"Original size: {os.path.getsize(file_path)} bytes")
-            print(f"Lyrics type: {type(processed_track_info.lyrics)}")
-            print(f"Lyrics preview: {str(processed_track_info.lyrics)[:30]}..." if processed_track_info.lyrics else "No lyrics content")
-            success = add_lyrics_to_audio(file_path, processed_track_info.lyrics)
-            
-            if success:
-                success_count += 1
-                print(f"Successfully embedded lyrics in {file_info['filename']}")
-            else:
-                print(f"Failed to embed lyrics in {file_info['filename']}")
         
-        if success_count > 0:
-            print(
-                f"Successfully embedded lyrics in {success_count} files",
-                {
-                    'success': True,
-                    'processed_count': processed_count,
-                    'total_tracks': len(tracks_uploaded_dictionary),
-                    'message': 'Lyrics embedded successfully',
-                    'success_count': success_count
-                }
-            )
+        if result.embedded > 0:
+            log.info(f"Successfully embedded lyrics in {result.embedded} files", processed_count=len(result.matched),
+                     total_tracks=len(tracks_uploaded_dictionary))
             return True
-        print("No files were successfully embedded")
+        log.error("No files were successfully embedded")
         return False
     except Exception as e:
-        error_msg = str(e)
-        print(f"Error: {error_msg}")
+        log.exception('Error embedding lyrics', error=e)
+        return False
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Download lyrics and embed them into the audio files in the media folder.')
+    parser.add_argument('url', nargs='?', help='Album URL (Genius or Musixmatch)')
+    parser.add_argument('--metrics', action='store_true', help='Print a metrics summary at the end of the run')
+    parser.add_argument('--profile', action='store_true', help='Save a cProfile report and stage timings in the media directory')
+    parser.add_argument('--trace-memory', action='store_true', help='Record peak and retained memory per stage with tracemalloc')
+    parser.add_argument('--log-level', default=None, help='Logging level (DEBUG, INFO, WARNING, ERROR); defaults to LYRICS_LOG_LEVEL or INFO')
+    parser.add_argument('--manifest', help='CSV or JSONL manifest of album URLs and audio files or folders')
+    parser.add_argument('--report', help='Where to write the JSON batch report (default: media/batch-report.json)')
+    parser.add_argument('--journal', help='Where to record finished steps (default: journal.jsonl or batch-journal.jsonl in media)')
+    parser.add_argument('--resume', action='store_true', help='Skip the steps an interrupted run already recorded in the journal')
+    parser.add_argument('--refresh', action='store_true', help='Update lyrics embedded by earlier runs that changed at their source')
+    parser.add_argument('--refresh-interval', type=float, default=7, help='Days before a file is checked again in refresh mode')
+    parser.add_argument('--domain-budget', type=int, default=100, help='Requests per provider domain in one refresh run')
+    parser.add_argument('--refresh-state', help='Where to keep refresh validators and check times (default: media/refresh-state.json)')
+    parser.add_argument('--deadline', type=float, default=None, help='Seconds an album may spend fetching lyrics before its remaining tracks time out')
+    parser.add_argument('--parse-processes', type=int, default=0, help='Parse pages in this many worker processes (0: in the main process)')
+    parser.add_argument('--network-concurrency', type=int, default=4, help='Provider requests in flight in batch mode')
+    parser.add_argument('--disk-concurrency', type=int, default=2, help='Tag reads and writes in flight in batch mode')
+    parser.add_argument('--album-concurrency', type=int, default=2, help='Albums scraped at the same time in batch mode')
+    return parser.parse_args(argv)
+
+def print_metrics_summary():
+    print("\n=== Metrics ===")
+    print(REGISTRY.summary() or "No metrics recorded")
+
+def log_memory(root):
+    """Log the peak memory of every stage of a trace recorded with --trace-memory."""
+    if root.peak_bytes is None:
+        return
+    for name, stage in memory_by_stage(root).items():
+        log.info('Stage memory', stage=name, **stage)
+    log.info('Run memory', peak_kib=round(root.peak_bytes / 1024, 1), retained_kib=round(root.retained_bytes / 1024, 1))
+
+def run_batch(args):
+    """Process every album of a manifest and write the report."""
+    try:
+        items = load_manifest(args.manifest)
+    except (OSError, ManifestError) as e:
+        log.error('Could not read manifest', path=args.manifest, error=e)
         return False
+    media_dir = ensure_media_directory()
+    journal = Journal(args.journal or os.path.join(media_dir, 'batch-journal.jsonl'), resume=args.resume)
+    runner = BatchRunner(network_concurrency=args.network_concurrency, disk_concurrency=args.disk_concurrency,
+                         album_concurrency=args.album_concurrency, journal=journal, album_deadline=args.deadline,
+                         on_album=lambda report: log.info('Album finished', url=report['url'],
+                                                          status=report['status'], message=report['message']))
+    with journal, trace('batch', memory=args.trace_memory, albums=len(items)) as batch_trace, \
+            profiled(os.path.join(media_dir, 'profile.prof'), enabled=args.profile):
+        report = runner.run(items)
+    if args.resume:
+        log.info('Resumed from journal', path=journal.path, skipped_steps=journal.skipped)
+    log_memory(batch_trace)
+    if args.profile or args.trace_memory:
+        save_trace(batch_trace, os.path.join(media_dir, 'trace.json'))
+    report_path = args.report or os.path.join(media_dir, 'batch-report.json')
+    save_report(report, report_path)
+    log.info('Report saved', path=report_path, **report['summary'])
+    return report['summary']['albums_succeeded'] > 0
+
+def run_refresh(args):
+    """Re-check the lyrics embedded in the media directory and rewrite those that changed."""
+    media_dir = ensure_media_directory()
+    media_files = sorted(str(f) for f in Path(media_dir).glob('*') if f.suffix.lower() in ['.mp3', '.m4a'])
+    refresher = Refresher(args.refresh_state or os.path.join(media_dir, 'refresh-state.json'),
+                          interval=args.refresh_interval * 24 * 60 * 60, domain_budget=args.domain_budget,
+                          on_file=lambda result: log.info('Refreshed', **result))
+    with trace('refresh', memory=args.trace_memory, files=len(media_files)) as refresh_trace, \
+            profiled(os.path.join(media_dir, 'profile.prof'), enabled=args.profile):
+        report = refresher.run(media_files)
+    log_memory(refresh_trace)
+    if args.profile or args.trace_memory:
+        save_trace(refresh_trace, os.path.join(media_dir, 'trace.json'))
+    return report['summary'].get('error', 0) == 0
 
 def main():
+    args = parse_args()
+    configure_logging(args.log_level, fmt='%(message)s')
+    parse_pool.configure(args.parse_processes)
+    
+    if args.refresh:
+        success = run_refresh(args)
+        if args.metrics:
+            print_metrics_summary()
+        sys.exit(0 if success else 1)
+    
+    if args.manifest:
+        success = run_batch(args)
+        if args.metrics:
+            print_metrics_summary()
+        sys.exit(0 if success else 1)
+    
     # Ensure directories exist and get their paths
     media_dir = ensure_media_directory()
     
     print(f"\nMedia directory: {media_dir}\n")
     
     # Get URL from command line or prompt
-    if len(sys.argv) > 1:
-        url = sys.argv[1]
+    if args.url:
+        url = args.url
     else:
         url = input("\nEnter lyrics URL (Genius or Musixmatch): ")
     
@@ -203,12 +219,24 @@ def main():
     print(f"\nUsing provider: {provider.__class__.__name__}")
     
     # Check if there are any files in the media directory
-    media_files = list(Path(media_dir).glob('*'))
-    if not any(f.suffix.lower() in ['.mp3', '.m4a'] for f in media_files):
+    # Only audio files: reports, traces and the journal live in the same folder
+    media_files = [f for f in Path(media_dir).glob('*') if f.suffix.lower() in ['.mp3', '.m4a']]
+    if not media_files:
         print(f"Warning: No audio files found in {media_dir}")
         print("Please add your audio files to the 'media' directory and run the script again.")
         return
-    success = embed_files(media_files, provider, url)
+    journal = Journal(args.journal or os.path.join(media_dir, 'journal.jsonl'), resume=args.resume)
+    with journal, trace('job', memory=args.trace_memory, provider=provider.name) as job_trace, \
+            profiled(os.path.join(media_dir, 'profile.prof'), enabled=args.profile), deadline(args.deadline):
+        success = embed_files(media_files, provider, url, journal)
+    log.info('Run finished', duration_ms=round(job_trace.duration * 1000, 1))
+    if args.resume:
+        log.info('Resumed from journal', path=journal.path, skipped_steps=journal.skipped)
+    log_memory(job_trace)
+    if args.profile or args.trace_memory:
+        save_trace(job_trace, os.path.join(media_dir, 'trace.json'))
+    if args.metrics:
+        print_metrics_summary()
     if not success:
         print("Failed to embed lyrics to audio files")
         return
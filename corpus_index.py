@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Sorted, memory-mapped index of a local lyrics corpus.
+
+A corpus is a folder of JSON lines files (one ``{"artist", "album", "title",
+"track_number", "lyrics"}`` object per line) and LRC files (``[ar:]``,
+``[al:]`` and ``[ti:]`` tags, with the track number from a ``[tn:]`` tag or
+the leading digits of the file name). The index maps the normalized
+``artist/album/title`` of every track to where its record lives in the
+corpus, so a lookup is a binary search in the mapped index plus one read of
+the record, and an album is a prefix range of the index.
+
+Building the index is an external sort: entries are collected in runs of at
+most ``run_size``, each run is sorted and spilled to a temporary file, and
+the runs are merged into the index, so memory stays bounded whatever the
+size of the corpus.
+
+Usage:
+    python corpus_index.py build <corpus_dir> <index_path> [--run-size 100000]
+    python corpus_index.py lookup <index_path> <artist> <album> [<title>]
+"""
+
+import argparse
+import heapq
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import unicodedata
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, List, Optional
+
+from tracing import get_logger
+
+log = get_logger('corpus_index')
+
+# Version 2: keys keep non-Latin letters (version 1 indexes must be rebuilt)
+MAGIC = b'LYRIDX02'
+# magic, entry count, offset of the entry offsets table, offset of the files table
+HEADER = struct.Struct('>8sQQQ')
+# key, artist and title lengths, file id, record offset and length, track number (-1 when unknown)
+ENTRY = struct.Struct('>HHHIQIi')
+OFFSET = struct.Struct('>Q')
+
+LRC_TAG = re.compile(r'^\[(ar|al|ti|tn|track):(.*)\]\s*$', re.IGNORECASE)
+LRC_TIMESTAMP = re.compile(r'^(\[\d+:\d+(?:[.:]\d+)?\])+')
+LRC_METADATA = re.compile(r'^\[[a-z#]+:.*\]\s*$', re.IGNORECASE)
+
+class CorpusIndexError(ValueError):
+    """Raised when an index file is missing or malformed."""
+
+def normalize(text: str) -> str:
+    """Casefolded slug: accents removed, letters and digits of any script kept, the rest collapsed to '-'."""
+    text = unicodedata.normalize('NFKD', (text or '').casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r'[\W_]+', '-', unicodedata.normalize('NFC', text), flags=re.UNICODE).strip('-')
+
+def make_key(artist: str, album: str, title: str = '') -> bytes:
+    """Index key; an album key without a title is the prefix of all its tracks."""
+    return '\0'.join((normalize(artist), normalize(album), normalize(title))).encode('utf-8')
+
+@dataclass
+class Entry:
+    """A track in the index and where its record is stored."""
+    key: bytes
+    artist: str
+    title: str
+    file_id: int
+    offset: int
+    length: int
+    track_number: Optional[int]
+
+    def pack(self) -> bytes:
+        artist = self.artist.encode('utf-8')[:0xFFFF]
+        title = self.title.encode('utf-8')[:0xFFFF]
+        track = -1 if self.track_number is None else self.track_number
+        return ENTRY.pack(len(self.key), len(artist), len(title), self.file_id, self.offset, self.length,
+                          track) + self.key + artist + title
+
+def _unpack(buffer, position: int) -> Entry:
+    key_length, artist_length, title_length, file_id, offset, length, track = ENTRY.unpack_from(buffer, position)
+    position += ENTRY.size
+    key = bytes(buffer[position:position + key_length])
+    position += key_length
+    artist = bytes(buffer[position:position + artist_length]).decode('utf-8', 'replace')
+    position += artist_length
+    title = bytes(buffer[position:position + title_length]).decode('utf-8', 'replace')
+    return Entry(key, artist, title, file_id, offset, length, None if track < 0 else track)
+
+def _read_entries(f: BinaryIO) -> Iterator[Entry]:
+    """Entries of a spilled run, in the order they were written."""
+    while True:
+        header = f.read(ENTRY.size)
+        if len(header) < ENTRY.size:
+            return
+        key_length, artist_length, title_length = struct.unpack_from('>HHH', header)
+        rest = f.read(key_length + artist_length + title_length)
+        yield _unpack(header + rest, 0)
+
+def parse_lrc(text: str, filename: str = '') -> dict:
+    """Tags and plain lyrics of an LRC file; timestamps and metadata lines are dropped."""
+    record = {'artist': '', 'album': '', 'title': '', 'track_number': None}
+    lines = []
+    for line in text.splitlines():
+        tag = LRC_TAG.match(line)
+        if tag:
+            name, value = tag.group(1).lower(), tag.group(2).strip()
+            if name in ('tn', 'track'):
+                record['track_number'] = int(value) if value.isdigit() else None
+            else:
+                record[{'ar': 'artist', 'al': 'album', 'ti': 'title'}[name]] = value
+            continue
+        if LRC_METADATA.match(line):
+            continue
+        lines.append(LRC_TIMESTAMP.sub('', line).strip())
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    number = re.match(r'^(\d+)[\s._-]*(.*)$', stem)
+    if record['track_number'] is None and number:
+        record['track_number'] = int(number.group(1))
+    if not record['title']:
+        record['title'] = number.group(2) if number else stem
+    record['lyrics'] = '\n'.join(lines).strip()
+    return record
+
+def _scan_corpus(corpus_dir: str, files: List[str]) -> Iterator[Entry]:
+    """Index entries of every corpus file, one record at a time."""
+    for root, _, names in os.walk(corpus_dir):
+        for name in sorted(names):
+            lower = name.lower()
+            if not lower.endswith(('.jsonl', '.lrc')):
+                continue
+            path = os.path.join(root, name)
+            file_id = len(files)
+            files.append(os.path.relpath(path, corpus_dir))
+            if lower.endswith('.lrc'):
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    record = parse_lrc(f.read(), name)
+                yield Entry(make_key(record['artist'], record['album'], record['title']), record['artist'],
+                            record['title'], file_id, 0, os.path.getsize(path), record['track_number'])
+                continue
+            offset = 0
+            with open(path, 'rb') as f:
+                for line_number, line in enumerate(f, 1):
+                    start, offset = offset, offset + len(line)
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        log.warning('Skipping malformed corpus line', path=path, line=line_number)
+                        continue
+                    track_number = record.get('track_number')
+                    yield Entry(make_key(record.get('artist', ''), record.get('album', ''), record.get('title', '')),
+                                record.get('artist', ''), record.get('title', ''), file_id, start, len(line),
+                                int(track_number) if str(track_number or '').isdigit() else None)
+
+def _spill(entries: List[Entry], directory: str) -> str:
+    entries.sort(key=lambda entry: entry.key)
+    fd, path = tempfile.mkstemp(suffix='.run', dir=directory)
+    with os.fdopen(fd, 'wb') as f:
+        for entry in entries:
+            f.write(entry.pack())
+    return path
+
+def build_index(corpus_dir: str, index_path: str, run_size: int = 100_000) -> int:
+    """Index every JSONL and LRC file below corpus_dir; returns the number of entries.
+
+    At most run_size entries are held in memory. The index is written to a
+    temporary file and moved into place, so readers never see a partial one.
+    """
+    corpus_dir = os.path.abspath(corpus_dir)
+    directory = os.path.dirname(os.path.abspath(index_path))
+    files: List[str] = []
+    runs: List[str] = []
+    try:
+        batch: List[Entry] = []
+        for entry in _scan_corpus(corpus_dir, files):
+            batch.append(entry)
+            if len(batch) >= run_size:
+                runs.append(_spill(batch, directory))
+                batch = []
+        if batch:
+            runs.append(_spill(batch, directory))
+
+        count = 0
+        temp_index = index_path + '.tmp'
+        with tempfile.TemporaryFile(dir=directory) as offsets, open(temp_index, 'wb') as out:
+            out.write(HEADER.pack(MAGIC, 0, 0, 0))
+            readers = [open(path, 'rb') for path in runs]
+            try:
+                previous = None
+                for entry in heapq.merge(*(_read_entries(f) for f in readers), key=lambda entry: entry.key):
+                    # The first record of a track wins over later duplicates
+                    if entry.key == previous:
+                        continue
+                    previous = entry.key
+                    offsets.write(OFFSET.pack(out.tell()))
+                    out.write(entry.pack())
+                    count += 1
+            finally:
+                for f in readers:
+                    f.close()
+            offsets_start = out.tell()
+            offsets.seek(0)
+            while True:
+                chunk = offsets.read(1024 * 1024)
+                if not chunk:
+                    break
+                out.write(chunk)
+            files_start = out.tell()
+            out.write(json.dumps({'root': corpus_dir, 'files': files}).encode('utf-8'))
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, count, offsets_start, files_start))
+        os.replace(temp_index, index_path)
+    finally:
+        for path in runs:
+            os.remove(path)
+    log.info('Corpus indexed', corpus=corpus_dir, index=index_path, entries=count, files=len(files), runs=len(runs))
+    return count
+
+class CorpusIndex:
+    """Read-only view of an index file, mapped into memory."""
+
+    def __init__(self, index_path: str):
+        self.path = index_path
+        try:
+            with open(index_path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise CorpusIndexError(f'Cannot open corpus index {index_path}: {e}')
+        magic, self.count, self._offsets, files_start = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            if magic[:6] == MAGIC[:6]:
+                raise CorpusIndexError(f'{index_path} was built by an older version, rebuild it')
+            raise CorpusIndexError(f'{index_path} is not a corpus index')
+        files = json.loads(self._map[files_start:].decode('utf-8'))
+        self.root = files['root']
+        self.files = files['files']
+
+    def _entry(self, index: int) -> Entry:
+        position, = OFFSET.unpack_from(self._map, self._offsets + index * OFFSET.size)
+        return _unpack(self._map, position)
+
+    def _key(self, index: int) -> bytes:
+        position, = OFFSET.unpack_from(self._map, self._offsets + index * OFFSET.size)
+        key_length, = struct.unpack_from('>H', self._map, position)
+        start = position + ENTRY.size
+        return self._map[start:start + key_length]
+
+    def _lower_bound(self, key: bytes) -> int:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, artist: str, album: str, title: str) -> Optional[Entry]:
+        key = make_key(artist, album, title)
+        index = self._lower_bound(key)
+        if index < self.count and self._key(index) == key:
+            return self._entry(index)
+        return None
+
+    def album(self, artist: str, album: str) -> List[Entry]:
+        """Tracks of an album, by track number."""
+        prefix = make_key(artist, album)
+        entries = []
+        index = self._lower_bound(prefix)
+        while index < self.count and self._key(index).startswith(prefix):
+            entries.append(self._entry(index))
+            index += 1
+        return sorted(entries, key=lambda entry: (entry.track_number is None, entry.track_number or 0, entry.title))
+
+    def record(self, entry: Entry) -> dict:
+        """The corpus record of an entry, with plain lyrics."""
+        path = os.path.join(self.root, self.files[entry.file_id])
+        with open(path, 'rb') as f:
+            f.seek(entry.offset)
+            data = f.read(entry.length).decode('utf-8', 'replace')
+        if path.lower().endswith('.lrc'):
+            return parse_lrc(data, path)
+        return json.loads(data)
+
+    def close(self) -> None:
+        self._map.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Build or query a local lyrics corpus index.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='Index a folder of JSONL and LRC files')
+    build.add_argument('corpus_dir')
+    build.add_argument('index_path')
+    build.add_argument('--run-size', type=int, default=100_000, help='Entries sorted in memory at a time')
+    lookup = commands.add_parser('lookup', help='List an album or show a track')
+    lookup.add_argument('index_path')
+    lookup.add_argument('artist')
+    lookup.add_argument('album')
+    lookup.add_argument('title', nargs='?')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    from tracing import configure_logging
+    args = parse_args(argv)
+    configure_logging(fmt='%(message)s')
+    if args.command == 'build':
+        build_index(args.corpus_dir, args.index_path, args.run_size)
+        return 0
+    index = CorpusIndex(args.index_path)
+    if args.title:
+        entry = index.find(args.artist, args.album, args.title)
+        if entry is None:
+            print('Not found')
+            return 1
+        print(index.record(entry).get('lyrics', ''))
+        return 0
+    for entry in index.album(args.artist, args.album):
+        print(f'{entry.track_number or "-":>3}  {entry.title}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
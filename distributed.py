@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Coordinator/worker mode: scrape and embed an album with several worker processes.
+
+The coordinator runs the steps of ``embed_files`` as tasks on a shared queue:
+
+- ``album``: fetch the album's track list
+- ``fetch``: fetch the lyrics of one matched track
+- ``embed``: write fetched lyrics into one audio file
+
+It scans the files itself, queues the album, matches the returned tracks with
+the files, queues a fetch per matched track and an embed per fetched track,
+and reports progress with the same events as the album pipeline. Workers pull
+tasks of the kinds they accept, so nodes with their own IP address can take
+the fetches and nodes with the files can take the embeds (file paths must
+resolve on the worker that embeds them). Leases and retries come from the
+queue: the tasks of a worker that dies are picked up by another one.
+The SQLite queue is meant for processes on one host; see task_queue for what
+``--shared-volume`` does and does not guarantee across nodes.
+
+Usage:
+    python distributed.py coordinator --queue queue.db [--timeout 600] <album_url> <files or folders>...
+    python distributed.py worker --queue queue.db [--kinds fetch,album] [--idle-exit 30]
+"""
+
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from dataclasses import asdict
+from typing import Callable, Dict, List, Optional, Sequence
+
+from providers.base_provider import LyricsProvider, TrackInfo
+from providers.factory import ProviderFactory
+from lyrics_embedder import add_lyrics_to_audio
+from pipeline import PipelineResult, scan_files
+from task_queue import DONE, SQLiteQueue, Task, TaskQueue
+from tracing import get_logger, span
+
+log = get_logger('distributed')
+
+TASK_KINDS = ('album', 'fetch', 'embed')
+
+def provider_for(url: str, name: Optional[str] = None) -> Optional[LyricsProvider]:
+    """The provider registered as name, or else the one for the URL.
+
+    Track URLs do not always identify their provider (e.g. on a mirror), so
+    track tasks carry the name of the provider that listed the album.
+    """
+    if name:
+        provider_class = ProviderFactory.get_provider(name)
+        return provider_class() if provider_class else None
+    return ProviderFactory.get_provider_for_url(url)
+
+class Worker:
+    """Pull tasks from a queue and run them until stopped.
+
+    Args:
+        queue: Queue shared with the coordinator
+        worker_id: Name recorded with every lease; defaults to host and process id
+        kinds: Task kinds this worker accepts; all by default
+        lease_seconds: Lease length; renewed in the background while a task runs
+        poll_interval: Seconds to wait when no task is available
+        provider_for: Provider for a URL and an optional provider name
+    """
+
+    def __init__(self, queue: TaskQueue, worker_id: Optional[str] = None, kinds: Sequence[str] = TASK_KINDS,
+                 lease_seconds: float = 60, poll_interval: float = 0.5,
+                 provider_for: Callable[[str, Optional[str]], Optional[LyricsProvider]] = provider_for):
+        self.queue = queue
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+        self.kinds = list(kinds)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.provider_for = provider_for
+        self.processed = 0
+        self.stop_event = threading.Event()
+
+    def run(self, idle_exit: Optional[float] = None) -> int:
+        """Process tasks until stop() is called, or no task came for idle_exit seconds."""
+        log.info('Worker started', worker=self.worker_id, kinds=','.join(self.kinds))
+        idle_since = time.monotonic()
+        while not self.stop_event.is_set():
+            task = self.queue.lease(self.worker_id, self.kinds, self.lease_seconds)
+            if task is None:
+                if idle_exit is not None and time.monotonic() - idle_since >= idle_exit:
+                    break
+                self.stop_event.wait(self.poll_interval)
+                continue
+            self.run_task(task)
+            idle_since = time.monotonic()
+        log.info('Worker stopped', worker=self.worker_id, processed=self.processed)
+        return self.processed
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def run_task(self, task: Task) -> None:
+        done = threading.Event()
+        renewer = threading.Thread(target=self._renew, args=(task, done), name=f'lease-{task.id}', daemon=True)
+        renewer.start()
+        try:
+            with span(task.kind, task=task.id):
+                result = getattr(self, f'_{task.kind}')(**task.payload)
+        except Exception as e:
+            log.warning('Task failed', worker=self.worker_id, task=task.id, kind=task.kind,
+                        attempt=task.attempts, error=e)
+            self.queue.fail(task.id, self.worker_id, str(e))
+        else:
+            if not self.queue.complete(task.id, self.worker_id, result):
+                log.warning('Lease lost before the task finished', worker=self.worker_id, task=task.id)
+        finally:
+            done.set()
+            renewer.join()
+        self.processed += 1
+
+    def _renew(self, task: Task, done: threading.Event) -> None:
+        while not done.wait(self.lease_seconds / 3):
+            if not self.queue.renew(task.id, self.worker_id, self.lease_seconds):
+                return
+
+    def _provider(self, url: str, name: Optional[str] = None) -> LyricsProvider:
+        provider = self.provider_for(url, name)
+        if provider is None:
+            raise ValueError(f'Unsupported URL: {url}')
+        return provider
+
+    def _album(self, url: str) -> dict:
+        provider = self._provider(url)
+        tracks = provider.get_track_info_without_lyrics_list_from_album(url)
+        if not tracks:
+            # Providers return an empty list when the page could not be read; worth a retry
+            raise RuntimeError('No tracks found for this album URL')
+        return {'provider': provider.name, 'tracks': [asdict(track) for track in tracks]}
+
+    def _fetch(self, url: str, track_number: Optional[int], provider: Optional[str] = None) -> dict:
+        info = self._provider(url, provider).get_track_info(url, track_number)
+        if info is None:
+            # Providers return None when the page could not be fetched (network error, 429, 5xx); worth a retry
+            raise RuntimeError(f'Could not fetch track {track_number}')
+        if not info.lyrics or not info.lyrics.strip():
+            return {'info': None, 'error': f'No lyric found for track {track_number}'}
+        return {'info': asdict(info)}
+
+    def _embed(self, path: str, lyrics: str, source_url: Optional[str] = None) -> dict:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'File not found: {path}')
+        if not add_lyrics_to_audio(path, lyrics, source_url=source_url):
+            raise RuntimeError(f'Failed to process {os.path.basename(path)}')
+        return {'success': True}
+
+class Coordinator:
+    """Queue the steps of an album and collect their results.
+
+    Args:
+        queue: Queue shared with the workers
+        on_event: Called with (name, data) like AlbumPipeline's on_event
+        poll_interval: Seconds between checks for finished tasks
+        max_attempts: Attempts per task before it fails for good
+        timeout: Seconds to wait for the album's tasks, e.g. when no worker is
+            running; tasks still unfinished then are cancelled and reported as failed
+    """
+
+    def __init__(self, queue: TaskQueue, on_event: Optional[Callable[[str, dict], None]] = None,
+                 poll_interval: float = 0.2, max_attempts: int = 3, timeout: Optional[float] = None):
+        self.queue = queue
+        self.on_event = on_event or (lambda name, data: None)
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+    def _finished(self, task_ids: List[int], give_up_at: Optional[float]) -> Optional[List[Task]]:
+        """Wait until some of the tasks finish; None once the timeout is reached."""
+        while True:
+            finished = self.queue.finished(task_ids)
+            if finished:
+                return finished
+            if give_up_at is not None and time.monotonic() >= give_up_at:
+                return None
+            time.sleep(self.poll_interval)
+
+    def run(self, url: str, paths: List[str]) -> PipelineResult:
+        result = PipelineResult()
+        give_up_at = None if self.timeout is None else time.monotonic() + self.timeout
+        files, _ = scan_files(paths)
+        album_id = self.queue.put('album', {'url': url}, self.max_attempts)
+        album_tasks = self._finished([album_id], give_up_at)
+        if album_tasks is None:
+            log.warning('Timed out waiting for the album', url=url)
+            self.queue.cancel([album_id], 'Timed out waiting for a worker')
+            return result
+        album_task, = album_tasks
+        if album_task.status != DONE:
+            log.warning('Album fetch failed', url=url, error=album_task.error)
+            return result
+        album_tracks = [TrackInfo(**track) for track in album_task.result['tracks']]
+        result.album_tracks = len(album_tracks)
+        result.matched = [track for track in album_tracks if track.track_number in files]
+        log.info('Album tracks matched', album_tracks=result.album_tracks, matched=len(result.matched))
+        self.on_event('matched', {'album_tracks': result.album_tracks, 'tracks': result.matched})
+
+        total = len(result.matched)
+        fetches: Dict[int, TrackInfo] = {
+            self.queue.put('fetch', {'url': track.url, 'track_number': track.track_number,
+                                     'provider': album_task.result['provider']}, self.max_attempts): track
+            for track in result.matched}
+        embeds: Dict[int, TrackInfo] = {}
+        fetched_count = embedded_count = 0
+        pending = list(fetches)
+        while pending:
+            finished = self._finished(pending, give_up_at)
+            if finished is None:
+                log.warning('Timed out waiting for workers', url=url, unfinished=len(pending))
+                # Cancelled in the queue too, so that a worker coming later does not write into the files
+                self.queue.cancel(pending, 'Timed out waiting for a worker')
+                finished = self.queue.finished(pending)
+            for task in finished:
+                pending.remove(task.id)
+                if task.kind == 'fetch':
+                    fetched_count += 1
+                    track = fetches[task.id]
+                    info = TrackInfo(**task.result['info']) if task.status == DONE and task.result['info'] else None
+                    error = None if info else (task.result or {}).get('error') or \
+                        f'Error processing track {track.track_number}: {task.error}'
+                    self.on_event('fetched', {'track': track, 'info': info, 'error': error,
+                                              'index': fetched_count, 'total': total})
+                    if info is None:
+                        continue
+                    result.fetched += 1
+                    path = files[track.track_number]['path']
+                    embed_id = self.queue.put('embed', {'path': os.path.abspath(path), 'lyrics': info.lyrics,
+                                                        'source_url': info.url}, self.max_attempts)
+                    embeds[embed_id] = info
+                    pending.append(embed_id)
+                else:
+                    embedded_count += 1
+                    info = embeds[task.id]
+                    success = task.status == DONE
+                    result.embedded += success
+                    self.on_event('embedded', {'info': info, 'file': files[info.track_number], 'success': success,
+                                               'error': None if success else task.error,
+                                               'index': embedded_count, 'total': total})
+        return result
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Scrape and embed lyrics with several worker processes.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    coordinator = commands.add_parser('coordinator', help='Queue an album and wait for the workers')
+    coordinator.add_argument('url', help='Album URL (Genius or Musixmatch)')
+    coordinator.add_argument('paths', nargs='+', help='Audio files or folders, at paths the embedding workers can reach')
+    coordinator.add_argument('--max-attempts', type=int, default=3, help='Attempts per task before it fails')
+    coordinator.add_argument('--timeout', type=float, default=None, help='Seconds to wait for the workers before giving up')
+    worker = commands.add_parser('worker', help='Run tasks from the queue')
+    worker.add_argument('--kinds', default=','.join(TASK_KINDS), help='Comma-separated task kinds to accept')
+    worker.add_argument('--lease', type=float, default=60, help='Lease length in seconds')
+    worker.add_argument('--idle-exit', type=float, default=None, help='Exit after this many seconds without tasks')
+    for command in (coordinator, worker):
+        command.add_argument('--queue', default=os.path.join('media', 'queue.db'),
+                             help='SQLite queue file shared by the coordinator and the workers on this host')
+        command.add_argument('--shared-volume', action='store_true',
+                             help='The queue file is on a network volume used from several hosts (no WAL; '
+                                  'needs working file locks)')
+        command.add_argument('--log-level', default=None, help='Logging level; defaults to LYRICS_LOG_LEVEL or INFO')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    from batch import expand_paths
+    from cli_lyrics_embedder import log_pipeline_event
+    from tracing import configure_logging
+    args = parse_args(argv)
+    configure_logging(args.log_level, fmt='%(message)s')
+    queue = SQLiteQueue(args.queue, shared_volume=args.shared_volume)
+    if args.command == 'worker':
+        worker = Worker(queue, kinds=[kind.strip() for kind in args.kinds.split(',') if kind.strip()],
+                        lease_seconds=args.lease)
+        try:
+            worker.run(idle_exit=args.idle_exit)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    coordinator = Coordinator(queue, on_event=log_pipeline_event, max_attempts=args.max_attempts,
+                              timeout=args.timeout)
+    result = coordinator.run(args.url, expand_paths(args.paths))
+    log.info('Album finished', url=args.url, matched=len(result.matched), fetched=result.fetched,
+             embedded=result.embedded, queue=queue.counts())
+    return 0 if result.embedded else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
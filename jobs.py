@@ -0,0 +1,55 @@
+"""
+Files attached to a job before it is processed.
+
+The browser uploads a job's files over several parallel requests. Each file is
+saved and analyzed as soon as it arrives, and the results wait here until the
+job is processed. The folder of a job with attached files stays pinned until
+the job is processed, or until no file was attached for a while (expire).
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+class JobFiles:
+    """Per-job analysis of attached files: tracks by number, and files without one."""
+
+    def __init__(self):
+        self._tracks: Dict[str, Dict[int, dict]] = {}
+        self._errors: Dict[str, List[dict]] = {}
+        self._updated: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, job_id: str, track_number: Optional[int], info: dict) -> None:
+        with self._lock:
+            self._updated[job_id] = time.monotonic()
+            if track_number is None:
+                self._errors.setdefault(job_id, []).append(info)
+            else:
+                self._tracks.setdefault(job_id, {})[track_number] = info
+
+    def get(self, job_id: str) -> Tuple[Dict[int, dict], List[dict]]:
+        """Copies of the job's tracks and of its files without a track number."""
+        with self._lock:
+            return dict(self._tracks.get(job_id, {})), list(self._errors.get(job_id, []))
+
+    def has(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._tracks or job_id in self._errors
+
+    def discard(self, job_id: str) -> None:
+        with self._lock:
+            self._tracks.pop(job_id, None)
+            self._errors.pop(job_id, None)
+            self._updated.pop(job_id, None)
+
+    def expire(self, ttl: float) -> List[str]:
+        """Drop the jobs that got no file for ttl seconds and return their ids."""
+        cutoff = time.monotonic() - ttl
+        with self._lock:
+            expired = [job_id for job_id, updated in self._updated.items() if updated < cutoff]
+            for job_id in expired:
+                self._tracks.pop(job_id, None)
+                self._errors.pop(job_id, None)
+                del self._updated[job_id]
+        return expired
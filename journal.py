@@ -0,0 +1,173 @@
+"""
+Checkpoint journal for resumable CLI runs.
+
+Every finished step of a run is appended to a JSON lines file as soon as it
+completes: the track number read from a file, an album's track list, the
+lyrics fetched for a track and every embed. A run started with ``resume``
+loads the journal and skips the steps it can verify:
+
+- a tag scan, when the file still has the size and modification time it had
+- an album or track fetch, always (lyrics pages rarely change within a run)
+- an embed, when the file is unchanged since it was written and the lyrics
+  are the same
+
+Records are flushed one by one, so a crash loses at most the step in
+progress; a partly written last line is ignored on the next load.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from dataclasses import asdict, replace
+from typing import Callable, Dict, List, Optional, Tuple
+
+from providers.base_provider import TrackInfo
+from tracing import get_logger
+
+log = get_logger('journal')
+
+def _stat(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class Journal:
+    """Record and replay the steps of a run.
+
+    Args:
+        path: JSON lines file; None disables the journal and every call simply
+            runs its step
+        resume: Load the steps recorded by an earlier run instead of starting
+            a new journal
+    """
+
+    def __init__(self, path: Optional[str], resume: bool = False):
+        self.path = path
+        self.skipped = 0
+        self._scans: Dict[str, dict] = {}
+        self._albums: Dict[str, List[dict]] = {}
+        self._tracks: Dict[str, dict] = {}
+        self._embeds: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        if path is None:
+            return
+        partial_line = False
+        if resume and os.path.exists(path):
+            partial_line = self._load(path)
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        if partial_line:
+            self._file.write('\n')
+
+    def _load(self, path: str) -> bool:
+        """Load the recorded steps; True when the file ends in a partly written line."""
+        records = 0
+        line = '\n'
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The run was interrupted while writing this line
+                    continue
+                records += 1
+                kind = record.get('type')
+                if kind == 'scan':
+                    self._scans[record['path']] = record
+                elif kind == 'album':
+                    self._albums[record['url']] = record['tracks']
+                elif kind == 'track':
+                    self._tracks[record['url']] = record['info']
+                elif kind == 'embed':
+                    self._embeds[record['path']] = record
+        log.info('Journal loaded', path=path, records=records)
+        return not line.endswith('\n')
+
+    def _write(self, record: dict) -> None:
+        with self._lock:
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+
+    def _skip(self) -> None:
+        with self._lock:
+            self.skipped += 1
+
+    def track_number(self, path: str, read: Callable[[str], Optional[int]]) -> Optional[int]:
+        """Track number of a file, read again only if the file changed."""
+        if self._file is None:
+            return read(path)
+        key = os.path.abspath(path)
+        size, mtime_ns = _stat(path)
+        record = self._scans.get(key)
+        if record and record['size'] == size and record['mtime_ns'] == mtime_ns:
+            self._skip()
+            return record['track_number']
+        track_number = read(path)
+        self._scans[key] = record = {'type': 'scan', 'path': key, 'size': size, 'mtime_ns': mtime_ns,
+                                     'track_number': track_number}
+        self._write(record)
+        return track_number
+
+    def album(self, url: str, load: Callable[[], List[TrackInfo]]) -> List[TrackInfo]:
+        """Track list of an album, fetched only if it was not recorded yet."""
+        if self._file is not None and url in self._albums:
+            self._skip()
+            return [TrackInfo(**track) for track in self._albums[url]]
+        tracks = load()
+        if self._file is not None and tracks:
+            self._albums[url] = [asdict(track) for track in tracks]
+            self._write({'type': 'album', 'url': url, 'tracks': self._albums[url]})
+        return tracks
+
+    def track(self, url: str, track_number: Optional[int],
+              load: Callable[[], Optional[TrackInfo]]) -> Optional[TrackInfo]:
+        """Track info with lyrics; tracks without lyrics are not recorded and are fetched again.
+
+        A recorded track is returned with the caller's track number, since the
+        same song can sit at another position on another album.
+        """
+        if self._file is not None and url in self._tracks:
+            self._skip()
+            return replace(TrackInfo(**self._tracks[url]), track_number=track_number)
+        info = load()
+        if self._file is not None and info and info.lyrics:
+            self._tracks[url] = asdict(info)
+            self._write({'type': 'track', 'url': url, 'info': self._tracks[url]})
+        return info
+
+    def embed(self, path: str, lyrics: str, write: Callable[[str, str], bool]) -> bool:
+        """Embed lyrics unless the same lyrics were embedded and the file has not changed since."""
+        if self._file is None:
+            return write(path, lyrics)
+        key = os.path.abspath(path)
+        digest = _digest(lyrics)
+        record = self._embeds.get(key)
+        if record and record['lyrics_sha256'] == digest and (record['size'], record['mtime_ns']) == _stat(path):
+            self._skip()
+            return True
+        success = write(path, lyrics)
+        if success:
+            size, mtime_ns = _stat(path)
+            self._embeds[key] = record = {'type': 'embed', 'path': key, 'lyrics_sha256': digest,
+                                          'size': size, 'mtime_ns': mtime_ns}
+            self._write(record)
+            # Writing lyrics does not change the track number; keep the scan valid
+            scan = self._scans.get(key)
+            if scan:
+                self._scans[key] = scan = {**scan, 'size': size, 'mtime_ns': mtime_ns}
+                self._write(scan)
+        return success
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
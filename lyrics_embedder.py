@@ -1,30 +1,45 @@
 #!/usr/bin/env python3
-from mutagen.id3 import ID3, USLT
-from mutagen.mp4 import MP4
+from mutagen.id3 import ID3, USLT, TXXX
+from mutagen.mp4 import MP4, MP4FreeForm
+import os
+from metrics import TAG_WRITE_SECONDS
+from tracing import get_logger
 
-def add_lyrics_to_audio(audio_path, lyrics_text, language='eng'):
-    """Add lyrics to an audio file"""
-    try:
-        if audio_path.lower().endswith('.mp3'):
-            # For MP3 files
-            audio = ID3(audio_path)
-            # Remove existing lyrics if any
-            for tag in list(audio.keys()):
-                if tag.startswith('USLT'):
-                    del audio[tag]
-            # Add new lyrics
-            audio.add(USLT(encoding=3, lang=language, desc='', text=lyrics_text))
-            audio.save()
-            return True
+log = get_logger('embedder')
+
+# Tag recording the page the lyrics came from, read back by the refresh mode
+SOURCE_TAG = 'LYRICS_SOURCE'
+MP3_SOURCE_KEY = f'TXXX:{SOURCE_TAG}'
+M4A_SOURCE_KEY = f'----:com.apple.iTunes:{SOURCE_TAG}'
+
+def add_lyrics_to_audio(audio_path, lyrics_text, language='eng', source_url=None):
+    """Add lyrics to an audio file, and the URL they came from when given"""
+    with TAG_WRITE_SECONDS.time(format=os.path.splitext(audio_path)[1].lower().lstrip('.')):
+        try:
+            if audio_path.lower().endswith('.mp3'):
+                # For MP3 files
+                audio = ID3(audio_path)
+                # Remove existing lyrics if any
+                for tag in list(audio.keys()):
+                    if tag.startswith('USLT'):
+                        del audio[tag]
+                # Add new lyrics
+                audio.add(USLT(encoding=3, lang=language, desc='', text=lyrics_text))
+                if source_url:
+                    audio.add(TXXX(encoding=3, desc=SOURCE_TAG, text=source_url))
+                audio.save()
+                return True
             
-        elif audio_path.lower().endswith('.m4a'):
-            # For M4A files
-            audio = MP4(audio_path)
-            # Add lyrics as a new metadata field
-            audio['\xa9lyr'] = lyrics_text
-            audio.save()
-            return True
+            elif audio_path.lower().endswith('.m4a'):
+                # For M4A files
+                audio = MP4(audio_path)
+                # Add lyrics as a new metadata field
+                audio['\xa9lyr'] = lyrics_text
+                if source_url:
+                    audio[M4A_SOURCE_KEY] = MP4FreeForm(source_url.encode('utf-8'))
+                audio.save()
+                return True
             
-    except Exception as e:
-        print(f"Error adding lyrics to {audio_path}: {e}")
-    return False
+        except Exception as e:
+            log.error('Error adding lyrics', path=audio_path, error=e)
+        return False
@@ -0,0 +1,93 @@
+"""
+Server-side store of scraped lookup results.
+
+Lookups through the read-only lyrics API are keyed by kind (track or album)
+and normalized URL. A result is scraped once, kept for a TTL and served to
+every caller until then, together with an ETag so HTTP clients can revalidate
+without downloading it again. The least recently used results are dropped
+once the store is full.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+from metrics import CACHE_HITS, CACHE_MISSES
+from providers.http import normalize_url
+
+@dataclass
+class StoredResult:
+    value: dict
+    etag: str
+    created: float
+    expires: float
+
+    @property
+    def max_age(self) -> int:
+        """Seconds the result stays fresh, for Cache-Control."""
+        return max(0, int(self.expires - time.time()))
+
+def compute_etag(value: dict) -> str:
+    """Strong ETag derived from the canonical JSON of a result."""
+    payload = json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+class LyricsStore:
+    """Thread-safe LRU of lookup results with a TTL.
+
+    Args:
+        ttl: Seconds a result is served before it is scraped again
+        max_entries: Results kept before the least recently used are dropped
+    """
+
+    def __init__(self, ttl: float = 24 * 60 * 60, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._results: 'OrderedDict[Tuple[str, str], StoredResult]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, url: str) -> Optional[StoredResult]:
+        key = (kind, normalize_url(url))
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                return None
+            if result.expires <= time.time():
+                del self._results[key]
+                return None
+            self._results.move_to_end(key)
+            return result
+
+    def put(self, kind: str, url: str, value: dict) -> StoredResult:
+        now = time.time()
+        result = StoredResult(value, compute_etag(value), now, now + self.ttl)
+        key = (kind, normalize_url(url))
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return result
+
+    def get_or_load(self, kind: str, url: str, loader: Callable[[], Optional[dict]]) -> Optional[StoredResult]:
+        """Return the stored result, or load and store it.
+
+        Results the loader could not produce (None) are not stored, so a failed
+        scrape is retried by the next caller.
+        """
+        result = self.get(kind, url)
+        if result is not None:
+            CACHE_HITS.inc(cache=kind)
+            return result
+        CACHE_MISSES.inc(cache=kind)
+        value = loader()
+        if value is None:
+            return None
+        return self.put(kind, url, value)
+
+    def __len__(self) -> int:
+        return len(self._results)
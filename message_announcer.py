@@ -0,0 +1,251 @@
+"""
+Server-Sent Events fan-out for the web interface.
+
+Events are published to a channel (one per job) and delivered to every
+listener subscribed to that channel. Each listener owns a bounded buffer so
+a stalled client can never make the server grow without limit, and every
+channel keeps a short replay history so a reconnecting EventSource can resume
+from its ``Last-Event-ID``.
+"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Hashable, Optional
+
+DEFAULT_CHANNEL = 'default'
+CHANNEL_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def format_sse(data, event=None, event_id=None):
+    """Serialize a payload as a single SSE message."""
+    msg = []
+    if event_id is not None:
+        msg.append(f'id: {event_id}\n')
+    if event is not None:
+        msg.append(f'event: {event}\n')
+    msg.append(f'data: {json.dumps(data)}\n\n')
+    return ''.join(msg)
+
+def format_heartbeat():
+    """SSE comment line used to keep the connection alive and detect dead clients."""
+    return ': heartbeat\n\n'
+
+def is_valid_channel_id(channel_id: str) -> bool:
+    """Check that a client supplied channel (job) id is safe to use as a key."""
+    return bool(channel_id) and bool(CHANNEL_ID_PATTERN.match(channel_id))
+
+@dataclass
+class Event:
+    """A published SSE event, kept in the channel history for replay."""
+    id: int
+    name: Optional[str]
+    data: dict
+    coalesce_key: Optional[Hashable] = None
+    # time.monotonic() at publication, for measuring delivery lag
+    published: float = field(default_factory=time.monotonic)
+
+    def encode(self) -> str:
+        return format_sse(self.data, self.name, self.id)
+
+class Listener:
+    """Bounded per-client buffer.
+
+    When the buffer is full the oldest event is dropped. Events published with
+    a coalesce key replace an undelivered event with the same key, so a slow
+    client only sees the latest state of each track instead of every update.
+    """
+
+    def __init__(self, channel_id: str, maxsize: int):
+        self.channel_id = channel_id
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.closed = False
+        self.last_read = time.monotonic()
+        self._queue: Deque[Event] = deque()
+        self._cond = threading.Condition()
+
+    def put(self, event: Event) -> None:
+        with self._cond:
+            if self.closed:
+                return
+            if event.coalesce_key is not None:
+                for queued in self._queue:
+                    if queued.coalesce_key == event.coalesce_key:
+                        self._queue.remove(queued)
+                        self.dropped += 1
+                        break
+            if len(self._queue) >= self.maxsize:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(event)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """Wait for the next event; return None on timeout or when closed."""
+        with self._cond:
+            self.last_read = time.monotonic()
+            if not self._queue and not self.closed:
+                self._cond.wait(timeout)
+            self.last_read = time.monotonic()
+            if not self._queue:
+                return None
+            return self._queue.popleft()
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._queue.clear()
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._queue)
+
+class AsyncListener(Listener):
+    """Listener consumed by a coroutine instead of a blocked thread.
+
+    Producers still call put() from worker threads; the owning event loop is
+    woken through call_soon_threadsafe, so an idle subscriber costs a few
+    objects rather than an OS thread.
+    """
+
+    def __init__(self, channel_id: str, maxsize: int, loop: asyncio.AbstractEventLoop):
+        super().__init__(channel_id, maxsize)
+        self._loop = loop
+        self._ready = asyncio.Event()
+
+    def _wake(self) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # The event loop is gone; nobody is waiting anymore
+            pass
+
+    def put(self, event: Event) -> None:
+        super().put(event)
+        self._wake()
+
+    def close(self) -> None:
+        super().close()
+        self._wake()
+
+    async def get_async(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """Await the next event; return None on timeout or when closed."""
+        event = self.get(timeout=0)
+        if event is not None or self.closed:
+            return event
+        self._ready.clear()
+        event = self.get(timeout=0)
+        if event is not None:
+            return event
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self.get(timeout=0)
+
+class Channel:
+    """Listeners and replay history for a single job."""
+
+    def __init__(self, channel_id: str, history_size: int):
+        self.id = channel_id
+        self.next_event_id = 1
+        self.history: Deque[Event] = deque(maxlen=history_size)
+        self.listeners = []
+        self.last_activity = time.monotonic()
+
+class MessageAnnouncer:
+    """Publish SSE events to per-job channels.
+
+    Args:
+        listener_queue_size: Maximum number of undelivered events per listener
+        history_size: Number of events kept per channel for Last-Event-ID replay
+        stall_timeout: Seconds a listener with a full buffer may go without
+            reading before it is considered dead and dropped
+        channel_ttl: Seconds an idle channel without listeners is kept around
+    """
+
+    def __init__(self, listener_queue_size=256, history_size=512, stall_timeout=60.0, channel_ttl=600.0):
+        self.listener_queue_size = listener_queue_size
+        self.history_size = history_size
+        self.stall_timeout = stall_timeout
+        self.channel_ttl = channel_ttl
+        self._channels: Dict[str, Channel] = {}
+        self._lock = threading.Lock()
+
+    def _get_channel(self, channel_id: str) -> Channel:
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = Channel(channel_id, self.history_size)
+            self._channels[channel_id] = channel
+        channel.last_activity = time.monotonic()
+        return channel
+
+    def _sweep(self) -> None:
+        """Forget idle channels that nobody is listening to."""
+        now = time.monotonic()
+        for channel_id in [cid for cid, ch in self._channels.items()
+                           if not ch.listeners and now - ch.last_activity > self.channel_ttl]:
+            del self._channels[channel_id]
+
+    def listen(self, channel_id: str = DEFAULT_CHANNEL, last_event_id: Optional[int] = None) -> Listener:
+        """Subscribe to a channel, replaying events newer than last_event_id."""
+        return self._subscribe(Listener(channel_id, self.listener_queue_size), last_event_id)
+
+    def listen_async(self, channel_id: str = DEFAULT_CHANNEL, last_event_id: Optional[int] = None,
+                     loop: Optional[asyncio.AbstractEventLoop] = None) -> AsyncListener:
+        """Subscribe from a coroutine; must be called from the loop that will read it."""
+        loop = loop or asyncio.get_running_loop()
+        return self._subscribe(AsyncListener(channel_id, self.listener_queue_size, loop), last_event_id)
+
+    def _subscribe(self, listener: Listener, last_event_id: Optional[int]) -> Listener:
+        channel_id = listener.channel_id
+        with self._lock:
+            self._sweep()
+            channel = self._get_channel(channel_id)
+            if last_event_id is not None:
+                for event in channel.history:
+                    if event.id > last_event_id:
+                        listener.put(event)
+            channel.listeners.append(listener)
+        return listener
+
+    def unlisten(self, listener: Listener) -> None:
+        listener.close()
+        with self._lock:
+            channel = self._channels.get(listener.channel_id)
+            if channel and listener in channel.listeners:
+                channel.listeners.remove(listener)
+
+    def announce(self, data: dict, event: Optional[str] = None, channel_id: str = DEFAULT_CHANNEL,
+                 coalesce_key: Optional[Hashable] = None) -> Event:
+        """Publish an event to every listener of a channel."""
+        with self._lock:
+            channel = self._get_channel(channel_id)
+            published = Event(channel.next_event_id, event, data, coalesce_key)
+            channel.next_event_id += 1
+            channel.history.append(published)
+            now = time.monotonic()
+            for listener in list(channel.listeners):
+                if listener.closed:
+                    channel.listeners.remove(listener)
+                    continue
+                if len(listener) >= listener.maxsize and now - listener.last_read > self.stall_timeout:
+                    # The client stopped reading long ago; treat it as dead
+                    listener.close()
+                    channel.listeners.remove(listener)
+                    continue
+                listener.put(published)
+        return published
+
+    def listener_count(self) -> int:
+        with self._lock:
+            return sum(len(channel.listeners) for channel in self._channels.values())
+
+    def queue_depth(self) -> int:
+        """Total number of undelivered events across all listeners."""
+        with self._lock:
+            return sum(len(listener) for channel in self._channels.values() for listener in channel.listeners)
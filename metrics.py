@@ -0,0 +1,217 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+A small, dependency-free registry of counters, gauges and histograms. The web
+server exposes it at ``/metrics`` and the CLI can print a summary at the end
+of a run.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames: Sequence[str], key: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Registry:
+    """Holds every metric and renders them."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        """Human readable summary of the metrics that were recorded."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.summary())
+        return '\n'.join(lines)
+
+REGISTRY = Registry()
+
+class _Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in sorted(self._values.items())]
+
+    def summary(self):
+        return [f'{self.name}{_format_labels(self.labelnames, key)}: {_format_value(value)}'
+                for key, value in sorted(self._values.items())]
+
+class Gauge(_Metric):
+    """Value that goes up and down; optionally read from a callback when rendered."""
+    type = 'gauge'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY,
+                 callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labelnames, registry)
+        self.callback = callback
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        if self.callback is not None:
+            return self.callback()
+        return self._values.get(self._key(labels), 0)
+
+    def _items(self):
+        if self.callback is not None:
+            return [((), self.callback())]
+        return sorted(self._values.items())
+
+    def render(self):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in self._items()]
+
+    def summary(self):
+        return [f'{self.name}{_format_labels(self.labelnames, key)}: {_format_value(value)}'
+                for key, value in self._items()]
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'count', 'sum', 'max')
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+class Histogram(_Metric):
+    """Distribution of observed values, such as latencies in seconds."""
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY,
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = _HistogramValue(len(self.buckets))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data.buckets[index] += 1
+                    break
+            data.count += 1
+            data.sum += value
+            data.max = max(data.max, value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of a block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        data = self._values.get(self._key(labels))
+        return data.count if data else 0
+
+    def render(self):
+        lines = []
+        for key, data in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, data.buckets):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {repr(data.sum)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {data.count}')
+        return lines
+
+    def summary(self):
+        return [f'{self.name}{_format_labels(self.labelnames, key)}: count={data.count} '
+                f'avg={data.sum / data.count:.3f}s max={data.max:.3f}s'
+                for key, data in sorted(self._values.items()) if data.count]
+
+# Pipeline stage latencies
+ALBUM_FETCH_SECONDS = Histogram('lyrics_album_fetch_seconds', 'Time to fetch and parse an album track list.', ['provider'])
+TRACK_FETCH_SECONDS = Histogram('lyrics_track_fetch_seconds', 'Time to download a track page.', ['provider'])
+HTML_PARSE_SECONDS = Histogram('lyrics_html_parse_seconds', 'Time to parse a downloaded page.', ['provider', 'page'])
+TAG_READ_SECONDS = Histogram('lyrics_tag_read_seconds', 'Time to read the track number from an audio file.', ['format'])
+TAG_WRITE_SECONDS = Histogram('lyrics_tag_write_seconds', 'Time to embed lyrics into an audio file.', ['format'])
+
+# Provider HTTP traffic
+HTTP_RESPONSES = Counter('lyrics_http_responses_total', 'HTTP responses received from providers.', ['provider', 'status'])
+HTTP_RETRIES = Counter('lyrics_http_retries_total', 'HTTP requests to providers that were retried.', ['provider'])
+SSE_DELIVERY_SECONDS = Histogram('lyrics_sse_delivery_seconds', 'Time from publishing an SSE event to writing it to a client.')
+CACHE_HITS = Counter('lyrics_cache_hits_total', 'Lookups served from a cache.', ['cache'])
+CACHE_MISSES = Counter('lyrics_cache_misses_total', 'Lookups that missed a cache.', ['cache'])
+COALESCED_CALLS = Counter('lyrics_coalesced_calls_total', 'Provider calls that shared an identical in-flight call.', ['provider', 'call'])
+PREFETCH_LOOKUPS = Counter('lyrics_prefetch_lookups_total', 'Job lookups answered by a speculative prefetch, by whether it had finished.', ['kind', 'outcome'])
+LAYOUT_VARIANTS = Counter('lyrics_layout_variants_total', 'Parsed pages by the layout variant their selectors matched.', ['provider', 'page', 'variant'])
+LAYOUT_PROBES = Counter('lyrics_layout_probes_total', 'Layout probes tried to find the variant of a page.', ['provider', 'page'])
@@ -0,0 +1,83 @@
+"""
+Optional process pool for parsing provider pages.
+
+Parsing a page with BeautifulSoup and lxml is pure Python in large part and
+holds the GIL, so in a web server the parsing of concurrent jobs, and the SSE
+streams, take turns on one core. With a pool configured, providers send the
+downloaded page to a worker process and get the parsed result back (a few
+strings or TrackInfo objects), while downloads stay in the calling thread.
+Parse functions must be module-level so that they can be pickled.
+
+Without a pool, or when the pool breaks, pages are parsed in the calling
+thread as before.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, TypeVar
+
+from metrics import Gauge
+from tracing import get_logger
+
+log = get_logger('parse_pool')
+
+T = TypeVar('T')
+
+# Imported once by the fork server, so workers start with the parsers loaded
+PRELOAD = ['providers.genius_provider', 'providers.musixmatch_provider']
+
+_executor: Optional[ProcessPoolExecutor] = None
+_processes = 0
+_lock = threading.Lock()
+
+Gauge('lyrics_parse_processes', 'Worker processes available for page parsing.', callback=lambda: _processes)
+
+def _warm_up() -> None:
+    """Runs once in every worker so the first real parse does not pay for the start."""
+
+def configure(processes: int) -> None:
+    """Start a pool of processes for parsing, or with 0 parse in the calling thread."""
+    global _executor, _processes
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor, _processes = None, 0
+        if processes <= 0:
+            return
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            # Forking a threaded server is unsafe; the fork server is a clean single-threaded parent
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(PRELOAD)
+        else:
+            context = multiprocessing.get_context('spawn')
+        executor = ProcessPoolExecutor(processes, mp_context=context)
+        try:
+            for future in [executor.submit(_warm_up) for _ in range(processes)]:
+                future.result()
+        except BrokenProcessPool as e:
+            log.error('Parse pool failed to start, parsing in process', error=e)
+            executor.shutdown(wait=False, cancel_futures=True)
+            return
+        _executor, _processes = executor, processes
+    log.info('Parse pool started', processes=processes)
+
+def shutdown() -> None:
+    configure(0)
+
+def parse(fn: Callable[..., T], *args) -> T:
+    """Run fn(*args) in the pool when there is one, else in the calling thread."""
+    global _executor, _processes
+    executor = _executor
+    if executor is None:
+        return fn(*args)
+    try:
+        return executor.submit(fn, *args).result()
+    except BrokenProcessPool as e:
+        # A worker died (e.g. killed for memory); keep serving from this thread
+        log.error('Parse pool broken, parsing in process', error=e)
+        with _lock:
+            if _executor is executor:
+                _executor, _processes = None, 0
+        return fn(*args)
@@ -0,0 +1,213 @@
+"""
+Streaming album pipeline shared by the CLI and the web interface.
+
+An album runs as connected stages: the scanned files are matched against the
+album's track list, every matched track is fetched and parsed, and its lyrics
+are embedded. Fetch workers hand their results to the embed stage through a
+bounded queue, so track N is embedded while track N+1 is being fetched and an
+album takes about as long as its slowest stage rather than the sum of all of
+them. Progress is reported through an ``on_event(name, data)`` callback:
+
+- ``matched``: the album was fetched; ``album_tracks`` and the ``tracks`` to process
+- ``fetched``: a track was fetched; ``info`` is None when it has no lyrics, with ``error`` set
+  and ``timed_out`` true when the job's deadline ran out before the track was fetched
+- ``embedded``: lyrics were written (``success``) into ``file``, or failed with ``error``
+
+Events are emitted from the thread that calls run(), in the order the
+tracks come out of the fetch stage.
+
+Under a deadline (``providers.http.deadline``) the fetch workers share the
+caller's time budget: once it runs out, the tracks left fail at once as timed
+out instead of each waiting on a provider, which bounds how long an album can take.
+"""
+
+import contextvars
+import functools
+import os
+import queue
+import threading
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from providers.base_provider import LyricsProvider, TrackInfo
+from providers.http import deadline_exceeded
+from utilities import get_track_number
+from lyrics_embedder import add_lyrics_to_audio
+from journal import Journal
+from tracing import get_logger, span
+
+log = get_logger('pipeline')
+
+def scan_files(paths: List[str], journal: Optional[Journal] = None) -> Tuple[Dict[int, dict], List[dict]]:
+    """Read the track number of every file.
+
+    Returns (tracks, errors): tracks maps track numbers to the path, filename
+    and size of a file, errors lists the files without a track number. Files
+    unchanged since a scan recorded in the journal are not read again.
+    """
+    journal = journal or Journal(None)
+    tracks, errors = {}, []
+    for path in paths:
+        filename = os.path.basename(path)
+        with span('read_track_number', filename=filename):
+            track_number = journal.track_number(path, get_track_number)
+        if track_number is None:
+            log.warning('No track number found in metadata', filename=filename)
+            errors.append({'filename': filename, 'error': 'No track number found in metadata'})
+            continue
+        tracks[track_number] = {'path': path, 'filename': filename, 'size': os.path.getsize(path)}
+    return dict(sorted(tracks.items())), errors
+
+@dataclass
+class PipelineResult:
+    """What happened to an album: counts per stage and the matched tracks."""
+    album_tracks: int = 0
+    matched: List[TrackInfo] = field(default_factory=list)
+    fetched: int = 0
+    embedded: int = 0
+    timed_out: int = 0
+
+@dataclass
+class _Fetched:
+    track: TrackInfo
+    info: Optional[TrackInfo] = None
+    error: Optional[str] = None
+    timed_out: bool = False
+
+_DONE = object()
+
+class AlbumPipeline:
+    """Match, fetch and embed the tracks of one album.
+
+    Args:
+        provider: Provider for the album URL
+        on_event: Called with (name, data) for every progress event
+        fetch_workers: Tracks fetched and parsed at the same time
+        queue_size: Fetched tracks that may wait for the embed stage; fetch
+            workers block when it is full, which bounds the lyrics held in memory
+        journal: Steps recorded by an earlier run are skipped, new ones recorded
+        disk: Semaphore held around every tag write, to share a disk budget
+            between pipelines running side by side
+    """
+
+    def __init__(self, provider: LyricsProvider, on_event: Optional[Callable[[str, dict], None]] = None,
+                 fetch_workers: int = 1, queue_size: int = 2, journal: Optional[Journal] = None,
+                 disk: Optional[threading.Semaphore] = None):
+        self.provider = provider
+        self.journal = journal or Journal(None)
+        self.disk = disk
+        self.on_event = on_event or (lambda name, data: None)
+        self.fetch_workers = max(1, fetch_workers)
+        self.queue_size = max(1, queue_size)
+
+    def run(self, url: str, files: Dict[int, dict]) -> PipelineResult:
+        """Process the files (track number -> {'path', 'filename', 'size'}) of an album."""
+        result = PipelineResult()
+        with span('album', url=url):
+            album_tracks = self.journal.album(
+                url, lambda: self.provider.get_track_info_without_lyrics_list_from_album(url))
+        if not album_tracks:
+            return result
+        result.album_tracks = len(album_tracks)
+        result.matched = [track for track in album_tracks if track.track_number in files]
+        log.info('Album tracks matched', album_tracks=result.album_tracks, matched=len(result.matched))
+        self.on_event('matched', {'album_tracks': result.album_tracks, 'tracks': result.matched})
+        if not result.matched:
+            return result
+
+        pending: queue.Queue = queue.Queue()
+        for track in result.matched:
+            pending.put(track)
+        fetched: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        workers = [threading.Thread(target=contextvars.copy_context().run, name=f'pipeline-fetch-{i}',
+                                    args=(self._fetch_worker, pending, fetched, stop), daemon=True)
+                   for i in range(min(self.fetch_workers, len(result.matched)))]
+        for worker in workers:
+            worker.start()
+        try:
+            remaining = len(workers)
+            total = len(result.matched)
+            done = 0
+            while remaining:
+                item = fetched.get()
+                if item is _DONE:
+                    remaining -= 1
+                    continue
+                done += 1
+                progress = {'index': done, 'total': total}
+                self.on_event('fetched', {'track': item.track, 'info': item.info, 'error': item.error,
+                                          'timed_out': item.timed_out, **progress})
+                result.timed_out += item.timed_out
+                if item.info is None:
+                    continue
+                result.fetched += 1
+                if self._embed(item.info, files[item.track.track_number], progress):
+                    result.embedded += 1
+        finally:
+            stop.set()
+            # Unblock workers waiting for room in the queue
+            while any(worker.is_alive() for worker in workers):
+                try:
+                    fetched.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        return result
+
+    def _fetch_worker(self, pending: queue.Queue, fetched: queue.Queue, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                track = pending.get_nowait()
+            except queue.Empty:
+                break
+            self._put(fetched, self._fetch(track), stop)
+        self._put(fetched, _DONE, stop)
+
+    @staticmethod
+    def _put(fetched: queue.Queue, item, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                fetched.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _fetch(self, track: TrackInfo) -> _Fetched:
+        try:
+            with span('fetch', track_number=track.track_number, url=track.url):
+                # Out of time, only tracks recorded in the journal are served
+                info = self.journal.track(
+                    track.url, track.track_number, lambda: None if deadline_exceeded() else
+                    self.provider.get_track_info(track.url, track.track_number))
+        except Exception as e:
+            if deadline_exceeded():
+                return self._timed_out(track)
+            log.warning('Track fetch failed', track=track.track_number, url=track.url, error=e)
+            return _Fetched(track, error=f'Error processing track {track.track_number}: {e}')
+        if not info or not info.lyrics or not info.lyrics.strip():
+            # Providers return nothing when a request failed, which may be the deadline
+            if deadline_exceeded():
+                return self._timed_out(track)
+            return _Fetched(track, error=f'No lyric found for track {track.track_number}')
+        return _Fetched(track, info)
+
+    @staticmethod
+    def _timed_out(track: TrackInfo) -> _Fetched:
+        log.warning('Track skipped, time budget exceeded', track=track.track_number, url=track.url)
+        return _Fetched(track, error=f'Timed out: no time left to fetch track {track.track_number}', timed_out=True)
+
+    def _embed(self, info: TrackInfo, file_info: dict, progress: dict) -> bool:
+        error = None
+        try:
+            with self.disk or nullcontext(), span('embed', track_number=info.track_number,
+                                                  filename=file_info['filename'], size=file_info['size']):
+                success = self.journal.embed(str(file_info['path']), info.lyrics,
+                                             functools.partial(add_lyrics_to_audio, source_url=info.url))
+        except FileNotFoundError:
+            log.warning('File not found', path=file_info['path'])
+            success, error = False, 'File not found'
+        if not success and error is None:
+            error = f'Failed to process {file_info["filename"]}'
+        self.on_event('embedded', {'info': info, 'file': file_info, 'success': success, 'error': error, **progress})
+        return success
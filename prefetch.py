@@ -0,0 +1,162 @@
+"""
+Speculative album scraping while a job's files are still uploading.
+
+The browser registers a job's album URL before it starts uploading. The album
+track list and every track page are then fetched and parsed in the
+background, and when the job is processed its pipeline reads the results from
+here: finished lookups are used right away, lookups still in flight are
+waited for, and anything that was not prefetched (or whose prefetch failed)
+is fetched as usual. All jobs share one bounded pool, so prefetching cannot
+flood the providers, and a registration that is never processed expires.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import replace
+from typing import Dict, List, Optional
+
+from providers.base_provider import LyricsProvider, TrackInfo
+from providers.http import normalize_url, time_left
+from metrics import PREFETCH_LOOKUPS
+from tracing import get_logger
+
+log = get_logger('prefetch')
+
+class PrefetchedAlbum:
+    """Background scrape of one album: its track list, then every track page."""
+
+    def __init__(self, provider: LyricsProvider, url: str, executor: ThreadPoolExecutor):
+        self.provider = provider
+        self.url = url
+        self.created = time.monotonic()
+        self._executor = executor
+        self._tracks: Dict[str, Future] = {}
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self.album = executor.submit(self._load_album)
+
+    def _load_album(self) -> List[TrackInfo]:
+        tracks = self.provider.get_track_info_without_lyrics_list_from_album(self.url)
+        with self._lock:
+            if self._cancelled:
+                return tracks
+            for track in tracks or []:
+                if track.url and normalize_url(track.url) not in self._tracks:
+                    self._tracks[normalize_url(track.url)] = self._executor.submit(
+                        self.provider.get_track_info, track.url, track.track_number)
+        log.debug('Album prefetched', url=self.url, tracks=len(tracks or []))
+        return tracks
+
+    def track(self, url: str) -> Optional[Future]:
+        with self._lock:
+            return self._tracks.get(normalize_url(url))
+
+    def cancel(self) -> None:
+        """Drop the track pages that have not started yet."""
+        with self._lock:
+            self._cancelled = True
+            for future in self._tracks.values():
+                future.cancel()
+
+def _result(kind: str, future: Optional[Future]):
+    """Result of a prefetch, or raise LookupError when it cannot be used."""
+    if future is None or future.cancelled():
+        PREFETCH_LOOKUPS.inc(kind=kind, outcome='missed')
+        raise LookupError(kind)
+    PREFETCH_LOOKUPS.inc(kind=kind, outcome='ready' if future.done() else 'waited')
+    left = time_left()
+    try:
+        # Waiting is bounded by the job's deadline; the fallback fetch then fails fast
+        return future.result(timeout=None if left is None else max(left, 0))
+    except Exception as e:
+        log.warning('Prefetch failed, fetching again', kind=kind, error=e)
+        raise LookupError(kind)
+
+class PrefetchingProvider(LyricsProvider):
+    """Serve a job's lookups from its prefetched album, falling back to the provider."""
+
+    def __init__(self, prefetched: PrefetchedAlbum):
+        self.prefetched = prefetched
+        self.provider = prefetched.provider
+
+    @property
+    def name(self) -> str:
+        return self.provider.name
+
+    @classmethod
+    def can_handle(cls, url: str) -> bool:
+        return False
+
+    def get_lyrics(self, track_url: str) -> Optional[str]:
+        return self.provider.get_lyrics(track_url)
+
+    def get_track_info_without_lyrics_list_from_album(self, album_url: str) -> List[TrackInfo]:
+        if normalize_url(album_url) == normalize_url(self.prefetched.url):
+            try:
+                return list(_result('album', self.prefetched.album) or [])
+            except LookupError:
+                pass
+        return self.provider.get_track_info_without_lyrics_list_from_album(album_url)
+
+    def get_track_info(self, track_url: str, track_number: int) -> Optional[TrackInfo]:
+        try:
+            info = _result('track', self.prefetched.track(track_url))
+        except LookupError:
+            return self.provider.get_track_info(track_url, track_number)
+        return replace(info, track_number=track_number) if info else info
+
+class Prefetcher:
+    """Album prefetches by job id.
+
+    Args:
+        workers: Album and track pages fetched at the same time, for all jobs
+        ttl: Seconds a registration is kept when its job is never processed
+    """
+
+    def __init__(self, workers: int = 4, ttl: float = 10 * 60):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max(1, workers), thread_name_prefix='prefetch')
+        self._albums: Dict[str, PrefetchedAlbum] = {}
+        self._lock = threading.Lock()
+
+    def register(self, job_id: str, provider: LyricsProvider, url: str) -> PrefetchedAlbum:
+        """Start prefetching the album of a job; registering the same URL again is a no-op."""
+        self._expire()
+        with self._lock:
+            current = self._albums.get(job_id)
+            if current is not None and normalize_url(current.url) == normalize_url(url):
+                return current
+            if current is not None:
+                current.cancel()
+            self._albums[job_id] = prefetched = PrefetchedAlbum(provider, url, self._executor)
+        log.info('Prefetching album', job=job_id, url=url, provider=provider.name)
+        return prefetched
+
+    def provider_for(self, job_id: str, provider: LyricsProvider, url: str) -> LyricsProvider:
+        """The provider a job should use: backed by its prefetch when it registered this URL."""
+        with self._lock:
+            prefetched = self._albums.get(job_id)
+        if prefetched is None or normalize_url(prefetched.url) != normalize_url(url) \
+                or type(prefetched.provider) is not type(provider):
+            return provider
+        return PrefetchingProvider(prefetched)
+
+    def discard(self, job_id: str) -> None:
+        with self._lock:
+            prefetched = self._albums.pop(job_id, None)
+        if prefetched is not None:
+            prefetched.cancel()
+
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.ttl
+        with self._lock:
+            expired = [job_id for job_id, prefetched in self._albums.items() if prefetched.created < deadline]
+            for job_id in expired:
+                self._albums.pop(job_id).cancel()
+        if expired:
+            log.debug('Prefetches expired', jobs=len(expired))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._albums)
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import List, Optional, Sequence
+from urllib.parse import urlsplit
 
 @dataclass
 class TrackInfo:
@@ -11,9 +12,36 @@ class TrackInfo:
     url: Optional[str] = None
     lyrics: Optional[str] = None
 
+@dataclass
+class Revalidated:
+    """Result of a conditional track fetch.
+
+    not_modified is True when the page has not changed since the given
+    validators; otherwise info holds the fresh track (None when the fetch
+    failed). etag and last_modified are the validators of the response.
+    """
+    info: Optional[TrackInfo] = None
+    not_modified: bool = False
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+def host_in(url: str, domains: Sequence[str]) -> bool:
+    """Whether the URL's host is one of domains or a subdomain of one.
+
+    Only the host counts, so that a domain in the path or query of a URL to
+    another host does not send a request there.
+    """
+    host = (urlsplit(url if '//' in url else '//' + url).hostname or '').lower()
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
 class LyricsProvider(ABC):
     """Base class for all lyrics providers."""
     
+    @property
+    def name(self) -> str:
+        """Short provider name, as registered in the ProviderFactory."""
+        return type(self).__name__.lower().replace('provider', '')
+    
     @classmethod
     @abstractmethod
     def can_handle(cls, url: str) -> bool:
@@ -34,3 +62,12 @@ class LyricsProvider(ABC):
     def get_track_info(self, track_url: str, track_number: int) -> Optional[TrackInfo]:
         """Get track information with lyrics from a track URL."""
         pass
+    
+    def get_track_info_if_modified(self, track_url: str, track_number: Optional[int], etag: Optional[str] = None,
+                                   last_modified: Optional[str] = None) -> Revalidated:
+        """Get track information unless the page is unchanged since the given validators.
+        
+        Providers that can send conditional requests override this; by default
+        the track is fetched again.
+        """
+        return Revalidated(self.get_track_info(track_url, track_number))
@@ -2,6 +2,7 @@ from typing import Optional, List, Type, Dict, TypeVar
 from .base_provider import LyricsProvider, TrackInfo
 from .genius_provider import GeniusProvider
 from .musixmatch_provider import MusixmatchProvider
+from .local_provider import LocalProvider
 import importlib
 import pkgutil
 import inspect
@@ -23,6 +24,7 @@ class ProviderFactory:
         # Register built-in providers
         cls.register_provider(GeniusProvider)
         cls.register_provider(MusixmatchProvider)
+        cls.register_provider(LocalProvider)
         
         # TODO: Dynamically discover and register other providers from the providers package
         
@@ -0,0 +1,126 @@
+import os
+import time
+import requests
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlsplit, urlunsplit
+from metrics import HTTP_RESPONSES, HTTP_RETRIES
+from tracing import span
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Seconds to wait for a connection and between bytes of a response; without
+# them a stalled provider holds a worker (and its job) forever
+CONNECT_TIMEOUT = float(os.environ.get('LYRICS_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.environ.get('LYRICS_READ_TIMEOUT', 20))
+# A request is not started with less time than this left before the deadline
+MIN_REQUEST_SECONDS = 0.5
+
+# Monotonic time by which the current job must be done, if it has a budget
+_deadline: ContextVar[Optional[float]] = ContextVar('lyrics_deadline', default=None)
+
+class DeadlineExceeded(requests.Timeout):
+    """The job ran out of time before a request could be made."""
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Give the fetches made in this context a time budget of seconds.
+
+    Threads started with a copy of the context (like the pipeline's fetch
+    workers) share the deadline. A nested budget cannot extend an outer one,
+    and None leaves the current deadline as it is.
+    """
+    if seconds is None:
+        yield
+        return
+    at = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(at if outer is None else min(at, outer))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def time_left() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+def deadline_exceeded() -> bool:
+    """True when too little time is left to start another request."""
+    left = time_left()
+    return left is not None and left < MIN_REQUEST_SECONDS
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a page URL, used as a cache and coalescing key.
+
+    Lowercases the scheme and host and drops the query string, fragment and
+    trailing slash, which do not change the page the providers scrape.
+    """
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), '', ''))
+
+def conditional_headers(etag: Optional[str] = None, last_modified: Optional[str] = None) -> Dict[str, str]:
+    """Request headers that let the server answer 304 when a page is unchanged."""
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+def validators(response: requests.Response) -> Dict[str, Optional[str]]:
+    """ETag and Last-Modified of a response, for the next conditional request."""
+    return {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+def fetch(session, url: str, provider: str, histogram=None, retries: int = 2, backoff: float = 0.5,
+          **kwargs) -> requests.Response:
+    """GET a page through a requests session (or the requests module) with retries.
+
+    Every response is counted by provider and status code, and when a
+    histogram is given the time spent on each attempt is observed. Connection
+    errors and retryable statuses are retried with exponential backoff before
+    the error is raised.
+
+    Requests get the default connect and read timeouts unless a timeout is
+    given. Under a deadline the timeouts are cut to the time left, retries
+    that would not finish in time are skipped, and DeadlineExceeded is raised
+    instead of starting a request the job has no time for.
+    """
+    timeout = kwargs.pop('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+    attempt = 0
+    while True:
+        left = time_left()
+        if left is not None and left < MIN_REQUEST_SECONDS:
+            HTTP_RESPONSES.inc(provider=provider, status='deadline')
+            raise DeadlineExceeded(f'Time budget exceeded before fetching {url}')
+        try:
+            with histogram.time(provider=provider) if histogram else nullcontext(), span('http', url=url, attempt=attempt):
+                response = session.get(url, timeout=_clamp(timeout, left), **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            HTTP_RESPONSES.inc(provider=provider, status='error')
+            if attempt >= retries or _out_of_time(backoff, attempt):
+                raise
+        else:
+            HTTP_RESPONSES.inc(provider=provider, status=str(response.status_code))
+            if response.status_code not in RETRY_STATUSES or attempt >= retries or _out_of_time(backoff, attempt):
+                response.raise_for_status()
+                return response
+        attempt += 1
+        HTTP_RETRIES.inc(provider=provider)
+        time.sleep(backoff * (2 ** (attempt - 1)))
+
+def _out_of_time(backoff: float, attempt: int) -> bool:
+    """True when the deadline leaves no time to back off and try again."""
+    left = time_left()
+    return left is not None and left < backoff * (2 ** attempt) + MIN_REQUEST_SECONDS
+
+def _clamp(timeout, left: Optional[float]):
+    """The request timeout, no longer than the time left before the deadline."""
+    if left is None or timeout is None:
+        return timeout if timeout is not None else left
+    if isinstance(timeout, tuple):
+        return tuple(left if part is None else min(part, left) for part in timeout)
+    return min(timeout, left)
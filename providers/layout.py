@@ -0,0 +1,71 @@
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+from metrics import LAYOUT_PROBES, LAYOUT_VARIANTS
+
+@dataclass(frozen=True)
+class Variant:
+    """One layout of a provider page.
+
+    Args:
+        name: Short name, used in metrics
+        probe: XPath that matches only pages with this layout
+        container: XPath of the element the parser reads on such pages
+    """
+    name: str
+    probe: str
+    container: str
+
+def match(tree, variants: Sequence[Variant]) -> Tuple[Optional[Variant], int]:
+    """The first variant whose probe matches the lxml tree, and how many probes were tried."""
+    for probes, variant in enumerate(variants, 1):
+        if tree.xpath(variant.probe):
+            return variant, probes
+    return None, len(variants)
+
+class VariantDetector:
+    """Pick the layout of a provider's pages, trying the recently matched variants first.
+
+    Pages of one provider and page type mostly share a layout, so ranking the
+    variants by how often they matched the last ``window`` pages makes the
+    first probe hit on nearly every page; a layout change on the provider
+    re-ranks them within a window. Ties keep the order the variants were
+    declared in.
+    """
+
+    def __init__(self, provider: str, page: str, variants: Sequence[Variant], window: int = 50):
+        self.provider = provider
+        self.page = page
+        self.variants = list(variants)
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def ranked(self) -> List[Variant]:
+        with self._lock:
+            tally = Counter(self._recent)
+        return sorted(self.variants, key=lambda variant: -tally[variant.name])
+
+    def record(self, variant: Optional[str], probes: int) -> None:
+        """Count the variant a page matched (None when none did) and the probes it took."""
+        LAYOUT_VARIANTS.inc(provider=self.provider, page=self.page, variant=variant or 'none')
+        LAYOUT_PROBES.inc(probes, provider=self.provider, page=self.page)
+        if variant is not None:
+            with self._lock:
+                self._recent.append(variant)
+
+    def detect(self, tree) -> Optional[Variant]:
+        variant, probes = match(tree, self.ranked())
+        self.record(variant.name if variant else None, probes)
+        return variant
+
+_detectors: Dict[Tuple[str, str], VariantDetector] = {}
+_detectors_lock = threading.Lock()
+
+def detector(provider: str, page: str, variants: Sequence[Variant]) -> VariantDetector:
+    """The detector shared by every instance of a provider for one page type."""
+    with _detectors_lock:
+        key = (provider, page)
+        if key not in _detectors:
+            _detectors[key] = VariantDetector(provider, page, variants)
+        return _detectors[key]
@@ -0,0 +1,108 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote
+from .base_provider import LyricsProvider, TrackInfo
+from corpus_index import CorpusIndex, CorpusIndexError
+from tracing import get_logger, span
+
+log = get_logger('providers.local')
+
+# Path -> (index, (inode, mtime) of the file it was mapped from)
+_indexes: Dict[str, Tuple[CorpusIndex, Tuple[int, int]]] = {}
+_indexes_lock = threading.Lock()
+
+def _open_index(path: str) -> CorpusIndex:
+    """Map an index once per process and share it between provider instances.
+
+    A rebuilt index replaces the file, so it is mapped again when the file
+    changes; the old mapping is left to lookups still using it.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise CorpusIndexError(f'Cannot open corpus index {path}: {e}')
+    version = (stat.st_ino, stat.st_mtime_ns)
+    with _indexes_lock:
+        cached = _indexes.get(path)
+        if cached is None or cached[1] != version:
+            if cached is not None:
+                log.info('Corpus index changed, mapping it again', path=path)
+            cached = _indexes[path] = (CorpusIndex(path), version)
+        return cached[0]
+
+class LocalProvider(LyricsProvider):
+    """Lyrics provider for an offline corpus of JSONL and LRC dumps.
+
+    Albums are addressed as ``local://<artist>/<album>`` and tracks as
+    ``local://<artist>/<album>/<title>``; names are matched after
+    normalization, so case, accents and punctuation do not matter. The index
+    is built with ``python corpus_index.py build`` and located through
+    LYRICS_LOCAL_INDEX.
+    """
+
+    DOMAINS = ['local://']
+
+    def __init__(self, index_path: Optional[str] = None):
+        self.index_path = index_path or os.environ.get('LYRICS_LOCAL_INDEX', 'media/corpus.idx')
+
+    @classmethod
+    def can_handle(cls, url: str) -> bool:
+        """Check if this provider can handle the given URL."""
+        return url.lower().startswith('local://')
+
+    @staticmethod
+    def _split(url: str) -> Tuple[str, ...]:
+        return tuple(unquote(part) for part in url[len('local://'):].strip('/').split('/'))
+
+    @staticmethod
+    def track_url(artist: str, album: str, title: str) -> str:
+        return 'local://' + '/'.join(quote(part, safe='') for part in (artist, album, title))
+
+    def _index(self) -> Optional[CorpusIndex]:
+        try:
+            return _open_index(self.index_path)
+        except CorpusIndexError as e:
+            log.warning('Local corpus index unavailable', path=self.index_path, error=e)
+            return None
+
+    def _lookup(self, track_url: str):
+        parts = self._split(track_url)
+        index = self._index()
+        if len(parts) != 3 or index is None:
+            log.warning('Not a local track URL', url=track_url)
+            return None, None
+        with span('lookup', url=track_url):
+            entry = index.find(*parts)
+            record = index.record(entry) if entry else None
+        if record is None:
+            log.warning('Track not in local corpus', url=track_url)
+        return entry, record
+
+    def get_lyrics(self, track_url: str) -> Optional[str]:
+        """Lyrics of a local track, without LRC timestamps."""
+        _, record = self._lookup(track_url)
+        return record.get('lyrics') if record else None
+
+    def get_track_info_without_lyrics_list_from_album(self, album_url: str) -> List[TrackInfo]:
+        """Get every track of a local album, ordered by track number."""
+        parts = self._split(album_url)
+        index = self._index()
+        if len(parts) != 2 or index is None:
+            log.warning('Not a local album URL', url=album_url)
+            return []
+        artist, album = parts
+        with span('lookup', url=album_url):
+            entries = index.album(artist, album)
+        log.info('Local album found', url=album_url, tracks=len(entries))
+        return [TrackInfo(title=entry.title, artist=entry.artist, track_number=entry.track_number,
+                          url=self.track_url(artist, album, entry.title))
+                for entry in entries]
+
+    def get_track_info(self, track_url: str, track_number: int) -> Optional[TrackInfo]:
+        """Get track information with lyrics from a local track URL."""
+        entry, record = self._lookup(track_url)
+        if record is None:
+            return None
+        return TrackInfo(title=entry.title, artist=entry.artist, track_number=track_number,
+                         url=track_url, lyrics=record.get('lyrics'))
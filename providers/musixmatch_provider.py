@@ -2,21 +2,172 @@ import os
 import re
 import requests
 from bs4 import BeautifulSoup
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Sequence, Tuple
 from urllib.parse import urljoin, parse_qs, urlparse
 import json
 import time
 from lxml import etree
-from .base_provider import LyricsProvider, TrackInfo
+from .base_provider import LyricsProvider, TrackInfo, Revalidated, host_in
+from .http import fetch, conditional_headers, validators
+from .layout import Variant, detector, match
+from .singleflight import coalesced, copy_list, has_lyrics, with_track_number
+from metrics import ALBUM_FETCH_SECONDS, TRACK_FETCH_SECONDS, HTML_PARSE_SECONDS
+from tracing import get_logger, span
+import parse_pool
 import traceback
 
+log = get_logger('providers.musixmatch')
+
+# Lyrics pages come in two layouts: with section headings (and a "Show performers"
+# toggle), where the paragraphs sit one level higher, and plain lyrics
+_LYRICS_ROOT = '//*[@id="__next"]/div/div/div/div[1]/div'
+_SECTIONS = _LYRICS_ROOT + '/div[1]/div[1]/div[2]/div/div/div[2]/div[1]'
+_PLAIN = _LYRICS_ROOT + '/div/div[1]/div[2]/div/div/div[2]/div[1]/div[1]'
+LYRICS_VARIANTS = (
+    Variant('sections',
+            probe=_SECTIONS + '/div/div[.//h3] | ' + _SECTIONS + '/div[1]/div/div[1]'
+                  "[translate(normalize-space(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')"
+                  " = 'show performers']",
+            container=_SECTIONS),
+    # The plain path also exists on pages with sections, inside their first paragraph
+    Variant('plain', probe=_PLAIN + '[not(..//h3)]/div', container=_PLAIN),
+)
+
+# Shared by all instances, so every page benefits from the layouts seen before
+lyrics_layout = detector('musixmatch', 'lyrics', LYRICS_VARIANTS)
+
+def parse_lyrics(html: str, variants: Sequence[Variant] = LYRICS_VARIANTS) -> Optional[str]:
+    """Extract the lyrics text from a Musixmatch track page."""
+    return parse_lyrics_variant(html, variants)[0]
+
+def parse_lyrics_variant(html: str, variants: Sequence[Variant] = LYRICS_VARIANTS) -> Tuple[Optional[str], Optional[str], int]:
+    """Extract the lyrics of a track page, trying the layout variants in the given order.
+
+    Returns (lyrics, name of the matched variant, probes tried), so that a
+    caller parsing in a worker process can record the variant in its detector.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    # Parse the HTML with lxml for XPath support
+
+    # Convert BeautifulSoup to string and parse with lxml
+    html_str = str(soup)
+    parser = etree.HTMLParser()
+    tree = etree.fromstring(html_str, parser)
+    variant, probes = match(tree, variants)
+    if variant is None:
+        log.warning('No known layout matched the lyrics page')
+        return None, None, probes
+    element = tree.xpath(variant.container)
+    if not element:
+        log.warning('No element found with XPath', xpath=variant.container)
+        return None, variant.name, probes
+
+    # Get all paragraph divs (direct children of the container)
+    list_of_html_paragraphs = element[0].xpath('./div')
+
+    # For each paragraph extract the text and add it to the lyrics
+    lyrics = ""
+    for paragraph in list_of_html_paragraphs:
+        add_newline = False
+        for node in paragraph:
+            # if node is a div that directly contains an h3, skip it
+            if node.tag == 'div' and node.xpath('.//h3'):
+                node = node.xpath('.//*[self::div or self::h3][not(descendant::div)][normalize-space()]')
+                heading_line = []
+                for div in node:
+                    if div.text and div.text.strip():
+                        heading_line.append(div.text.strip())
+                        add_newline = True
+                lyrics += "["
+                lyrics += " - ".join(heading_line)
+                lyrics += "]\n"
+                continue
+            node = node.xpath('.//div[not(descendant::div)][normalize-space()]')
+            for div in node:
+                if div.text and div.text.strip():
+                    lyrics += div.text.strip() + "\n"
+                    add_newline = True
+
+        if add_newline:  # Only add newline if we found text
+            lyrics += "\n"
+
+    # Join paragraphs with double newlines for spacing
+    lyrics = re.sub(r'^Show performers\s', '', lyrics)
+    lyrics = re.sub(r'Add to favorites\s*Share\s*', '', lyrics)
+    lyrics = lyrics.strip()
+    return lyrics, variant.name, probes
+
+def parse_album(content: bytes, base_url: str) -> List[TrackInfo]:
+    """Extract the track list from a Musixmatch album page."""
+    tracks = []
+
+    # Parse the HTML with lxml for XPath support
+    parser = etree.HTMLParser()
+    tree = etree.fromstring(content, parser)
+
+    # Find the main container using XPath
+    container = tree.xpath('//*[@id="__next"]/div/div/div/div[1]/div/div/div/div[2]/div/div/div[2]/div[2]/div')
+
+    if not container:
+        log.warning('Could not find the tracks container using XPath')
+        return []
+
+    # Find all direct child div elements that contain track information
+    track_divs = container[0].xpath('./div')
+
+    if not track_divs:
+        log.warning('No track divs found in the container')
+        return []
+
+    for idx, track_div in enumerate(track_divs, 1):
+        try:
+            # Find the <a> tag with href attribute
+            link = track_div.xpath('.//a[@href]')
+            if not link:
+                log.debug('No link found for track', track=idx)
+                continue
+
+            # Get the relative URL from href
+            href = link[0].get('href')
+            if not href:
+                log.debug('No href found for track', track=idx)
+                continue
+
+            # Construct full URL
+            track_url = urljoin(base_url + '/', href.lstrip('/'))
+
+            # Extract title and artist from the track URL
+            # The URL format is /lyrics/ARTIST/TITLE
+            parts = href.split('/')
+            if len(parts) >= 4:  # ['', 'lyrics', artist, title, ...]
+                artist = parts[2].replace('-', ' ').title()
+                title = parts[3].replace('-', ' ').title()
+            else:
+                # Fallback to track number if we can't parse from URL
+                artist = "Unknown Artist"
+                title = f"Track {idx}"
+
+            tracks.append(TrackInfo(
+                title=title,
+                artist=artist,
+                track_number=idx,
+                url=track_url
+            ))
+
+        except Exception as e:
+            log.warning('Error processing track', track=idx, error=e)
+
+    return tracks
+
 class MusixmatchProvider(LyricsProvider):
     """Lyrics provider for Musixmatch.com."""
     
     DOMAINS = ['musixmatch.com']
     BASE_URL = 'https://www.musixmatch.com'
     
-    def __init__(self):
+    def __init__(self, base_url: Optional[str] = None):
+        # base_url points the provider at a mirror, e.g. the benchmark stub server
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept-Language': 'en-US,en;q=0.9',
@@ -28,7 +179,7 @@ class MusixmatchProvider(LyricsProvider):
     @classmethod
     def can_handle(cls, url: str) -> bool:
         """Check if this provider can handle the given URL."""
-        return any(domain in url.lower() for domain in cls.DOMAINS)
+        return host_in(url, cls.DOMAINS)
 
     def _save_debug_html(self, soup: BeautifulSoup, filename: str = 'debug.txt') -> None:
         """Save HTML from a specific XPath to a debug file."""
@@ -38,19 +189,12 @@ class MusixmatchProvider(LyricsProvider):
             
             parser = etree.HTMLParser()
             tree = etree.fromstring(html_str, parser)
-            # Define the XPath
-            # XPath to check for exact text match
-            # XPath is the div that directly contains the text case insensitive show performers
-            xpath = '//*[@id="__next"]/div/div/div/div[1]/div/div[1]/div[1]/div[2]/div/div/div[2]/div[1]/div[1]/div/div[1]'
-            # verify if the div contains the text show performers using xpath xp
-            element = tree.xpath(xpath)
-            if element:
-                text = element[0].text
-            has_show_performance = element[0].text and element[0].text.lower() == 'show performers'
-            if has_show_performance:
-                xpath = '//*[@id="__next"]/div/div/div/div[1]/div/div[1]/div[1]/div[2]/div/div/div[2]/div[1]'
-            else:
-                xpath = '//*[@id="__next"]/div/div/div/div[1]/div/div/div[1]/div[2]/div/div/div[2]/div[1]/div[1]'
+            # Probe in the detector's order without counting the page
+            variant, _ = match(tree, lyrics_layout.ranked())
+            if variant is None:
+                log.warning('No known layout matched the page')
+                return
+            xpath = variant.container
 
             # Find the element using XPath
             element = tree.xpath(xpath)
@@ -101,7 +245,7 @@ class MusixmatchProvider(LyricsProvider):
     def get_lyrics(self, track_url: str) -> Optional[str]:
         """Extract lyrics from a Musixmatch track URL."""
         try:
-            print(f"\nFetching lyrics from Musixmatch: {track_url}")
+            log.debug('Fetching lyrics', url=track_url)
             
             # Set headers to mimic a real browser
             headers = {
@@ -114,167 +258,49 @@ class MusixmatchProvider(LyricsProvider):
                 'Upgrade-Insecure-Requests': '1',
             }
             
-            response = self.session.get(track_url, headers=headers)
-            response.raise_for_status()
+            response = fetch(self.session, track_url, self.name, TRACK_FETCH_SECONDS, headers=headers)
             
             # Check if we got a valid HTML response
             if not response.text.strip():
-                print("Received empty response from server")
-                return None
-                
-            soup = BeautifulSoup(response.text, 'html.parser')
-            # Parse the HTML with lxml for XPath support
-                     
-            # Convert BeautifulSoup to string and parse with lxml
-            html_str = str(soup)
-            parser = etree.HTMLParser()
-            tree = etree.fromstring(html_str, parser)
-            # Search inside the xpath
-            xpath = '//*[@id="__next"]/div/div/div/div[1]/div'
-            element = tree.xpath(xpath)
-            if not element:
-                return None
-            element_str = ""
-            # convert element to string and search if it contains the text "verse" or "chorus" ir "outro"
-            for node in element:
-                element_str += etree.tostring(node, pretty_print=True, encoding='unicode').lower()
-            xpath = '//*[@id="__next"]/div/div/div/div[1]/div/div/div[1]/div[2]/div/div/div[2]/div[1]/div[1]'
-            if 'verse' in element_str or 'chorus' in element_str or 'outro' in element_str:
-                print("=========Found verse, chorus or outro")
-                xpath = '//*[@id="__next"]/div/div/div/div[1]/div/div[1]/div[1]/div[2]/div/div/div[2]/div[1]'
-            
-            # Find the element using XPath
-            element = tree.xpath(xpath)
-            if not element:
-                print(f"No element found with XPath: {xpath}")
+                log.warning('Received empty response from server', url=track_url)
                 return None
-            
-            # Get all paragraph divs (direct children of the container)
-            list_of_html_paragraphs = element[0].xpath('./div')
-
-            # For each paragraph extract the text and add it to the lyrics
-            lyrics = ""
-            for paragraph in list_of_html_paragraphs:
-                add_newline = False
-                for node in paragraph:
-                    # if node is a div that directly contains an h3, skip it
-                    if node.tag == 'div' and node.xpath('.//h3'):
-                        node = node.xpath('.//*[self::div or self::h3][not(descendant::div)][normalize-space()]')
-                        heading_line = []
-                        for div in node:
-                            if div.text and div.text.strip():
-                                heading_line.append(div.text.strip())
-                                add_newline = True
-                        lyrics += "["
-                        lyrics += " - ".join(heading_line)
-                        lyrics += "]\n"
-                        continue
-                    node = node.xpath('.//div[not(descendant::div)][normalize-space()]')
-                    for div in node:
-                        if div.text and div.text.strip():
-                            lyrics += div.text.strip() + "\n"
-                            add_newline = True
                 
-                if add_newline:  # Only add newline if we found text
-                    lyrics += "\n"
-            
-            # Join paragraphs with double newlines for spacing
-            lyrics = re.sub(r'^Show performers\s', '', lyrics)
-            lyrics = re.sub(r'Add to favorites\s*Share\s*', '', lyrics)
-            lyrics = lyrics.strip()
-            return lyrics
+            return self._parse_lyrics(response.text)
             
         except Exception as e:
-            print(f"Unexpected error while fetching lyrics: {e}")
-            traceback.print_exc()
+            log.exception('Unexpected error while fetching lyrics', url=track_url, error=e)
             return None
     
+    def _parse_lyrics(self, html: str) -> Optional[str]:
+        """Extract the lyrics text from a Musixmatch track page, most likely layout first."""
+        with HTML_PARSE_SECONDS.time(provider=self.name, page='lyrics'), span('parse', page='lyrics'):
+            lyrics, variant, probes = parse_pool.parse(parse_lyrics_variant, html, lyrics_layout.ranked())
+        lyrics_layout.record(variant, probes)
+        return lyrics
+    
+    @coalesced('album', adapt=copy_list)
     def get_track_info_without_lyrics_list_from_album(self, album_url: str) -> List[TrackInfo]:
         """Get all tracks from a Musixmatch album URL."""
         try:
-            print(f"Fetching album tracks from: {album_url}")
-            response = self.session.get(album_url)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            tracks = []
-            
-            # Parse the HTML with lxml for XPath support
-            parser = etree.HTMLParser()
-            tree = etree.fromstring(response.content, parser)
-            
-            # Find the main container using XPath
-            container = tree.xpath('//*[@id="__next"]/div/div/div/div[1]/div/div/div/div[2]/div/div/div[2]/div[2]/div')
-            
-            if not container:
-                print("Could not find the tracks container using XPath")
-                return []
-                
-            # Find all direct child div elements that contain track information
-            track_divs = container[0].xpath('./div')
-            
-            if not track_divs:
-                print("No track divs found in the container")
-                return []
-            
-            for idx, track_div in enumerate(track_divs, 1):
-                try:
-                    # Find the <a> tag with href attribute
-                    link = track_div.xpath('.//a[@href]')
-                    if not link:
-                        print(f"No link found for track {idx}")
-                        continue
-                        
-                    # Get the relative URL from href
-                    href = link[0].get('href')
-                    if not href:
-                        print(f"No href found for track {idx}")
-                        continue
-                    
-                    # Construct full URL
-                    track_url = urljoin(self.BASE_URL, href)
-                    
-                    # Extract title and artist from the track URL
-                    # The URL format is /lyrics/ARTIST/TITLE
-                    parts = href.split('/')
-                    if len(parts) >= 4:  # ['', 'lyrics', artist, title, ...]
-                        artist = parts[2].replace('-', ' ').title()
-                        title = parts[3].replace('-', ' ').title()
-                    else:
-                        # Fallback to track number if we can't parse from URL
-                        artist = "Unknown Artist"
-                        title = f"Track {idx}"
-                    
-                    tracks.append(TrackInfo(
-                        title=title,
-                        artist=artist,
-                        track_number=idx,
-                        url=track_url
-                    ))
-                    
-                except Exception as e:
-                    print(f"Error processing track {idx}: {e}")
-            
-            return tracks
+            log.info('Fetching album tracks', url=album_url)
+            with ALBUM_FETCH_SECONDS.time(provider=self.name):
+                response = fetch(self.session, album_url, self.name)
+                with HTML_PARSE_SECONDS.time(provider=self.name, page='album'), span('parse', page='album'):
+                    return parse_pool.parse(parse_album, response.content, self.base_url)
             
         except Exception as e:
-            print(f"Error fetching album tracks: {e}")
+            log.error('Error fetching album tracks', url=album_url, error=e)
             return []
     
+    def _parse_album(self, content: bytes) -> List[TrackInfo]:
+        """Extract the track list from a Musixmatch album page."""
+        return parse_album(content, self.base_url)
+    
+    @coalesced('track', adapt=with_track_number, shareable=has_lyrics)
     def get_track_info(self, track_url: str, track_number: int) -> Optional[TrackInfo]:
         """Get track information from a Musixmatch track URL."""
         try:
-            # Remove self.base_url from track_url
-            href = track_url.replace(self.BASE_URL, '')
-            
-            # The URL format is /lyrics/ARTIST/TITLE
-            # Extract title and artist from the track URL
-            parts = href.split('/')
-            artist = ""
-            title = ""
-            if len(parts) >= 4:  # ['', 'lyrics', artist, title, ...]
-                artist = parts[2].replace('-', ' ').title()
-                title = parts[3].replace('-', ' ').title()
+            artist, title = self._names_from_url(track_url)
             
             # Get lyrics
             lyrics = self.get_lyrics(track_url)
@@ -288,5 +314,30 @@ class MusixmatchProvider(LyricsProvider):
             )
             
         except Exception as e:
-            print(f"Error fetching track info: {e}")
+            log.warning('Error fetching track info', url=track_url, error=e)
             return None
+    
+    def get_track_info_if_modified(self, track_url: str, track_number: Optional[int], etag: Optional[str] = None,
+                                   last_modified: Optional[str] = None) -> Revalidated:
+        """Get track information from a Musixmatch track URL unless the page is unchanged."""
+        try:
+            response = fetch(self.session, track_url, self.name, TRACK_FETCH_SECONDS,
+                             headers=conditional_headers(etag, last_modified))
+            if response.status_code == 304:
+                return Revalidated(not_modified=True, **validators(response))
+            lyrics = self._parse_lyrics(response.text)
+            artist, title = self._names_from_url(track_url)
+            info = TrackInfo(title=title, artist=artist, url=track_url, track_number=track_number, lyrics=lyrics)
+            return Revalidated(info, **validators(response))
+            
+        except Exception as e:
+            log.warning('Error revalidating track info', url=track_url, error=e)
+            return Revalidated()
+    
+    def _names_from_url(self, track_url: str):
+        """The (artist, title) pair of a track URL, whose path is /lyrics/ARTIST/TITLE."""
+        # Remove self.base_url from track_url
+        parts = track_url.replace(self.base_url, '').split('/')
+        if len(parts) >= 4:  # ['', 'lyrics', artist, title, ...]
+            return parts[2].replace('-', ' ').title(), parts[3].replace('-', ' ').title()
+        return "", ""
@@ -0,0 +1,89 @@
+import functools
+import threading
+from dataclasses import replace
+from typing import Any, Callable, Dict, Hashable, Optional
+from metrics import COALESCED_CALLS
+from .http import DeadlineExceeded, normalize_url, time_left
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its outcome.
+
+    Only useful outcomes are shared: when the in-flight call fails or its
+    result is not ``shareable`` (e.g. a provider that swallowed an error and
+    returned None), each waiting caller runs the call itself, so one job's
+    failure or deadline is not passed on to the others. A waiter stops
+    waiting at its own deadline (``providers.http.deadline``) and raises
+    DeadlineExceeded.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any], shareable: Callable[[Any], bool] = bool):
+        """Return ``(result, shared)``; shared is True when another call did the work."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            # The leader may belong to a job with more time: wait no longer than this caller's deadline
+            left = time_left()
+            if not call.done.wait(None if left is None else max(left, 0)):
+                raise DeadlineExceeded(f'Time budget exceeded waiting for a shared call to {key}')
+            if call.error is None and shareable(call.result):
+                return call.result, True
+            return fn(), False
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+_flights = SingleFlight()
+
+def with_track_number(track_info, track_number, *args, **kwargs):
+    """Give each caller of a shared get_track_info result its own track number."""
+    return replace(track_info, track_number=track_number) if track_info else track_info
+
+def copy_list(tracks, *args, **kwargs):
+    return list(tracks) if tracks is not None else tracks
+
+def has_lyrics(track_info) -> bool:
+    """A get_track_info result worth sharing: providers return info without lyrics when the fetch failed."""
+    return bool(track_info and track_info.lyrics)
+
+def coalesced(call: str, adapt: Optional[Callable[..., Any]] = None, shareable: Callable[[Any], bool] = bool):
+    """Decorate a provider method whose first argument is a page URL.
+
+    Concurrent calls for the same provider, method and normalized URL wait on
+    one in-flight call and share its result when ``shareable(result)``; the
+    other arguments are not part of the key. ``adapt(result, *args, **kwargs)``
+    tailors the shared result to each caller, e.g. to set its own track number.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, url, *args, **kwargs):
+            if not url:
+                return method(self, url, *args, **kwargs)
+            key = (type(self).__name__, call, normalize_url(url))
+            result, shared = _flights.do(key, lambda: method(self, url, *args, **kwargs), shareable)
+            if shared:
+                COALESCED_CALLS.inc(provider=self.name, call=call)
+            return adapt(result, *args, **kwargs) if adapt else result
+        return wrapper
+    return decorator
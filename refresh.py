@@ -0,0 +1,165 @@
+"""
+Incremental refresh of lyrics embedded by earlier runs.
+
+Every embed records the page the lyrics came from in the file's tags. A
+refresh goes over a library, and for each file whose last check is older than
+the refresh interval it asks the provider for the page again with the
+ETag/Last-Modified validators of the previous check, so an unchanged page
+costs a 304. When the page did change, the lyrics are parsed and compared by
+content hash with what was embedded, and only files whose lyrics actually
+changed are written.
+
+Each domain gets a request budget per run. Files are checked oldest first,
+and those over budget are left for the next run, so a large library is kept
+current a slice at a time. Validators, lyrics hashes and check times are kept
+in a JSON state file next to the library.
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from providers.base_provider import LyricsProvider, Revalidated
+from providers.factory import ProviderFactory
+from utilities import get_embedded_lyrics
+from lyrics_embedder import add_lyrics_to_audio
+from tracing import get_logger, span
+
+log = get_logger('refresh')
+
+def lyrics_digest(lyrics: Optional[str]) -> Optional[str]:
+    """Hash of lyrics, ignoring surrounding whitespace."""
+    if lyrics is None:
+        return None
+    return hashlib.sha256(lyrics.strip().encode('utf-8')).hexdigest()
+
+class RefreshState:
+    """Last check of every refreshed file, keyed by absolute path."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.files = json.load(f).get('files', {})
+
+    def get(self, path: str) -> dict:
+        return self.files.get(os.path.abspath(path), {})
+
+    def update(self, path: str, **fields) -> None:
+        key = os.path.abspath(path)
+        self.files[key] = {**self.files.get(key, {}), **fields}
+
+    def save(self) -> None:
+        # Write a new file and move it into place, so an interrupted save keeps the old state
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'files': self.files}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+class Refresher:
+    """Re-check embedded lyrics against their source pages.
+
+    Args:
+        state_path: JSON file with the validators and check time of every file
+        interval: Seconds before a file is checked again
+        domain_budget: Requests per domain in one run
+        on_file: Called with the result dict of every file that was checked
+        clock: Current time in seconds, replaceable in tests
+    """
+
+    def __init__(self, state_path: str, interval: float = 7 * 24 * 60 * 60, domain_budget: int = 100,
+                 on_file: Optional[Callable[[dict], None]] = None, clock: Callable[[], float] = time.time):
+        self.state = RefreshState(state_path)
+        self.interval = interval
+        self.domain_budget = domain_budget
+        self.on_file = on_file or (lambda result: None)
+        self.clock = clock
+        self._providers: Dict[type, LyricsProvider] = {}
+
+    def _provider(self, url: str) -> Optional[LyricsProvider]:
+        # One instance per provider class, so sessions are reused across files
+        provider = ProviderFactory.get_provider_for_url(url)
+        if provider is None:
+            return None
+        return self._providers.setdefault(type(provider), provider)
+
+    def run(self, paths: List[str]) -> dict:
+        """Refresh the files that are due; returns counts per outcome and per-file results."""
+        now = self.clock()
+        summary = Counter()
+        due = []
+        for path in paths:
+            lyrics, url = get_embedded_lyrics(path)
+            if not url:
+                summary['no_source'] += 1
+                continue
+            checked = self.state.get(path).get('checked_at')
+            if checked is not None and checked + self.interval > now:
+                summary['fresh'] += 1
+                continue
+            due.append((checked or 0, path, url, lyrics))
+        # Never checked and oldest checks first, so files deferred by the budget go first next time
+        due.sort(key=lambda item: item[0])
+
+        requests_by_domain = Counter()
+        results = []
+        # Files that share a page share one request
+        pages: Dict[tuple, Revalidated] = {}
+        try:
+            for _, path, url, lyrics in due:
+                result = self._refresh(path, url, lyrics, pages, requests_by_domain)
+                summary[result['status']] += 1
+                if result['status'] != 'deferred':
+                    results.append(result)
+                    self.on_file(result)
+        finally:
+            self.state.save()
+        log.info('Refresh finished', files=len(paths), requests=sum(requests_by_domain.values()), **summary)
+        return {'summary': dict(summary), 'requests': dict(requests_by_domain), 'files': results}
+
+    def _refresh(self, path: str, url: str, embedded: Optional[str], pages: Dict[tuple, Revalidated],
+                 requests_by_domain: Counter) -> dict:
+        result = {'path': path, 'url': url}
+        record = self.state.get(path)
+        # A file that was changed by hand since the last check is compared with its tags, not the state
+        embedded_digest = lyrics_digest(embedded)
+        known = record.get('lyrics_sha256') == embedded_digest
+        etag = record.get('etag') if known else None
+        last_modified = record.get('last_modified') if known else None
+        key = (url, etag, last_modified)
+        if key not in pages:
+            domain = urlsplit(url).netloc.lower()
+            if requests_by_domain[domain] >= self.domain_budget:
+                return {**result, 'status': 'deferred'}
+            provider = self._provider(url)
+            if provider is None:
+                return {**result, 'status': 'error', 'message': 'Unsupported source URL'}
+            requests_by_domain[domain] += 1
+            with span('refresh', url=url):
+                pages[key] = provider.get_track_info_if_modified(url, None, etag, last_modified)
+        page = pages[key]
+
+        checked = {'url': url, 'checked_at': self.clock(), 'etag': page.etag, 'last_modified': page.last_modified}
+        if page.not_modified:
+            # A 304 need not repeat the validators; keep the ones that matched
+            self.state.update(path, **{**checked, 'etag': page.etag or etag, 'last_modified': page.last_modified or last_modified})
+            return {**result, 'status': 'not_modified'}
+        if page.info is None or not page.info.lyrics or not page.info.lyrics.strip():
+            # Keep the lyrics we have and try again next run
+            return {**result, 'status': 'error', 'message': 'Could not fetch lyrics'}
+        digest = lyrics_digest(page.info.lyrics)
+        if digest == embedded_digest:
+            self.state.update(path, lyrics_sha256=digest, **checked)
+            return {**result, 'status': 'unchanged'}
+        with span('embed', path=path):
+            success = add_lyrics_to_audio(path, page.info.lyrics, source_url=url)
+        if not success:
+            return {**result, 'status': 'error', 'message': 'Failed to embed lyrics'}
+        self.state.update(path, lyrics_sha256=digest, **checked)
+        log.info('Lyrics updated', path=path, url=url)
+        return {**result, 'status': 'updated'}
@@ -11,8 +11,10 @@ document.addEventListener('DOMContentLoaded', function() {
     const trackList = document.getElementById('track-list');
     const validTracksContainer = document.getElementById('valid-tracks');
     const invalidTracksContainer = document.getElementById('invalid-tracks');
+    const downloadLink = document.getElementById('download-link');
     
-    let droppedFiles = [];
+    // Selected files keyed by name and size, in insertion order
+    const droppedFiles = new Map();
     let track_info_list = [];
     
     // Helper Functions
@@ -50,7 +52,172 @@ document.addEventListener('DOMContentLoaded', function() {
         progressText.textContent = `${Math.round(percent)}%`;
     }
     
+    // Track number pre-scan
+    // The server skips files without a track number, so read the ID3 TRCK or
+    // MP4 trkn tag in the browser and never upload files that lack one
+    const TAG_HEAD_SIZE = 64 * 1024;
+    const TAG_SCAN_CONCURRENCY = 8;
+    
+    async function readBytes(file, start, end) {
+        return new Uint8Array(await file.slice(start, end).arrayBuffer());
+    }
+    
+    function parseTrackText(text) {
+        const track = parseInt(String(text).split('/')[0].trim(), 10);
+        return track > 0 ? track : null;
+    }
+    
+    function decodeId3Text(bytes) {
+        // First byte is the text encoding: 0 latin1, 1 UTF-16 with BOM, 2 UTF-16BE, 3 UTF-8
+        const encodings = ['latin1', 'utf-16', 'utf-16be', 'utf-8'];
+        const text = new TextDecoder(encodings[bytes[0]] || 'latin1').decode(bytes.subarray(1));
+        return text.replace(/\0/g, '');
+    }
+    
+    async function readId3TrackNumber(file, head) {
+        const version = head[3];
+        const flags = head[5];
+        const syncsafe = (b, i) => (b[i] << 21) | (b[i + 1] << 14) | (b[i + 2] << 7) | b[i + 3];
+        const tagEnd = 10 + syncsafe(head, 6);
+        // TRCK is normally near the start, but cover art may come first
+        const tag = tagEnd > head.length ? await readBytes(file, 0, tagEnd) : head;
+        const view = new DataView(tag.buffer, tag.byteOffset, tag.byteLength);
+        const idLength = version === 2 ? 3 : 4;
+        const headerLength = version === 2 ? 6 : 10;
+        let pos = 10;
+        if (flags & 0x40 && version > 2) {
+            // Skip the extended header
+            pos += version === 4 ? syncsafe(tag, 10) : 4 + view.getUint32(10);
+        }
+        while (pos + headerLength <= Math.min(tagEnd, tag.length)) {
+            const id = String.fromCharCode(...tag.subarray(pos, pos + idLength));
+            if (!/^[A-Z0-9]+$/.test(id)) break;  // Padding
+            let size;
+            if (version === 2) {
+                size = (tag[pos + 3] << 16) | (tag[pos + 4] << 8) | tag[pos + 5];
+            } else if (version === 4) {
+                size = syncsafe(tag, pos + 4);
+            } else {
+                size = view.getUint32(pos + 4);
+            }
+            const body = pos + headerLength;
+            if (id === 'TRCK' || id === 'TRK') {
+                return parseTrackText(decodeId3Text(tag.subarray(body, body + size)));
+            }
+            pos = body + size;
+        }
+        return null;
+    }
+    
+    async function findMp4Box(file, start, end, type) {
+        // Walk sibling boxes reading only their 16-byte headers
+        let pos = start;
+        while (pos + 8 <= end) {
+            const header = await readBytes(file, pos, Math.min(pos + 16, end));
+            const view = new DataView(header.buffer);
+            let size = view.getUint32(0);
+            const boxType = String.fromCharCode(...header.subarray(4, 8));
+            let headerSize = 8;
+            if (size === 1 && header.length >= 16) {
+                size = Number(view.getBigUint64(8));
+                headerSize = 16;
+            } else if (size === 0) {
+                size = end - pos;
+            }
+            if (size < headerSize) return null;
+            if (boxType === type) {
+                return { start: pos + headerSize, end: pos + size };
+            }
+            pos += size;
+        }
+        return null;
+    }
+    
+    async function readMp4TrackNumber(file) {
+        let box = { start: 0, end: file.size };
+        for (const type of ['moov', 'udta', 'meta', 'ilst', 'trkn', 'data']) {
+            box = await findMp4Box(file, box.start, box.end, type);
+            if (!box) return null;
+            if (type === 'meta') {
+                box.start += 4;  // meta is a full box: skip version and flags
+            }
+        }
+        // data payload: type (4), locale (4), reserved (2), track (2), total (2)
+        const data = await readBytes(file, box.start, Math.min(box.end, box.start + 16));
+        if (data.length < 12) return null;
+        const track = new DataView(data.buffer).getUint16(10);
+        return track > 0 ? track : null;
+    }
+    
+    // ID3v1 tag in the last 128 bytes; v1.1 keeps the track in byte 126 after a zero.
+    // Resolves to undefined for a tag in another form, so the server decides.
+    async function readId3v1TrackNumber(file) {
+        if (file.size < 128) return null;
+        const tail = await readBytes(file, file.size - 128, file.size);
+        if (String.fromCharCode(...tail.subarray(0, 3)) !== 'TAG') return null;
+        if (tail[125] === 0 && tail[126] !== 0) return tail[126];
+        return undefined;
+    }
+    
+    // Resolves to the track number, or null when the file has none. Throws when
+    // the file cannot be parsed, in which case the server decides.
+    async function readTrackNumber(file) {
+        const name = file.name.toLowerCase();
+        const head = await readBytes(file, 0, Math.min(TAG_HEAD_SIZE, file.size));
+        if (head[0] === 0x49 && head[1] === 0x44 && head[2] === 0x33) {  // "ID3"
+            const track = await readId3TrackNumber(file, head);
+            // The server also reads an ID3v1 tag when the ID3v2 tag has no track
+            return track !== null ? track : readId3v1TrackNumber(file);
+        }
+        if (String.fromCharCode(...head.subarray(4, 8)) === 'ftyp') {
+            return readMp4TrackNumber(file);
+        }
+        if (name.endsWith('.mp3')) {
+            return readId3v1TrackNumber(file);  // MP3 without an ID3v2 tag
+        }
+        throw new Error('Unknown file format');
+    }
+    
+    // Scans run a few at a time so that dropping many files stays responsive
+    const scanQueue = [];
+    let activeScans = 0;
+    
+    function scheduleScan(entry) {
+        entry.scan = new Promise(resolve => {
+            scanQueue.push(async () => {
+                try {
+                    entry.trackNumber = await readTrackNumber(entry.file);
+                } catch (error) {
+                    entry.trackNumber = undefined;
+                }
+                renderFileStatus(entry);
+                resolve();
+            });
+        });
+        runScans();
+    }
+    
+    function runScans() {
+        while (activeScans < TAG_SCAN_CONCURRENCY && scanQueue.length > 0) {
+            const scan = scanQueue.shift();
+            activeScans++;
+            scan().finally(() => {
+                activeScans--;
+                runScans();
+            });
+        }
+    }
+    
+    function isUploadable(entry) {
+        // Unscanned and unparsable files are sent; the server has the final say
+        return entry.trackNumber !== null;
+    }
+    
     // File Handling
+    function fileKey(file) {
+        return `${file.name}:${file.size}`;
+    }
+    
     function handleFiles(files) {
         const newFiles = Array.from(files).filter(file => 
             file.type.startsWith('audio/') || 
@@ -63,49 +230,83 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
         
-        // Add new files to the list
+        // Only new files are rendered; existing rows are left untouched
+        const fragment = document.createDocumentFragment();
+        const added = [];
         newFiles.forEach(file => {
-            if (!droppedFiles.some(f => f.name === file.name && f.size === file.size)) {
-                droppedFiles.push(file);
-            }
+            const key = fileKey(file);
+            if (droppedFiles.has(key)) return;
+            const entry = { key, file, trackNumber: undefined, element: createFileItem(key, file), scan: null };
+            droppedFiles.set(key, entry);
+            fragment.appendChild(entry.element);
+            added.push(entry);
         });
         
-        updateFileList();
+        if (added.length > 0) {
+            const placeholder = fileList.querySelector('p');
+            if (placeholder) placeholder.remove();
+            fileList.appendChild(fragment);
+            added.forEach(scheduleScan);
+        }
         updateEmbedButton();
     }
     
-    function updateFileList() {
-        fileList.innerHTML = '';
-        
-        if (droppedFiles.length === 0) {
-            fileList.innerHTML = '<p>No files selected</p>';
-            return;
+    function createFileItem(key, file) {
+        const fileItem = document.createElement('div');
+        fileItem.className = 'file-item';
+        fileItem.dataset.key = key;
+        fileItem.innerHTML = `
+            <div class="file-info"></div>
+            <span class="file-status pending">Reading tags...</span>
+            <button class="remove-file" title="Remove file">×</button>
+        `;
+        const info = fileItem.querySelector('.file-info');
+        info.title = file.name;
+        info.textContent = `${file.name} (${formatFileSize(file.size)})`;
+        return fileItem;
+    }
+    
+    function renderFileStatus(entry) {
+        const status = entry.element.querySelector('.file-status');
+        if (entry.trackNumber === null) {
+            status.textContent = 'No track number, will not be uploaded';
+            status.className = 'file-status status-error';
+        } else if (entry.trackNumber === undefined) {
+            status.textContent = 'Pending';
+            status.className = 'file-status pending';
+        } else {
+            status.textContent = `Track ${entry.trackNumber}`;
+            status.className = 'file-status pending';
         }
-        
-        droppedFiles.forEach((file, index) => {
-            const fileItem = document.createElement('div');
-            fileItem.className = 'file-item';
-            fileItem.innerHTML = `
-                <div class="file-info" title="${file.name}">
-                    ${file.name} (${formatFileSize(file.size)})
-                </div>
-                <span class="file-status pending">Pending</span>
-                <button class="remove-file" onclick="event.stopPropagation(); removeFile(${index})" title="Remove file">×</button>
-            `;
-            fileList.appendChild(fileItem);
-        });
+        updateEmbedButton();
+    }
+    
+    function resetFileList(message) {
+        droppedFiles.clear();
+        fileList.innerHTML = `<p>${message}</p>`;
     }
     
     function updateEmbedButton() {
-        embedBtn.disabled = droppedFiles.length === 0 || !lyricsUrl.value.trim();
+        let uploadable = 0;
+        for (const entry of droppedFiles.values()) {
+            if (isUploadable(entry)) uploadable++;
+        }
+        embedBtn.disabled = uploadable === 0 || !lyricsUrl.value.trim();
     }
     
-    // Make removeFile available globally
-    window.removeFile = function(index) {
-        droppedFiles.splice(index, 1);
-        updateFileList();
+    // Remove buttons are handled once for the whole list
+    fileList.addEventListener('click', function(e) {
+        const button = e.target.closest('.remove-file');
+        if (!button) return;
+        e.stopPropagation();
+        const fileItem = button.closest('.file-item');
+        droppedFiles.delete(fileItem.dataset.key);
+        fileItem.remove();
+        if (droppedFiles.size === 0) {
+            fileList.innerHTML = '<p>No files selected</p>';
+        }
         updateEmbedButton();
-    };
+    });
     
     // Drag and Drop Handlers
     function preventDefaults(e) {
@@ -151,48 +352,212 @@ document.addEventListener('DOMContentLoaded', function() {
     // Process Files
     embedBtn.addEventListener('click', processFiles);
     
-    function processFiles() {
-        if (droppedFiles.length === 0 || !lyricsUrl.value.trim()) return;
+    // Uploads start with a content-hash handshake: files the server already
+    // holds are skipped and interrupted uploads resume from the last chunk
+    const UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024;
+    const UPLOAD_MAX_RETRIES = 5;
+    
+    async function sha256Hex(file) {
+        const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+        return Array.from(new Uint8Array(digest))
+            .map(byte => byte.toString(16).padStart(2, '0'))
+            .join('');
+    }
+    
+    async function uploadHandshake(entries) {
+        const response = await fetch('/upload/handshake', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                files: entries.map(entry => ({ name: entry.file.name, size: entry.file.size, sha256: entry.sha256 }))
+            })
+        });
+        const data = await response.json();
+        if (!data.success) {
+            throw new Error(data.error);
+        }
+        return data.files;
+    }
+    
+    async function uploadChunks(file, sha256, offset) {
+        let retries = 0;
+        do {
+            try {
+                const chunk = file.slice(offset, offset + UPLOAD_CHUNK_SIZE);
+                const response = await fetch(`/upload/${sha256}?offset=${offset}&size=${file.size}`, {
+                    method: 'PUT',
+                    body: chunk
+                });
+                const data = await response.json();
+                if (response.status === 507) {
+                    // Server storage is full; retrying will not help
+                    const quotaError = new Error(data.error);
+                    quotaError.fatal = true;
+                    throw quotaError;
+                }
+                if (!response.ok && response.status !== 409) {
+                    throw new Error(data.error || `Upload failed with status ${response.status}`);
+                }
+                if (data.complete) {
+                    return;
+                }
+                // On 409 the server reports the offset it actually holds
+                if (response.status === 409 && ++retries > UPLOAD_MAX_RETRIES) {
+                    throw new Error(data.error);
+                }
+                offset = data.offset;
+            } catch (error) {
+                if (error.fatal || ++retries > UPLOAD_MAX_RETRIES) {
+                    throw error;
+                }
+                await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+                // Ask how much the server received before resuming
+                const [status] = await uploadHandshake([{ file, sha256 }]);
+                if (status.status === 'present') {
+                    return;
+                }
+                offset = status.offset;
+            }
+        } while (offset < file.size);
+    }
+    
+    // Files are uploaded over several parallel requests and attached to the
+    // job one by one; the server analyzes each file as soon as it arrives
+    const UPLOAD_CONCURRENCY = parseInt(dropArea.dataset.uploadConcurrency, 10) || 4;
+    
+    async function attachFile(jobId, file) {
+        const attachUrl = `/jobs/${encodeURIComponent(jobId)}/files`;
+        let response;
+        if (window.crypto && crypto.subtle) {
+            const sha256 = await sha256Hex(file);
+            const [status] = await uploadHandshake([{ file, sha256 }]);
+            if (status.status !== 'present') {
+                await uploadChunks(file, sha256, status.offset);
+            }
+            response = await fetch(attachUrl, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ filename: file.name, sha256 })
+            });
+        } else {
+            // crypto.subtle only exists in secure contexts; send the whole file at once
+            const formData = new FormData();
+            formData.append('file', file);
+            response = await fetch(attachUrl, { method: 'POST', body: formData });
+        }
+        const data = await response.json();
+        if (!data.success) {
+            const error = new Error(data.error);
+            error.fatal = response.status === 507;
+            throw error;
+        }
+        return data;
+    }
+    
+    async function uploadFiles(jobId, files, onUploaded) {
+        const queue = files.slice();
+        async function worker() {
+            while (queue.length > 0) {
+                const file = queue.shift();
+                onUploaded(await attachFile(jobId, file));
+            }
+        }
+        const workers = Array.from({ length: Math.min(UPLOAD_CONCURRENCY, files.length) }, worker);
+        await Promise.all(workers);
+    }
+    
+    async function processFiles() {
+        if (droppedFiles.size === 0 || !lyricsUrl.value.trim()) return;
+        
+        const entries = Array.from(droppedFiles.values());
+        await Promise.all(entries.map(entry => entry.scan));
+        const files = entries.filter(isUploadable).map(entry => entry.file);
+        const rejected = entries.length - files.length;
+        if (files.length === 0) {
+            showMessage('None of the selected files has a track number in its metadata', 'error');
+            return;
+        }
+        if (rejected > 0) {
+            showMessage(`${rejected} file(s) without a track number were skipped`, 'error');
+        }
+        
+        const jobId = newJobId();
+        connectEventStream(jobId);
+        
+        // Let the server scrape the album while the files are uploading
+        const albumUrl = lyricsUrl.value.trim();
+        fetch(`/jobs/${encodeURIComponent(jobId)}/album`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ url: albumUrl })
+        }).catch(error => console.warn('Album prefetch not registered:', error));
         
         const formData = new FormData();
-        droppedFiles.forEach(file => {
-            formData.append('files', file);
-        });
-        formData.append('url', lyricsUrl.value.trim());
+        formData.append('url', albumUrl);
+        formData.append('job_id', jobId);
         
         // Clear lyricsUrl abd reset file list (from drag and drop feature)
         lyricsUrl.value = '';
         updateEmbedButton();
-        fileList.innerHTML = '<p>Files Uploaded</p>';
-        droppedFiles = [];
+        resetFileList(`Uploading files (0/${files.length})`);
+        const uploadStatus = fileList.firstElementChild;
 
         // Show processing section
         processingSection.style.display = 'block';
         
         // Reset progress
         updateProgress(0);
+        downloadLink.style.display = 'none';
         
-        // Send files to server
-        fetch('/process', {
-            method: 'POST',
-            body: formData
-        })
-        .then(response => response.json())
-        .then(data => {
+        try {
+            let uploaded = 0;
+            await uploadFiles(jobId, files, () => {
+                uploadStatus.textContent = `Uploading files (${++uploaded}/${files.length})`;
+            });
+            uploadStatus.textContent = 'Files Uploaded';
+            
+            // Every file is attached to the job; process them all
+            const response = await fetch('/process', {
+                method: 'POST',
+                body: formData
+            });
+            const data = await response.json();
             if (data.success) {
                 showMessage('Successfully processed all tracks!', 'success');
+                downloadLink.href = `/download/${encodeURIComponent(jobId)}`;
+                downloadLink.style.display = 'block';
             } else {
                 showMessage(`Error: ${data.error}`, 'error');
             }
-        })
-        .catch(error => {
+        } catch (error) {
             console.error('Error:', error);
-            showMessage('An error occurred while processing the files', 'error');
-        });
+            showMessage(error.fatal ? error.message : 'An error occurred while processing the files', 'error');
+        }
     }
     
     // SSE Event Listeners
-    const eventSource = new EventSource('/stream');
+    // Each job gets its own channel so clients only receive their own updates
+    let eventSource = null;
+    const sseHandlers = {};
+    
+    function newJobId() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 10);
+    }
+    
+    function connectEventStream(jobId) {
+        if (eventSource) {
+            eventSource.close();
+        }
+        // last_event_id=0 replays anything published before the connection opened;
+        // the browser sends Last-Event-ID on its own when it reconnects
+        eventSource = new EventSource(`/stream?job=${encodeURIComponent(jobId)}&last_event_id=0`);
+        Object.entries(sseHandlers).forEach(([eventName, handler]) => {
+            eventSource.addEventListener(eventName, handler);
+        });
+    }
     
     function updateTrackList(tracks) {
         // Clear previous content
@@ -208,7 +573,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 const trackItem = document.createElement('div');
                 trackItem.className = 'track-item';
                 message = track?.message || '';
-                // available status: uploaded, found, processing, success, error
+                // available status: uploaded, found, processing, success, timeout, error
                 css_status = "status-found";
                 switch (track.status) {
                     case "uploaded":
@@ -223,6 +588,9 @@ document.addEventListener('DOMContentLoaded', function() {
                     case "success":
                         css_status = "status-success";
                         break;
+                    case "timeout":
+                        css_status = "status-timeout";
+                        break;
                     default:
                         css_status = "status-error";
                         break;
@@ -268,7 +636,7 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
-    eventSource.addEventListener('tracks', function(e) {
+    sseHandlers['tracks'] = function(e) {
         try {
             const data = JSON.parse(e.data);
             console.log('Received tracks event:', data);
@@ -295,9 +663,9 @@ document.addEventListener('DOMContentLoaded', function() {
             console.error('Error processing tracks event:', error, 'Data:', e.data);
             showMessage('Error processing track list from server', 'error');
         }
-    });
+    };
     
-    eventSource.addEventListener('track_analysis', function(e) {
+    sseHandlers['track_analysis'] = function(e) {
         try {
             const data = JSON.parse(e.data);
             console.log('Received track_analysis event:', data);
@@ -309,10 +677,10 @@ document.addEventListener('DOMContentLoaded', function() {
             console.error('Error processing track_analysis event:', error);
             showMessage('Error processing track analysis', 'error');
         }
-    });
+    };
     
     // Handle album lyrics verification status
-    eventSource.addEventListener('album_lyrics', function(e) {
+    sseHandlers['album_lyrics'] = function(e) {
         try {
             const data = JSON.parse(e.data);
             console.log('Received album_lyrics event:', data);
@@ -372,9 +740,9 @@ document.addEventListener('DOMContentLoaded', function() {
             console.error('Error processing album_lyrics event:', error, 'Data:', e.data);
             showMessage('Error processing lyrics verification', 'error');
         }
-    });
+    };
 
-    eventSource.addEventListener('track_update', function(e) {
+    sseHandlers['track_update'] = function(e) {
         try {
             const data = JSON.parse(e.data);
             console.log('Received track_update event:', data);
@@ -408,10 +776,10 @@ document.addEventListener('DOMContentLoaded', function() {
         } catch (error) {
             console.error('Error processing track_update event:', error);
         }
-    });
+    };
     
-    eventSource.addEventListener('error', function(e) {
+    sseHandlers['error'] = function(e) {
         console.error('SSE Error:', e);
         showMessage('Connection to server lost. Please refresh the page.', 'error');
-    });
+    };
 });
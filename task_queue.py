@@ -0,0 +1,252 @@
+"""
+Durable task queue with leases, for spreading work over several processes.
+
+A task is leased by one worker at a time for ``lease_seconds``. A worker that
+finishes reports the result, and a worker that fails reports the error, which
+puts the task back with an exponential delay until it has been attempted
+``max_attempts`` times. A worker that dies simply stops renewing its lease;
+once the lease runs out the task is handed to the next worker, which counts as
+another attempt. Results reported under a lease that was already lost are
+ignored, so every task has exactly one outcome. A task can also be cancelled,
+which fails it for good before or while a worker runs it.
+
+TaskQueue is the interface a backend implements. SQLiteQueue keeps the queue
+in one SQLite file and is a single-host backend: its WAL journal needs memory
+shared by every process using the file, which a network filesystem cannot
+provide. Workers on several nodes need another backend; a SQLite file on a
+shared volume (``shared_volume=True``) falls back to the rollback journal and
+is only as safe as the volume's file locking, which many network filesystems
+get wrong.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Sequence
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+@dataclass
+class Task:
+    """One unit of work: a kind, a JSON payload and, once finished, its outcome."""
+    id: int
+    kind: str
+    payload: dict
+    status: str = PENDING
+    attempts: int = 0
+    max_attempts: int = 3
+    worker: Optional[str] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+class TaskQueue(ABC):
+    """Queue backend interface used by the coordinator and the workers."""
+
+    @abstractmethod
+    def put(self, kind: str, payload: dict, max_attempts: int = 3) -> int:
+        """Queue a task and return its id."""
+        pass
+
+    @abstractmethod
+    def lease(self, worker: str, kinds: Optional[Sequence[str]] = None, lease_seconds: float = 60) -> Optional[Task]:
+        """Lease the oldest available task, or return None when there is none."""
+        pass
+
+    @abstractmethod
+    def renew(self, task_id: int, worker: str, lease_seconds: float = 60) -> bool:
+        """Extend a lease; False when the worker no longer holds it."""
+        pass
+
+    @abstractmethod
+    def complete(self, task_id: int, worker: str, result: dict) -> bool:
+        """Report the result of a task; False when the worker no longer holds its lease."""
+        pass
+
+    @abstractmethod
+    def fail(self, task_id: int, worker: str, error: str) -> bool:
+        """Report a failed attempt; the task is retried until it runs out of attempts."""
+        pass
+
+    @abstractmethod
+    def finished(self, task_ids: Iterable[int]) -> List[Task]:
+        """The tasks among task_ids that are done or failed for good."""
+        pass
+
+    @abstractmethod
+    def cancel(self, task_ids: Iterable[int], error: str) -> int:
+        """Fail the unfinished tasks among task_ids for good, so no worker runs them; returns how many."""
+        pass
+
+    @abstractmethod
+    def counts(self) -> dict:
+        """Number of tasks by status."""
+        pass
+
+class SQLiteQueue(TaskQueue):
+    """TaskQueue stored in a SQLite database file.
+
+    Args:
+        path: Database file, shared by the coordinator and every worker
+        retry_delay: Seconds before the first retry of a failed task; doubled
+            for every further attempt
+        clock: Current time in seconds, replaceable in tests
+        shared_volume: The file is on a network volume used from several
+            hosts; WAL is not enabled, since it only works on one host
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            available_at REAL NOT NULL DEFAULT 0,
+            lease_until REAL,
+            worker TEXT,
+            result TEXT,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS tasks_available ON tasks (status, available_at);
+    '''
+
+    def __init__(self, path: str, retry_delay: float = 1.0, clock: Callable[[], float] = time.time,
+                 shared_volume: bool = False):
+        self.path = path
+        self.retry_delay = retry_delay
+        self.clock = clock
+        # sqlite3 connections cannot be shared between threads
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute(f"PRAGMA journal_mode={'DELETE' if shared_volume else 'WAL'}")
+        connection.executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _task(row: sqlite3.Row) -> Task:
+        return Task(row['id'], row['kind'], json.loads(row['payload']), row['status'], row['attempts'],
+                    row['max_attempts'], row['worker'], json.loads(row['result']) if row['result'] else None,
+                    row['error'])
+
+    def put(self, kind: str, payload: dict, max_attempts: int = 3) -> int:
+        cursor = self._connection().execute(
+            'INSERT INTO tasks (kind, payload, max_attempts) VALUES (?, ?, ?)',
+            (kind, json.dumps(payload), max_attempts))
+        return cursor.lastrowid
+
+    @staticmethod
+    def _expire(connection: sqlite3.Connection, now: float) -> None:
+        # Tasks whose last lease ran out with no attempts left have failed
+        connection.execute(
+            "UPDATE tasks SET status = 'failed', error = 'Lease expired' "
+            "WHERE status = 'leased' AND lease_until <= ? AND attempts >= max_attempts", (now,))
+
+    def lease(self, worker: str, kinds: Optional[Sequence[str]] = None, lease_seconds: float = 60) -> Optional[Task]:
+        connection = self._connection()
+        now = self.clock()
+        kind_filter, kind_args = '', []
+        if kinds:
+            kind_filter = f' AND kind IN ({",".join("?" * len(kinds))})'
+            kind_args = list(kinds)
+        # IMMEDIATE takes the write lock up front, so two workers cannot lease the same task
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._expire(connection, now)
+            row = connection.execute(
+                "SELECT * FROM tasks WHERE ((status = 'pending' AND available_at <= ?) "
+                f"OR (status = 'leased' AND lease_until <= ?)){kind_filter} ORDER BY id LIMIT 1",
+                [now, now] + kind_args).fetchone()
+            if row is None:
+                connection.execute('COMMIT')
+                return None
+            connection.execute(
+                "UPDATE tasks SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker, now + lease_seconds, row['id']))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        task = self._task(row)
+        task.status, task.worker, task.attempts = LEASED, worker, task.attempts + 1
+        return task
+
+    def renew(self, task_id: int, worker: str, lease_seconds: float = 60) -> bool:
+        cursor = self._connection().execute(
+            "UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+            (self.clock() + lease_seconds, task_id, worker))
+        return cursor.rowcount == 1
+
+    def complete(self, task_id: int, worker: str, result: dict) -> bool:
+        cursor = self._connection().execute(
+            "UPDATE tasks SET status = 'done', result = ?, error = NULL, lease_until = NULL "
+            "WHERE id = ? AND worker = ? AND status = 'leased'", (json.dumps(result), task_id, worker))
+        return cursor.rowcount == 1
+
+    def fail(self, task_id: int, worker: str, error: str) -> bool:
+        connection = self._connection()
+        row = connection.execute('SELECT attempts, max_attempts FROM tasks WHERE id = ? AND worker = ? '
+                                 "AND status = 'leased'", (task_id, worker)).fetchone()
+        if row is None:
+            return False
+        if row['attempts'] >= row['max_attempts']:
+            status, available_at = FAILED, 0
+        else:
+            status, available_at = PENDING, self.clock() + self.retry_delay * 2 ** (row['attempts'] - 1)
+        cursor = connection.execute(
+            'UPDATE tasks SET status = ?, error = ?, available_at = ?, lease_until = NULL '
+            "WHERE id = ? AND worker = ? AND status = 'leased'", (status, error, available_at, task_id, worker))
+        return cursor.rowcount == 1
+
+    def finished(self, task_ids: Iterable[int]) -> List[Task]:
+        task_ids = list(task_ids)
+        tasks = []
+        # Also done here: with every worker dead, no lease() call would ever fail them
+        self._expire(self._connection(), self.clock())
+        # Stay below SQLite's limit on query parameters
+        for start in range(0, len(task_ids), 500):
+            chunk = task_ids[start:start + 500]
+            rows = self._connection().execute(
+                f"SELECT * FROM tasks WHERE id IN ({','.join('?' * len(chunk))}) AND status IN ('done', 'failed')",
+                chunk).fetchall()
+            tasks.extend(self._task(row) for row in rows)
+        return tasks
+
+    def cancel(self, task_ids: Iterable[int], error: str) -> int:
+        task_ids = list(task_ids)
+        cancelled = 0
+        # A worker still holding the lease of a cancelled task can no longer report it
+        for start in range(0, len(task_ids), 500):
+            chunk = task_ids[start:start + 500]
+            cursor = self._connection().execute(
+                "UPDATE tasks SET status = 'failed', error = ?, lease_until = NULL "
+                f"WHERE id IN ({','.join('?' * len(chunk))}) AND status IN ('pending', 'leased')",
+                [error] + chunk)
+            cancelled += cursor.rowcount
+        return cancelled
+
+    def counts(self) -> dict:
+        rows = self._connection().execute('SELECT status, COUNT(*) AS count FROM tasks GROUP BY status').fetchall()
+        return {row['status']: row['count'] for row in rows}
+
+    def close(self) -> None:
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
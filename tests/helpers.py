@@ -0,0 +1,12 @@
+from mutagen.id3 import ID3, TRCK
+
+# One silent MPEG-1 Layer III frame
+MP3_FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+
+def make_mp3(path, track_number):
+    """Write a short MP3 file with an ID3 track number and return its path."""
+    path.write_bytes(MP3_FRAME * 10)
+    tags = ID3()
+    tags.add(TRCK(encoding=3, text=str(track_number)))
+    tags.save(str(path))
+    return path
@@ -0,0 +1,90 @@
+import asyncio
+from pathlib import Path
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+import asgi_lyrics_embedder
+import parse_pool
+from asgi_lyrics_embedder import LyricsEmbedderASGI, app
+from web_lyrics_embedder import announcer, app as flask_app
+
+def _http_scope(path, query_string=b'', headers=None):
+    return {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string,
+        'headers': headers or [], 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+        'scheme': 'http', 'http_version': '1.1', 'root_path': '',
+    }
+
+def test_stream_delivers_job_events_as_coroutine():
+    """The SSE stream replays and delivers job events without a dedicated thread."""
+    async def scenario():
+        sent = []
+        disconnect = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        announcer.announce({'tracks': []}, 'track_analysis', channel_id='asgi-job')
+        task = asyncio.ensure_future(app(_http_scope('/stream', b'job=asgi-job&last_event_id=0'), receive, send))
+        await asyncio.sleep(0.05)
+        announcer.announce({'track_number': 1, 'status': 'success'}, 'track_update', channel_id='asgi-job')
+        await asyncio.sleep(0.05)
+        disconnect.set()
+        await asyncio.wait_for(task, 1)
+        return sent
+
+    sent = asyncio.run(scenario())
+    assert sent[0]['status'] == 200
+    body = b''.join(message.get('body', b'') for message in sent[1:]).decode()
+    assert 'event: track_analysis' in body
+    assert 'event: track_update' in body
+    assert announcer.listener_count() == 0, "Listener should be removed after disconnect"
+
+def test_other_routes_are_bridged_to_flask():
+    """Non-streaming routes are served by the Flask app on the thread pool."""
+    async def scenario():
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+
+        await app(_http_scope('/'), receive, send)
+        return sent
+
+    sent = asyncio.run(scenario())
+    assert sent[0]['type'] == 'http.response.start'
+    assert sent[0]['status'] == 200
+    assert b'Lyrics Embedder' in b''.join(message.get('body', b'') for message in sent[1:])
+    assert sent[-1]['more_body'] is False
+
+def test_lifespan_starts_and_stops_the_parse_pool(monkeypatch):
+    """`uvicorn asgi_lyrics_embedder:app` never runs __main__, so the pool is set up at startup."""
+    calls = []
+    monkeypatch.setitem(flask_app.config, 'PARSE_PROCESSES', 3)
+    monkeypatch.setattr(parse_pool, 'configure', lambda processes: calls.append(('configure', processes)))
+    monkeypatch.setattr(parse_pool, 'shutdown', lambda: calls.append(('shutdown',)))
+    monkeypatch.setattr(asgi_lyrics_embedder.workspace, 'start_cleanup', lambda: None)
+
+    async def scenario():
+        messages = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        await LyricsEmbedderASGI(flask_app)({'type': 'lifespan'}, receive, send)
+        return sent
+
+    assert asyncio.run(scenario()) == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+    assert calls == [('configure', 3), ('shutdown',)]
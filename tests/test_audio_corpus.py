@@ -0,0 +1,23 @@
+from pathlib import Path
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from benchmarks.audio_corpus import LAYOUTS, generate
+from benchmarks.tag_benchmark import run_benchmarks
+from lyrics_embedder import add_lyrics_to_audio
+from utilities import get_track_number
+
+def test_every_layout_can_be_scanned_and_embedded(tmp_path):
+    corpus = generate(str(tmp_path), size_bytes=64 * 1024, files=2)
+    assert set(corpus) == set(LAYOUTS)
+    for paths in corpus.values():
+        assert [get_track_number(path) for path in paths] == [1, 2]
+        assert add_lyrics_to_audio(paths[0], 'New lyrics')
+
+def test_benchmark_reports_rewritten_bytes(tmp_path):
+    corpus = generate(str(tmp_path), size_bytes=64 * 1024, files=1, layouts=['mp3-id3v24-padded', 'mp3-id3v23-nopad'])
+    results = run_benchmarks(corpus)['results']
+    # Padding absorbs the new frame; without it the whole file is rewritten
+    assert results['mp3-id3v24-padded.embed']['bytes_rewritten'] < 16 * 1024
+    assert results['mp3-id3v23-nopad.embed']['bytes_rewritten'] > 64 * 1024
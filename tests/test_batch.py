@@ -0,0 +1,72 @@
+from pathlib import Path
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from mutagen.id3 import ID3
+import batch
+import web_lyrics_embedder as web
+from batch import BatchItem, BatchRunner, load_manifest
+from providers.base_provider import TrackInfo
+from tests.helpers import make_mp3
+from workspace import Workspace
+
+class StubProvider:
+    name = 'stub'
+
+    def get_track_info_without_lyrics_list_from_album(self, url):
+        return [TrackInfo(title=f'Song {n}', artist='Artist', track_number=n, url=f'{url}/{n}') for n in (1, 2)]
+
+    def get_track_info(self, url, track_number):
+        lyrics = '' if track_number == 2 else f'Lyrics of {url}'
+        return TrackInfo(title=f'Song {track_number}', artist='Artist', track_number=track_number, url=url, lyrics=lyrics)
+
+def test_load_csv_and_jsonl_manifests(tmp_path):
+    (tmp_path / 'albums.csv').write_text('url,path\nhttps://genius.com/a,a/01.mp3\nhttps://genius.com/a,a/02.mp3\n'
+                                         'https://genius.com/b,b\n')
+    (tmp_path / 'albums.jsonl').write_text('{"url": "https://genius.com/a", "paths": ["a/01.mp3"]}\n\n'
+                                           '{"url": "https://genius.com/b", "folder": "b"}\n')
+
+    csv_items = load_manifest(str(tmp_path / 'albums.csv'))
+    jsonl_items = load_manifest(str(tmp_path / 'albums.jsonl'))
+
+    assert [item.url for item in csv_items] == ['https://genius.com/a', 'https://genius.com/b']
+    assert csv_items[0].paths == [str(tmp_path / 'a' / '01.mp3'), str(tmp_path / 'a' / '02.mp3')]
+    assert jsonl_items[1].paths == [str(tmp_path / 'b')]
+
+def test_batch_report_per_album_and_track(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch.ProviderFactory, 'get_provider_for_url',
+                        lambda url: StubProvider() if 'genius' in url else None)
+    album = tmp_path / 'album'
+    album.mkdir()
+    make_mp3(album / '01.mp3', 1)
+    make_mp3(album / '02.mp3', 2)
+    make_mp3(album / '03.mp3', 3)
+    finished = []
+
+    report = BatchRunner(on_album=finished.append).run([
+        BatchItem('https://genius.com/albums/x', [str(album)]),
+        BatchItem('https://example.com/albums/y', [str(album / '01.mp3')]),
+    ])
+
+    genius, unsupported = report['albums']
+    assert genius['status'] == 'success'
+    assert [(t['track_number'], t['status']) for t in genius['tracks']] == [
+        (1, 'embedded'), (2, 'no_lyrics'), (3, 'not_in_album')]
+    assert unsupported['status'] == 'error' and unsupported['message'] == 'Unsupported URL'
+    assert report['summary']['tracks_embedded'] == 1
+    assert len(finished) == 2
+    assert ID3(str(album / '01.mp3')).getall('USLT')[0].text == 'Lyrics of https://genius.com/albums/x/1'
+
+def test_batch_route_answers_failures_with_json(tmp_path, monkeypatch):
+    class BrokenRunner(BatchRunner):
+        def run(self, items):
+            raise OSError('Disk unplugged')
+
+    monkeypatch.setattr(web, 'workspace', Workspace(str(tmp_path), quota_bytes=10000, ttl=3600))
+    monkeypatch.setattr(web, 'BatchRunner', BrokenRunner)
+    response = web.app.test_client().post('/batch', json={
+        'job_id': 'broken-batch', 'albums': [{'url': 'https://genius.com/albums/x', 'uploads': []}]})
+    assert response.status_code == 500
+    assert response.get_json() == {'success': False, 'error': 'Error processing batch: Disk unplugged'}
+    assert not web.workspace.is_pinned(web.workspace.job_path('broken-batch'))
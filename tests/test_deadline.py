@@ -0,0 +1,45 @@
+from pathlib import Path
+import sys
+import time
+
+import pytest
+import requests
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from benchmarks.fixtures import synthetic_genius
+from benchmarks.stub_server import StubServer
+from pipeline import AlbumPipeline, scan_files
+from providers.genius_provider import GeniusProvider
+from providers.http import DeadlineExceeded, deadline, fetch
+from tests.helpers import make_mp3
+
+def test_requests_are_cut_to_the_time_left():
+    with StubServer({'/page': '<html></html>'}, latency=2) as server:
+        with deadline(0.2):
+            with pytest.raises(DeadlineExceeded):
+                fetch(requests, server.url('/page'), 'stub')
+        assert server.requests == 0
+
+        # Cut at the deadline rather than after the stub's 2 s, with a wide margin for slow machines
+        start = time.perf_counter()
+        with deadline(0.5), pytest.raises(requests.Timeout):
+            fetch(requests, server.url('/page'), 'stub')
+        assert time.perf_counter() - start < 1.9
+
+def test_tracks_left_at_the_deadline_time_out_at_once(tmp_path):
+    fixtures = synthetic_genius(tracks=6, padding_kib=1)
+    tracks, _ = scan_files([str(make_mp3(tmp_path / f'0{n}.mp3', n)) for n in range(1, 7)])
+    events = []
+    with StubServer(fixtures.pages, latency=0.3) as server:
+        with deadline(1.5):
+            result = AlbumPipeline(GeniusProvider(), on_event=lambda name, data: events.append((name, data))).run(
+                server.url(fixtures.album_path), tracks)
+
+    # Seven requests of 0.3 s take 2.1 s, so some tracks time out; those are not
+    # requested at all, except one cut short in flight by the single fetch worker
+    fetched = [data for name, data in events if name == 'fetched']
+    assert len(fetched) == 6
+    assert result.timed_out == sum(data['timed_out'] for data in fetched) >= 1
+    assert all(data['error'].startswith('Timed out') for data in fetched if data['timed_out'])
+    assert server.requests <= 1 + (6 - result.timed_out) + 1
@@ -0,0 +1,130 @@
+from pathlib import Path
+import sys
+import threading
+import time
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from distributed import Coordinator, Worker
+from providers.base_provider import TrackInfo
+from task_queue import SQLiteQueue
+from utilities import get_embedded_lyrics
+from tests.helpers import make_mp3
+
+class SlowProvider:
+    name = 'slow'
+
+    def get_track_info_without_lyrics_list_from_album(self, url):
+        return [TrackInfo(title=f'Song {n}', artist='Artist', track_number=n, url=f'{url}/{n}') for n in range(1, 9)]
+
+    def get_track_info(self, url, track_number):
+        time.sleep(0.1)
+        return TrackInfo(title=f'Song {track_number}', artist='Artist', track_number=track_number, url=url,
+                         lyrics=f'Lyrics of {url}')
+
+def test_tasks_of_a_dead_worker_are_retried_until_out_of_attempts(tmp_path):
+    now = [0.0]
+    queue = SQLiteQueue(str(tmp_path / 'queue.db'), retry_delay=5, clock=lambda: now[0])
+    task_id = queue.put('fetch', {'url': 'https://genius.com/x'}, max_attempts=3)
+
+    assert queue.lease('a', lease_seconds=10).id == task_id
+    assert queue.lease('b', lease_seconds=10) is None
+    # Worker a dies; its lease runs out and b takes over
+    now[0] = 11
+    retried = queue.lease('b', lease_seconds=10)
+    assert (retried.id, retried.attempts) == (task_id, 2)
+    assert not queue.complete(task_id, 'a', {'late': True})
+
+    assert queue.fail(task_id, 'b', 'HTTP 503')
+    assert queue.lease('c') is None
+    now[0] = 11 + 2 * 5
+    assert queue.lease('c', lease_seconds=10).attempts == 3
+    now[0] += 11
+    assert queue.lease('d') is None
+    failed, = queue.finished([task_id])
+    assert (failed.status, failed.error) == ('failed', 'Lease expired')
+
+    # With no worker left to lease, checking for finished tasks fails them too
+    last_id = queue.put('embed', {'path': 'x.mp3'}, max_attempts=1)
+    assert queue.lease('e', lease_seconds=10).id == last_id
+    now[0] += 11
+    assert [task.status for task in queue.finished([last_id])] == ['failed']
+
+def test_coordinator_gives_up_without_workers(tmp_path):
+    queue = SQLiteQueue(str(tmp_path / 'queue.db'))
+    path = str(make_mp3(tmp_path / '1.mp3', 1))
+    start = time.perf_counter()
+    result = Coordinator(queue, poll_interval=0.01, timeout=0.2).run('https://genius.com/albums/x', [path])
+    assert result.album_tracks == 0 and time.perf_counter() - start < 1
+    assert queue.counts() == {'failed': 1}
+
+def test_tasks_left_at_the_timeout_are_cancelled(tmp_path):
+    queue = SQLiteQueue(str(tmp_path / 'queue.db'))
+    path = str(make_mp3(tmp_path / '1.mp3', 1))
+    # Only the album is taken; the fetch waits for a worker that comes too late
+    albums = Worker(queue, 'albums', kinds=['album'], poll_interval=0.01, provider_for=lambda url, name: SlowProvider())
+    thread = threading.Thread(target=albums.run)
+    thread.start()
+    try:
+        result = Coordinator(queue, poll_interval=0.01, timeout=0.5).run('https://genius.com/albums/x', [path])
+    finally:
+        albums.stop()
+        thread.join()
+    assert (result.album_tracks, result.fetched) == (8, 0)
+    assert queue.counts() == {'done': 1, 'failed': 1}
+
+    late = Worker(queue, 'late', poll_interval=0.01, provider_for=lambda url, name: SlowProvider())
+    assert late.run(idle_exit=0.05) == 0
+    assert get_embedded_lyrics(path) == (None, None)
+
+class FlakyProvider(SlowProvider):
+    """Fails every track's first fetch the way providers do: by returning None."""
+
+    def __init__(self):
+        self.attempts = {}
+
+    def get_track_info(self, url, track_number):
+        self.attempts[url] = self.attempts.get(url, 0) + 1
+        return super().get_track_info(url, track_number) if self.attempts[url] > 1 else None
+
+def test_failed_fetches_are_retried(tmp_path):
+    queue = SQLiteQueue(str(tmp_path / 'queue.db'), retry_delay=0.01)
+    paths = [str(make_mp3(tmp_path / f'{n}.mp3', n)) for n in (1, 2)]
+    provider = FlakyProvider()
+    worker = Worker(queue, 'worker', poll_interval=0.01, provider_for=lambda url, name: provider)
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    try:
+        result = Coordinator(queue, poll_interval=0.01).run('https://genius.com/albums/x', paths)
+    finally:
+        worker.stop()
+        thread.join()
+    assert (result.fetched, result.embedded) == (2, 2)
+    assert provider.attempts == {'https://genius.com/albums/x/1': 2, 'https://genius.com/albums/x/2': 2}
+
+def run_album(tmp_path, workers):
+    queue = SQLiteQueue(str(tmp_path / f'queue-{workers}.db'))
+    paths = [str(make_mp3(tmp_path / f'{workers}-{n}.mp3', n)) for n in range(1, 9)]
+    pool = [Worker(queue, f'worker-{i}', poll_interval=0.01, provider_for=lambda url, name: SlowProvider())
+            for i in range(workers)]
+    threads = [threading.Thread(target=worker.run) for worker in pool]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    try:
+        result = Coordinator(queue, poll_interval=0.01).run('https://genius.com/albums/x', paths)
+    finally:
+        for worker in pool:
+            worker.stop()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+    assert result.embedded == 8
+    assert get_embedded_lyrics(paths[0]) == ('Lyrics of https://genius.com/albums/x/1', 'https://genius.com/albums/x/1')
+    return elapsed
+
+def test_album_throughput_grows_with_workers(tmp_path):
+    one = run_album(tmp_path, 1)
+    four = run_album(tmp_path, 4)
+    # Eight 100 ms fetches: about 0.8 s with one worker, 0.2 s with four
+    assert four < one / 2
@@ -0,0 +1,20 @@
+from pathlib import Path
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from jobs import JobFiles
+
+def test_attached_files_are_kept_per_job():
+    job_files = JobFiles()
+    job_files.add('a', 2, {'filename': '02.mp3'})
+    job_files.add('a', None, {'filename': 'cover.mp3', 'error': 'No track number found in metadata'})
+    job_files.add('b', 1, {'filename': '01.mp3'})
+
+    tracks, errors = job_files.get('a')
+    assert tracks == {2: {'filename': '02.mp3'}}
+    assert [e['filename'] for e in errors] == ['cover.mp3']
+
+    job_files.discard('a')
+    assert not job_files.has('a')
+    assert job_files.has('b')
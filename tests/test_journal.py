@@ -0,0 +1,82 @@
+from pathlib import Path
+import os
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+import batch
+import pipeline
+from batch import BatchItem, BatchRunner
+from journal import Journal
+from pipeline import AlbumPipeline, scan_files
+from providers.base_provider import TrackInfo
+from tests.helpers import make_mp3
+
+class CountingProvider:
+    name = 'counting'
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_track_info_without_lyrics_list_from_album(self, url):
+        self.calls += 1
+        return [TrackInfo(title=f'Song {n}', artist='Artist', track_number=n, url=f'{url}/{n}') for n in (1, 2)]
+
+    def get_track_info(self, url, track_number):
+        self.calls += 1
+        return TrackInfo(title=f'Song {track_number}', artist='Artist', track_number=track_number, url=url,
+                         lyrics=f'Lyrics of {url}')
+
+def run(paths, journal_path, resume, monkeypatch):
+    provider = CountingProvider()
+    reads, writes = [], []
+    monkeypatch.setattr(pipeline, 'get_track_number', lambda path: reads.append(path) or int(Path(path).stem))
+    monkeypatch.setattr(pipeline, 'add_lyrics_to_audio', lambda path, lyrics, source_url=None: writes.append(path) or
+                        os.utime(path, ns=(1, os.stat(path).st_mtime_ns + 1000)) or True)
+    with Journal(journal_path, resume=resume) as journal:
+        tracks, _ = scan_files(paths, journal)
+        result = AlbumPipeline(provider, journal=journal).run('https://genius.com/albums/x', tracks)
+    assert result.embedded == 2
+    return provider.calls, len(reads), len(writes)
+
+def test_resume_skips_finished_and_verified_steps(tmp_path, monkeypatch):
+    paths = [str(make_mp3(tmp_path / f'{n}.mp3', n)) for n in (1, 2)]
+    journal_path = str(tmp_path / 'journal.jsonl')
+
+    assert run(paths, journal_path, False, monkeypatch) == (3, 2, 2)
+    # Interrupted while writing the last record
+    with open(journal_path, 'a') as f:
+        f.write('{"type": "embed", "pa')
+    assert run(paths, journal_path, True, monkeypatch) == (0, 0, 0)
+
+    # A file changed since: its tags are read and its lyrics written again
+    os.utime(paths[1], ns=(1, 1))
+    assert run(paths, journal_path, True, monkeypatch) == (0, 1, 1)
+    assert run(paths, journal_path, True, monkeypatch) == (0, 0, 0)
+    # Without --resume the journal starts over
+    assert run(paths, journal_path, False, monkeypatch) == (3, 2, 2)
+
+class CompilationProvider:
+    """The same song at position 1 of the album and at position 2 of the compilation."""
+    name = 'compilation'
+
+    def get_track_info_without_lyrics_list_from_album(self, url):
+        number = 2 if url.endswith('compilation') else 1
+        return [TrackInfo(title='Song', artist='Artist', track_number=number, url='https://genius.com/Song-lyrics')]
+
+    def get_track_info(self, url, track_number):
+        return TrackInfo(title='Song', artist='Artist', track_number=track_number, url=url, lyrics='la la')
+
+def test_a_song_on_two_albums_keeps_each_albums_track_number(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch.ProviderFactory, 'get_provider_for_url', lambda url: CompilationProvider())
+    album = make_mp3(tmp_path / 'album.mp3', 1)
+    compilation = make_mp3(tmp_path / 'compilation.mp3', 2)
+
+    with Journal(str(tmp_path / 'journal.jsonl')) as journal:
+        report = BatchRunner(album_concurrency=1, journal=journal).run([
+            BatchItem('https://genius.com/albums/album', [str(album)]),
+            BatchItem('https://genius.com/albums/compilation', [str(compilation)]),
+        ])
+
+    assert [[(t['track_number'], t['status']) for t in a['tracks']] for a in report['albums']] == [
+        [(1, 'embedded')], [(2, 'embedded')]]
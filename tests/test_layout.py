@@ -0,0 +1,29 @@
+from pathlib import Path
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from benchmarks.fixtures import synthetic_musixmatch
+from providers.layout import VariantDetector
+from providers.musixmatch_provider import LYRICS_VARIANTS, parse_lyrics_variant
+
+def test_recently_matched_variants_are_probed_first():
+    fixtures = synthetic_musixmatch(tracks=6, padding_kib=1)
+    sections = fixtures.pages['/musixmatch/lyrics/Bench-Artist/Song-3']
+    plain = fixtures.pages['/musixmatch/lyrics/Bench-Artist/Song-1']
+    detector = VariantDetector('test', 'lyrics', LYRICS_VARIANTS, window=3)
+    assert [variant.name for variant in detector.ranked()] == ['sections', 'plain']
+
+    # Each layout only matches its own probe, whatever the order
+    lyrics, variant, probes = parse_lyrics_variant(plain, detector.ranked())
+    assert (variant, probes) == ('plain', 2) and lyrics
+    detector.record(variant, probes)
+    assert [variant.name for variant in detector.ranked()] == ['plain', 'sections']
+    assert parse_lyrics_variant(plain, detector.ranked())[1:] == ('plain', 1)
+    lyrics, variant, probes = parse_lyrics_variant(sections, detector.ranked())
+    assert (variant, probes) == ('sections', 2) and lyrics.startswith('[Verse 1]')
+
+    # The window forgets old pages, so a layout change takes over
+    for _ in range(2):
+        detector.record('sections', 1)
+    assert [variant.name for variant in detector.ranked()] == ['sections', 'plain']
@@ -0,0 +1,20 @@
+from pathlib import Path
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from benchmarks.load_test import histogram_buckets, histogram_quantile
+from metrics import Histogram, Registry
+
+def test_quantiles_cover_only_observations_between_scrapes():
+    registry = Registry()
+    histogram = Histogram('lag_seconds', 'Lag.', registry=registry, buckets=(0.01, 0.1, 1.0))
+    for _ in range(10):
+        histogram.observe(0.5)
+    before = histogram_buckets(registry.render(), 'lag_seconds')
+    for value in [0.005] * 9 + [0.05]:
+        histogram.observe(value)
+    after = histogram_buckets(registry.render(), 'lag_seconds')
+    assert histogram_quantile(before, after, 0.5) == 0.01
+    assert histogram_quantile(before, after, 0.95) == 0.1
+    assert histogram_quantile(after, after, 0.5) is None
@@ -0,0 +1,59 @@
+from pathlib import Path
+import json
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from corpus_index import build_index, CorpusIndex
+from providers.factory import ProviderFactory
+from providers.local_provider import LocalProvider
+
+def make_corpus(folder):
+    folder.mkdir()
+    with open(folder / 'dump.jsonl', 'w', encoding='utf-8') as f:
+        for number, title in [(3, 'Digital Love'), (1, 'One More Time'), (2, 'Aerodynamic')]:
+            f.write(json.dumps({'artist': 'Daft Punk', 'album': 'Discovery', 'title': title,
+                                'track_number': number, 'lyrics': f'{title} lyrics'}) + '\n')
+        f.write('not json\n')
+        f.write(json.dumps({'artist': 'Björk', 'album': 'Debut', 'title': 'Human Behaviour',
+                            'track_number': 1, 'lyrics': 'If you ever get close'}) + '\n')
+        for number, title in [(1, 'Группа крови'), (2, 'Кукушка'), (3, 'Звезда')]:
+            f.write(json.dumps({'artist': 'Кино', 'album': 'Группа крови', 'title': title,
+                                'track_number': number, 'lyrics': f'{title} lyrics'}, ensure_ascii=False) + '\n')
+    (folder / '04 Harder Better Faster Stronger.lrc').write_text(
+        '[ar:Daft Punk]\n[al:Discovery]\n[ti:Harder, Better, Faster, Stronger]\n'
+        '[00:01.00]Work it harder\n[00:02.50]Make it better\n', encoding='utf-8')
+
+def test_index_lookups_match_the_corpus(tmp_path):
+    make_corpus(tmp_path / 'corpus')
+    # A run size of 2 forces several spilled runs to be merged
+    assert build_index(str(tmp_path / 'corpus'), str(tmp_path / 'corpus.idx'), run_size=2) == 8
+    index = CorpusIndex(str(tmp_path / 'corpus.idx'))
+    album = index.album('DAFT PUNK', 'discovery')
+    assert [(entry.track_number, entry.title) for entry in album] == [
+        (1, 'One More Time'), (2, 'Aerodynamic'), (3, 'Digital Love'), (4, 'Harder, Better, Faster, Stronger')]
+    assert index.record(index.find('bjork', 'Debut', 'human behaviour'))['lyrics'] == 'If you ever get close'
+    assert index.find('Daft Punk', 'Discovery', 'Missing') is None
+    # Non-Latin names keep their letters, so tracks of one album do not collide
+    assert [entry.title for entry in index.album('КИНО', 'группа крови')] == ['Группа крови', 'Кукушка', 'Звезда']
+    assert index.record(index.find('Кино', 'Группа крови', 'Звезда'))['lyrics'] == 'Звезда lyrics'
+    index.close()
+
+def test_local_urls_are_served_from_the_index(tmp_path, monkeypatch):
+    make_corpus(tmp_path / 'corpus')
+    build_index(str(tmp_path / 'corpus'), str(tmp_path / 'corpus.idx'))
+    monkeypatch.setenv('LYRICS_LOCAL_INDEX', str(tmp_path / 'corpus.idx'))
+    provider = ProviderFactory.get_provider_for_url('local://Daft%20Punk/Discovery')
+    assert isinstance(provider, LocalProvider)
+    tracks = provider.get_track_info_without_lyrics_list_from_album('local://Daft%20Punk/Discovery')
+    assert [track.track_number for track in tracks] == [1, 2, 3, 4]
+    info = provider.get_track_info(tracks[3].url, 4)
+    assert info.lyrics == 'Work it harder\nMake it better'
+
+    # A rebuilt index is picked up without a restart
+    with open(tmp_path / 'corpus' / 'more.jsonl', 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'artist': 'Daft Punk', 'album': 'Discovery', 'title': 'Crescendolls',
+                            'track_number': 5, 'lyrics': 'Crescendolls'}) + '\n')
+    build_index(str(tmp_path / 'corpus'), str(tmp_path / 'corpus.idx'))
+    tracks = provider.get_track_info_without_lyrics_list_from_album('local://Daft%20Punk/Discovery')
+    assert [track.track_number for track in tracks] == [1, 2, 3, 4, 5]
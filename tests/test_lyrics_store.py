@@ -0,0 +1,62 @@
+from pathlib import Path
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+import web_lyrics_embedder as web
+from benchmarks.fixtures import synthetic_genius
+from benchmarks.stub_server import StubServer
+from lyrics_store import LyricsStore
+from providers.genius_provider import GeniusProvider
+
+def test_one_load_serves_every_equivalent_url():
+    store = LyricsStore()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return {'title': 'Song', 'lyrics': 'la la'}
+
+    first = store.get_or_load('lyrics', 'https://genius.com/Song-lyrics', loader)
+    second = store.get_or_load('lyrics', 'https://GENIUS.com/Song-lyrics/?utm=x', loader)
+
+    assert len(loads) == 1
+    assert second is first
+    assert first.etag and first.max_age > 0
+
+def test_failed_loads_are_not_stored_and_results_expire():
+    store = LyricsStore(ttl=0)
+    assert store.get_or_load('lyrics', 'https://genius.com/a', lambda: None) is None
+    store.put('lyrics', 'https://genius.com/a', {'lyrics': 'x'})
+    assert store.get('lyrics', 'https://genius.com/a') is None
+
+def test_least_recently_used_results_are_dropped():
+    store = LyricsStore(max_entries=2)
+    store.put('album', 'https://genius.com/a', {'n': 1})
+    store.put('album', 'https://genius.com/b', {'n': 2})
+    store.get('album', 'https://genius.com/a')
+    store.put('album', 'https://genius.com/c', {'n': 3})
+    assert store.get('album', 'https://genius.com/b') is None
+    assert store.get('album', 'https://genius.com/a').value == {'n': 1}
+
+def test_lyrics_api_answers_a_matching_etag_with_not_modified(monkeypatch):
+    fixtures = synthetic_genius(tracks=1, padding_kib=1)
+    monkeypatch.setattr(web, 'lyrics_store', LyricsStore())
+    monkeypatch.setattr(GeniusProvider, 'DOMAINS', GeniusProvider.DOMAINS + ['127.0.0.1'])
+    client = web.app.test_client()
+    with StubServer(fixtures.pages) as server:
+        url = server.url(fixtures.track_paths[0])
+        response = client.get('/api/lyrics', query_string={'url': url})
+        etag = response.headers['ETag']
+        assert response.status_code == 200 and etag and response.get_json()['lyrics']
+
+        again = client.get('/api/lyrics', query_string={'url': url}, headers={'If-None-Match': etag})
+        assert again.status_code == 304 and not again.data
+        assert again.headers['ETag'] == etag
+        assert server.requests == 1
+
+def test_lyrics_api_only_fetches_from_provider_hosts():
+    client = web.app.test_client()
+    for url in ('http://127.0.0.1:1/internal?source=genius.com', 'https://genius.com.example.net/Song-lyrics'):
+        response = client.get('/api/lyrics', query_string={'url': url})
+        assert response.status_code == 400 and 'Unsupported URL' in response.get_json()['error']
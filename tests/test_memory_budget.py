@@ -0,0 +1,50 @@
+from contextlib import ExitStack
+from pathlib import Path
+import os
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+import web_lyrics_embedder as web
+from benchmarks.audio_corpus import generate
+from benchmarks.fixtures import synthetic_genius
+from benchmarks.stub_server import StubServer
+from providers.genius_provider import GeniusProvider
+from tracing import memory_by_stage
+from workspace import Workspace
+
+# Peak traced memory (KiB) for the reference album: 4 tracks of 2 MiB and
+# ~200 KiB pages. About twice what a run takes today; lower them as it improves.
+JOB_BUDGET_KIB = 40 * 1024
+STAGE_BUDGETS_KIB = {
+    'upload': 2 * 1024,
+    'save': 256,
+    'read_track_number': 256,
+    'album': 8 * 1024,
+    'parse': 8 * 1024,
+    'embed': 256,
+}
+
+def test_reference_album_stays_within_memory_budget(tmp_path, monkeypatch):
+    fixtures = synthetic_genius(tracks=4, padding_kib=200)
+    files = generate(str(tmp_path), 2 * 1024 * 1024, 4, ['mp3-id3v24-padded'])['mp3-id3v24-padded']
+    traces = []
+    monkeypatch.setitem(web.app.config, 'TRACE_MEMORY', True)
+    monkeypatch.setitem(web.app.config, 'UPLOAD_FOLDER', str(tmp_path / 'media'))
+    monkeypatch.setattr(web, 'workspace', Workspace(str(tmp_path / 'media' / 'jobs'), quota_bytes=1 << 30, ttl=3600))
+    monkeypatch.setattr(GeniusProvider, 'DOMAINS', GeniusProvider.DOMAINS + ['127.0.0.1'])
+    monkeypatch.setattr(web, 'save_trace', lambda root, path: traces.append(root))
+
+    with StubServer(fixtures.pages) as stub, ExitStack() as stack:
+        response = web.app.test_client().post('/process', content_type='multipart/form-data', data={
+            'job_id': 'memory-budget',
+            'url': stub.url(fixtures.album_path),
+            'files': [(stack.enter_context(open(path, 'rb')), os.path.basename(path)) for path in files],
+        })
+    assert response.get_json()['success_count'] == 4
+
+    job = traces[0]
+    stages = memory_by_stage(job)
+    assert job.peak_bytes / 1024 < JOB_BUDGET_KIB
+    for name, budget in STAGE_BUDGETS_KIB.items():
+        assert stages[name]['peak_kib'] < budget, f'{name} peaked at {stages[name]["peak_kib"]} KiB'
@@ -0,0 +1,58 @@
+import pytest
+from pathlib import Path
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from message_announcer import MessageAnnouncer, is_valid_channel_id
+
+def test_events_are_scoped_to_their_channel():
+    """Listeners only receive events published to their own job channel."""
+    announcer = MessageAnnouncer()
+    listener_a = announcer.listen('job-a')
+    listener_b = announcer.listen('job-b')
+
+    announcer.announce({'n': 1}, 'track_update', channel_id='job-a')
+
+    event = listener_a.get(timeout=0)
+    assert event.data == {'n': 1}
+    assert listener_b.get(timeout=0) is None, "Other channels should not receive the event"
+
+def test_listener_buffer_is_bounded_and_coalesces():
+    """A slow listener keeps at most maxsize events and only the latest update per key."""
+    announcer = MessageAnnouncer(listener_queue_size=3)
+    listener = announcer.listen('job')
+
+    for progress in range(5):
+        announcer.announce({'progress': progress}, 'track_update', channel_id='job', coalesce_key=1)
+    assert len(listener) == 1
+    assert listener.get(timeout=0).data == {'progress': 4}
+
+    for n in range(5):
+        announcer.announce({'n': n}, 'tracks', channel_id='job')
+    assert len(listener) == 3
+    assert [listener.get(timeout=0).data['n'] for _ in range(3)] == [2, 3, 4]
+    assert listener.dropped == 6
+
+def test_reconnect_replays_from_last_event_id():
+    """Subscribing with a Last-Event-ID replays only the events that were missed."""
+    announcer = MessageAnnouncer()
+    published = [announcer.announce({'n': n}, 'tracks', channel_id='job') for n in range(4)]
+
+    listener = announcer.listen('job', last_event_id=published[1].id)
+
+    replayed = [listener.get(timeout=0).data['n'] for _ in range(2)]
+    assert replayed == [2, 3]
+    assert listener.get(timeout=0) is None
+
+def test_unlisten_removes_listener():
+    announcer = MessageAnnouncer()
+    listener = announcer.listen('job')
+    assert announcer.listener_count() == 1
+    announcer.unlisten(listener)
+    assert announcer.listener_count() == 0
+    assert listener.closed
+
+@pytest.mark.parametrize('channel_id,valid', [('abc-123_X', True), ('', False), ('../etc', False), ('a' * 65, False)])
+def test_channel_id_validation(channel_id, valid):
+    assert is_valid_channel_id(channel_id) == valid
@@ -0,0 +1,34 @@
+from pathlib import Path
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from metrics import Registry, Counter, Gauge, Histogram
+
+def test_prometheus_text_exposition():
+    registry = Registry()
+    responses = Counter('test_responses_total', 'Responses.', ['provider', 'status'], registry=registry)
+    latency = Histogram('test_fetch_seconds', 'Fetch latency.', ['provider'], registry=registry, buckets=(0.1, 1.0))
+    Gauge('test_listeners', 'Listeners.', registry=registry, callback=lambda: 3)
+
+    responses.inc(provider='genius', status='200')
+    responses.inc(provider='genius', status='200')
+    latency.observe(0.05, provider='genius')
+    latency.observe(0.5, provider='genius')
+
+    text = registry.render()
+    assert '# TYPE test_responses_total counter' in text
+    assert 'test_responses_total{provider="genius",status="200"} 2' in text
+    assert 'test_fetch_seconds_bucket{provider="genius",le="0.1"} 1' in text
+    assert 'test_fetch_seconds_bucket{provider="genius",le="1"} 2' in text
+    assert 'test_fetch_seconds_bucket{provider="genius",le="+Inf"} 2' in text
+    assert 'test_fetch_seconds_count{provider="genius"} 2' in text
+    assert 'test_listeners 3' in text
+
+def test_summary_lists_recorded_values():
+    registry = Registry()
+    latency = Histogram('test_parse_seconds', 'Parse latency.', ['provider'], registry=registry)
+    with latency.time(provider='musixmatch'):
+        pass
+    assert latency.count(provider='musixmatch') == 1
+    assert 'test_parse_seconds{provider="musixmatch"}: count=1' in registry.summary()
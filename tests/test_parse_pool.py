@@ -0,0 +1,28 @@
+from pathlib import Path
+import os
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+import parse_pool
+from benchmarks.fixtures import synthetic_genius
+from benchmarks.stub_server import StubServer
+from providers.genius_provider import GeniusProvider
+
+def scrape(provider, album_url):
+    tracks = provider.get_track_info_without_lyrics_list_from_album(album_url)
+    return tracks, [provider.get_track_info(track.url, track.track_number) for track in tracks]
+
+def test_pages_parse_the_same_in_worker_processes():
+    fixtures = synthetic_genius(tracks=3, padding_kib=4)
+    with StubServer(fixtures.pages) as server:
+        album_url = server.url(fixtures.album_path)
+        inline = scrape(GeniusProvider(), album_url)
+        parse_pool.configure(2)
+        try:
+            assert parse_pool.parse(os.getpid) != os.getpid()
+            assert scrape(GeniusProvider(), album_url) == inline
+        finally:
+            parse_pool.shutdown()
+    assert parse_pool.parse(os.getpid) == os.getpid()
+    assert all(info.lyrics for info in inline[1])
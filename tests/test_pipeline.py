@@ -0,0 +1,44 @@
+from pathlib import Path
+import sys
+import time
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+import pipeline
+from pipeline import AlbumPipeline, scan_files
+from providers.base_provider import TrackInfo
+from tests.helpers import make_mp3
+
+class SlowProvider:
+    name = 'slow'
+
+    def get_track_info_without_lyrics_list_from_album(self, url):
+        return [TrackInfo(title=f'Song {n}', artist='Artist', track_number=n, url=f'{url}/{n}') for n in range(1, 6)]
+
+    def get_track_info(self, url, track_number):
+        time.sleep(0.1)
+        lyrics = '' if track_number == 5 else f'Lyrics of {url}'
+        return TrackInfo(title=f'Song {track_number}', artist='Artist', track_number=track_number, url=url, lyrics=lyrics)
+
+def test_tracks_are_embedded_while_the_next_one_is_fetched(tmp_path, monkeypatch):
+    paths = [str(make_mp3(tmp_path / f'0{n}.mp3', n)) for n in (1, 2, 3, 4, 5)]
+    tracks, errors = scan_files(paths + [str(make_mp3(tmp_path / 'cover.mp3', ''))])
+    assert list(tracks) == [1, 2, 3, 4, 5] and [e['filename'] for e in errors] == ['cover.mp3']
+
+    def slow_embed(path, lyrics, source_url=None):
+        time.sleep(0.1)
+        return True
+    monkeypatch.setattr(pipeline, 'add_lyrics_to_audio', slow_embed)
+    events = []
+
+    start = time.perf_counter()
+    result = AlbumPipeline(SlowProvider(), on_event=lambda name, data: events.append((name, data))).run(
+        'https://genius.com/albums/x', tracks)
+    elapsed = time.perf_counter() - start
+
+    assert (result.album_tracks, len(result.matched), result.fetched, result.embedded) == (5, 5, 4, 4)
+    # Five fetches and four embeds of 0.1s each take 0.9s one after the other
+    assert elapsed < 0.75
+    assert events[0][0] == 'matched'
+    assert [name for name, _ in events[1:]] == ['fetched', 'embedded'] * 4 + ['fetched']
+    assert events[-1][1]['error'] == 'No lyric found for track 5'
@@ -0,0 +1,51 @@
+from pathlib import Path
+import sys
+import threading
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from prefetch import Prefetcher
+from providers.base_provider import LyricsProvider, TrackInfo
+
+class CountingProvider(LyricsProvider):
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    @classmethod
+    def can_handle(cls, url):
+        return True
+
+    def get_lyrics(self, track_url):
+        return None
+
+    def get_track_info_without_lyrics_list_from_album(self, album_url):
+        self.calls.append(album_url)
+        return [TrackInfo(f'Song {n}', 'Artist', n, f'https://example.com/song-{n}') for n in (1, 2)]
+
+    def get_track_info(self, track_url, track_number):
+        self.calls.append(track_url)
+        # The second page is still loading when the job asks for it
+        if track_url.endswith('2'):
+            self.release.wait(5)
+        return TrackInfo('Song', 'Artist', track_number, track_url, f'lyrics of {track_url}')
+
+def test_jobs_use_the_album_prefetched_during_upload():
+    provider = CountingProvider()
+    prefetcher = Prefetcher(workers=2)
+    prefetcher.register('job', provider, 'https://example.com/album')
+    job_provider = prefetcher.provider_for('job', provider, 'https://example.com/album/')
+
+    assert [t.track_number for t in job_provider.get_track_info_without_lyrics_list_from_album(
+        'https://example.com/album')] == [1, 2]
+    assert job_provider.get_track_info('https://example.com/song-1', 7).track_number == 7
+    provider.release.set()
+    assert job_provider.get_track_info('https://example.com/song-2', 2).lyrics == 'lyrics of https://example.com/song-2'
+    # Every page was fetched once, by the prefetch
+    assert sorted(provider.calls) == ['https://example.com/album', 'https://example.com/song-1',
+                                      'https://example.com/song-2']
+
+    # Another album, or a job that did not register, gets the provider itself
+    assert prefetcher.provider_for('job', provider, 'https://example.com/other') is provider
+    prefetcher.discard('job')
+    assert prefetcher.provider_for('job', provider, 'https://example.com/album') is provider
@@ -0,0 +1,30 @@
+from pathlib import Path
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from benchmarks.fixtures import synthetic_genius, synthetic_musixmatch
+from benchmarks.provider_benchmark import compare
+from benchmarks.stub_server import StubServer
+from providers.genius_provider import GeniusProvider
+from providers.musixmatch_provider import MusixmatchProvider
+
+def test_providers_parse_pages_from_the_stub_server():
+    genius = synthetic_genius(tracks=2, padding_kib=4)
+    musixmatch = synthetic_musixmatch(tracks=3, padding_kib=4)
+    with StubServer({**genius.pages, **musixmatch.pages}) as server:
+        for provider, fixtures in ((GeniusProvider(), genius),
+                                   (MusixmatchProvider(base_url=server.origin + '/musixmatch'), musixmatch)):
+            tracks = provider.get_track_info_without_lyrics_list_from_album(server.url(fixtures.album_path))
+            assert [track.track_number for track in tracks] == list(range(1, len(fixtures.track_paths) + 1))
+            for track in tracks:
+                info = provider.get_track_info(track.url, track.track_number)
+                assert info.title == f'Song {track.track_number}'
+                assert info.artist == 'Bench Artist'
+                assert info.lyrics
+        assert '[Verse 1]' in MusixmatchProvider(base_url=server.origin + '/musixmatch').get_lyrics(tracks[2].url)
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = {'results': {'genius.parse.album': {'median_ms': 10.0, 'p95_ms': 12.0, 'peak_kib': 100.0}}}
+    current = {'results': {'genius.parse.album': {'median_ms': 11.0, 'p95_ms': 20.0, 'peak_kib': 100.0}}}
+    assert compare(current, baseline, tolerance=0.25) == ['genius.parse.album.p95_ms: 12.0 -> 20.0']
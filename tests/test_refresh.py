@@ -0,0 +1,47 @@
+from pathlib import Path
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from benchmarks.fixtures import synthetic_genius
+from benchmarks.stub_server import StubServer
+from lyrics_embedder import add_lyrics_to_audio
+from providers.genius_provider import GeniusProvider
+from refresh import Refresher
+from utilities import get_embedded_lyrics
+from tests.helpers import make_mp3
+
+DAY = 24 * 60 * 60
+
+def test_only_changed_lyrics_are_written_again(tmp_path, monkeypatch):
+    fixtures = synthetic_genius(tracks=2, padding_kib=1)
+    now = [1000.0]
+    # The stub stands in for Genius
+    monkeypatch.setattr(GeniusProvider, 'DOMAINS', GeniusProvider.DOMAINS + ['127.0.0.1'])
+    with StubServer(fixtures.pages) as stub:
+        urls = [stub.url(path) for path in fixtures.track_paths]
+        paths = [str(make_mp3(tmp_path / f'0{n}.mp3', n)) for n in (1, 2)]
+        for path, url in zip(paths, urls):
+            assert add_lyrics_to_audio(path, 'Old lyrics', source_url=url)
+        assert get_embedded_lyrics(paths[0]) == ('Old lyrics', urls[0])
+
+        def refresh(**options):
+            refresher = Refresher(str(tmp_path / 'state.json'), interval=DAY, clock=lambda: now[0], **options)
+            return refresher.run(paths)['summary']
+
+        assert refresh() == {'updated': 2}
+        assert get_embedded_lyrics(paths[0])[0] not in (None, 'Old lyrics')
+        # Checked less than a day ago
+        assert refresh() == {'fresh': 2}
+
+        now[0] += DAY
+        requests = stub.requests
+        assert refresh() == {'not_modified': 2}
+        assert stub.requests == requests + 2
+
+        now[0] += DAY
+        page = fixtures.pages[fixtures.track_paths[1]]
+        stub.add_page(fixtures.track_paths[1], page.replace('<br/>', ' changed<br/>', 1))
+        assert refresh(domain_budget=1) == {'not_modified': 1, 'deferred': 1}
+        assert refresh(domain_budget=1) == {'fresh': 1, 'updated': 1}
+        assert ' changed' in get_embedded_lyrics(paths[1])[0]
@@ -0,0 +1,93 @@
+from pathlib import Path
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from metrics import COALESCED_CALLS
+from providers.base_provider import LyricsProvider, TrackInfo
+from providers.http import DeadlineExceeded, deadline
+from providers.singleflight import SingleFlight, coalesced, with_track_number
+
+class SlowProvider(LyricsProvider):
+    def __init__(self):
+        self.fetches = 0
+
+    @classmethod
+    def can_handle(cls, url):
+        return True
+
+    def get_lyrics(self, track_url):
+        return None
+
+    def get_track_info_without_lyrics_list_from_album(self, album_url):
+        return []
+
+    @coalesced('track', adapt=with_track_number)
+    def get_track_info(self, track_url, track_number):
+        self.fetches += 1
+        time.sleep(0.2)
+        return TrackInfo(title='Song', artist='Artist', track_number=track_number, url=track_url, lyrics='la')
+
+def test_concurrent_identical_fetches_share_one_call():
+    provider = SlowProvider()
+    before = COALESCED_CALLS.value(provider='slow', call='track')
+    urls = ['https://genius.com/Song-lyrics', 'https://genius.com/Song-lyrics/', 'https://GENIUS.com/Song-lyrics']
+
+    with ThreadPoolExecutor(3) as pool:
+        results = list(pool.map(provider.get_track_info, urls, [1, 7, 12]))
+
+    assert provider.fetches == 1
+    assert [info.track_number for info in results] == [1, 7, 12]
+    assert COALESCED_CALLS.value(provider='slow', call='track') - before == 2
+
+def test_waiters_of_a_failed_or_empty_call_run_their_own():
+    flights = SingleFlight()
+    started = threading.Event()
+
+    def lead(outcome):
+        started.set()
+        time.sleep(0.1)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def follow():
+        started.wait()
+        return flights.do('key', lambda: 'own')
+
+    for outcome in (ValueError('boom'), None, []):
+        started.clear()
+        with ThreadPoolExecutor(2) as pool:
+            leader = pool.submit(flights.do, 'key', lambda: lead(outcome))
+            follower = pool.submit(follow)
+            assert follower.result() == ('own', False)
+            if isinstance(outcome, Exception):
+                assert leader.exception() is outcome
+            else:
+                assert leader.result() == (outcome, False)
+
+def test_waiters_stop_at_their_own_deadline():
+    flights = SingleFlight()
+    started = threading.Event()
+
+    def lead():
+        started.set()
+        time.sleep(1)
+        return 'slow'
+
+    def follow():
+        started.wait()
+        start = time.perf_counter()
+        with deadline(0.2):
+            try:
+                flights.do('key', lambda: 'own')
+            except DeadlineExceeded:
+                return time.perf_counter() - start
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flights.do, 'key', lead)
+        assert pool.submit(follow).result() < 0.5
+        assert leader.result() == ('slow', False)
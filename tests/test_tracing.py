@@ -0,0 +1,77 @@
+from pathlib import Path
+import json
+import sys
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from tracing import span, trace, save_trace, profiled, memory_by_stage
+
+def test_spans_nest_under_a_trace(tmp_path):
+    with trace('job', job_id='abc') as job:
+        with span('track', track_number=1):
+            with span('fetch'):
+                pass
+            with span('embed'):
+                pass
+    assert job.duration is not None
+    track = job.children[0]
+    assert (track.name, track.attrs) == ('track', {'track_number': 1})
+    assert [child.name for child in track.children] == ['fetch', 'embed']
+
+    save_trace(job, str(tmp_path / 'trace.json'))
+    saved = json.loads((tmp_path / 'trace.json').read_text())
+    assert saved['job_id'] == 'abc'
+    assert saved['children'][0]['children'][0]['name'] == 'fetch'
+
+def test_spans_are_disabled_outside_a_trace():
+    with span('fetch') as current:
+        assert current is None
+
+def test_profile_is_saved_only_when_enabled(tmp_path):
+    with profiled(str(tmp_path / 'off.prof'), enabled=False):
+        sum(range(100))
+    with profiled(str(tmp_path / 'on.prof')):
+        sum(range(100))
+    assert not (tmp_path / 'off.prof').exists()
+    assert (tmp_path / 'on.prof').exists()
+    assert (tmp_path / 'on.prof.txt').exists()
+
+def test_memory_is_recorded_per_span_when_requested():
+    with trace('job', memory=True) as job:
+        with span('parse') as parse:
+            buffer = bytearray(2 * 1024 * 1024)
+            del buffer
+        with span('embed') as embed:
+            kept = bytearray(256 * 1024)
+    assert parse.peak_bytes >= 2 * 1024 * 1024 > parse.retained_bytes
+    assert embed.retained_bytes >= 256 * 1024
+    # The parent's peak survives the reset done for the second child
+    assert job.peak_bytes >= parse.peak_bytes
+    assert set(memory_by_stage(job)) == {'parse', 'embed'}
+    assert kept
+
+def test_memory_traced_jobs_run_one_at_a_time():
+    first_started = threading.Event()
+
+    def job(name, size):
+        with trace(name, memory=True) as root:
+            first_started.set()
+            with span('parse') as parse:
+                buffer = bytearray(size)
+                threading.Event().wait(0.1)
+                del buffer
+        return root, parse
+
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(job, 'first', 2 * 1024 * 1024)
+        first_started.wait()
+        second = pool.submit(job, 'second', 256 * 1024)
+        (first_job, first_parse), (second_job, second_parse) = first.result(), second.result()
+    # Neither job stopped tracemalloc under the other or reset its peak
+    assert first_parse.peak_bytes >= 2 * 1024 * 1024
+    assert 256 * 1024 <= second_parse.peak_bytes < 2 * 1024 * 1024
+    assert second_job.start >= first_job.start + first_job.duration
+    assert not tracemalloc.is_tracing()
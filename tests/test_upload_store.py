@@ -0,0 +1,41 @@
+import hashlib
+import io
+import pytest
+from pathlib import Path
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from upload_store import UploadStore, UploadError
+
+CONTENT = bytes(range(256)) * 40
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+def test_chunked_upload_resumes_from_last_offset(tmp_path):
+    """An interrupted upload continues from the bytes the server already holds."""
+    store = UploadStore(str(tmp_path))
+    assert store.status(SHA256)['status'] == 'missing'
+
+    result = store.write_chunk(SHA256, len(CONTENT), 0, io.BytesIO(CONTENT[:4000]))
+    assert result == {'sha256': SHA256, 'offset': 4000, 'complete': False}
+    assert store.status(SHA256) == {'sha256': SHA256, 'status': 'partial', 'offset': 4000}
+
+    # Replaying an already acknowledged chunk is refused with the current offset
+    with pytest.raises(UploadError) as error:
+        store.write_chunk(SHA256, len(CONTENT), 0, io.BytesIO(CONTENT[:4000]))
+    assert error.value.offset == 4000
+
+    result = store.write_chunk(SHA256, len(CONTENT), 4000, io.BytesIO(CONTENT[4000:]))
+    assert result['complete']
+    assert store.status(SHA256)['status'] == 'present'
+
+    dest = tmp_path / 'track.mp3'
+    assert store.materialize(SHA256, str(dest)) == str(dest)
+    assert dest.read_bytes() == CONTENT
+
+def test_content_not_matching_hash_is_rejected(tmp_path):
+    store = UploadStore(str(tmp_path))
+    with pytest.raises(UploadError):
+        store.write_chunk(SHA256, len(CONTENT), 0, io.BytesIO(b'x' * len(CONTENT)))
+    assert store.status(SHA256)['status'] == 'missing'
+    assert store.materialize(SHA256, str(tmp_path / 'track.mp3')) is None
@@ -0,0 +1,96 @@
+import os
+import time
+import pytest
+from pathlib import Path
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+import web_lyrics_embedder as web
+from workspace import Workspace, WorkspaceQuotaExceeded
+
+def _add_job(workspace, job_id, size):
+    job_dir = workspace.job_dir(job_id)
+    Path(job_dir, 'track.mp3').write_bytes(b'x' * size)
+    workspace.finish_job(job_id)
+    return job_dir
+
+def test_least_recently_used_finished_jobs_are_evicted_first(tmp_path):
+    workspace = Workspace(str(tmp_path), quota_bytes=3000, ttl=3600)
+    old_job = _add_job(workspace, 'old', 1000)
+    time.sleep(0.01)
+    recent_job = _add_job(workspace, 'recent', 1000)
+    time.sleep(0.01)
+    workspace.touch(old_job)
+
+    workspace.reserve(1500)
+
+    assert os.path.exists(old_job), "Recently touched job should be kept"
+    assert not os.path.exists(recent_job), "Least recently used job should be evicted"
+    stats = workspace.stats()
+    assert stats['evictions'] == 1
+    assert stats['used_bytes'] == 1000
+    assert stats['reserved_bytes'] == 1500
+
+def test_running_jobs_are_never_evicted(tmp_path):
+    workspace = Workspace(str(tmp_path), quota_bytes=1500, ttl=3600)
+    running_job = workspace.job_dir('running')
+    Path(running_job, 'track.mp3').write_bytes(b'x' * 1000)
+    workspace.track(running_job)
+
+    with pytest.raises(WorkspaceQuotaExceeded):
+        workspace.reserve(1000)
+    assert os.path.exists(running_job)
+
+def test_unused_entries_expire_after_ttl(tmp_path):
+    workspace = Workspace(str(tmp_path), quota_bytes=10000, ttl=0)
+    finished_job = _add_job(workspace, 'finished', 100)
+    running_job = workspace.job_dir('running')
+    time.sleep(0.01)
+
+    assert workspace.expire() == 1
+    assert not os.path.exists(finished_job)
+    assert os.path.exists(running_job)
+    assert workspace.stats()['expirations'] == 1
+
+def test_scan_accounts_for_existing_files(tmp_path):
+    Path(tmp_path, 'job').mkdir()
+    Path(tmp_path, 'job', 'track.mp3').write_bytes(b'x' * 300)
+    Path(tmp_path, '.store', 'objects').mkdir(parents=True)
+    Path(tmp_path, '.store', 'objects', 'abc').write_bytes(b'x' * 200)
+
+    workspace = Workspace(str(tmp_path), quota_bytes=10000, ttl=3600, nested=[os.path.join('.store', 'objects')])
+
+    assert workspace.used_bytes == 500
+    assert workspace.stats()['entries'] == 2
+
+def test_files_next_to_the_workspace_are_never_expired(tmp_path):
+    # The web app's layout: job folders and the upload store inside the media folder
+    library = [Path(tmp_path, 'song.mp3'), Path(tmp_path, 'journal.jsonl'), Path(tmp_path, 'corpus.idx')]
+    for path in library:
+        path.write_bytes(b'x' * 100)
+        os.utime(path, (0, 0))
+    Path(tmp_path, '.store', 'objects').mkdir(parents=True)
+    Path(tmp_path, '.store', 'objects', 'abc').write_bytes(b'x' * 200)
+    workspace = Workspace(str(tmp_path / 'jobs'), quota_bytes=10000, ttl=0,
+                          nested=[str(tmp_path / '.store' / 'objects')])
+    finished_job = _add_job(workspace, 'finished', 100)
+    time.sleep(0.01)
+
+    assert workspace.used_bytes == 300
+    assert workspace.expire() == 2
+    assert not os.path.exists(finished_job)
+    assert all(path.exists() for path in library)
+
+def test_jobs_need_their_own_id_and_download_once_finished(tmp_path, monkeypatch):
+    monkeypatch.setattr(web, 'workspace', Workspace(str(tmp_path), quota_bytes=10000, ttl=3600))
+    client = web.app.test_client()
+    assert client.post('/process', data={'url': 'https://genius.com/albums/x'}).get_json()['error'] == \
+        'No job id provided'
+    assert client.post('/batch', json={'albums': [{'url': 'https://genius.com/albums/x'}]}).status_code == 400
+
+    Path(web.workspace.job_dir('running'), 'track.mp3').write_bytes(b'x' * 100)
+    assert client.get('/download/running').status_code == 409
+    web.workspace.finish_job('running')
+    response = client.get('/download/running')
+    assert response.status_code == 200 and response.mimetype == 'application/zip'
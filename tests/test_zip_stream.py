@@ -0,0 +1,25 @@
+import io
+import zipfile
+from pathlib import Path
+import sys
+
+# Add the parent directory to path to import the module
+sys.path.append(str(Path(__file__).parent.parent))
+from zip_stream import stream_zip
+
+def test_stream_zip_produces_stored_archive_in_small_chunks(tmp_path):
+    """The archive is valid, uncompressed and never yields more than a chunk plus headers at once."""
+    files = {}
+    for index in range(3):
+        path = tmp_path / f'{index + 1:02d} Track.mp3'
+        path.write_bytes(bytes([index]) * 50000)
+        files[path.name] = path
+
+    chunks = list(stream_zip(((name, str(path)) for name, path in files.items()), chunk_size=4096))
+
+    assert max(len(chunk) for chunk in chunks) < 4096 + 1024
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+    assert archive.testzip() is None
+    for info in archive.infolist():
+        assert info.compress_type == zipfile.ZIP_STORED
+        assert archive.read(info) == files[info.filename].read_bytes()
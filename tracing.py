@@ -0,0 +1,254 @@
+"""
+Structured logging, nested timing spans and optional per-job profiling.
+
+Log calls take structured fields (``log.info('Embedded lyrics', track=3)``)
+that are rendered as ``key=value`` pairs or as JSON lines. Spans nest through
+a context variable (job -> album/fetch/embed, with parse below fetch; track
+spans carry a track_number); outside a traced job they are a no-op unless
+debug logging is enabled, so the hot path costs almost nothing when tracing
+is off.
+
+A trace started with ``memory=True`` also records, for every span, the peak
+and the retained Python allocations (from tracemalloc) above the level at
+which the span started. tracemalloc and its peak are process-wide, so
+memory-traced jobs run one at a time: a second one waits for the first to
+finish. Jobs traced without memory still run alongside and are counted in
+the figures.
+"""
+
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+LOGGER_NAME = 'lyrics'
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('lyrics_span', default=None)
+
+# Held by a memory-traced job for its whole duration (re-entrant for nested traces)
+_memory_lock = threading.RLock()
+# Memory traces running, and whether the first one started tracemalloc
+_memory_traces = 0
+_memory_started = False
+
+class StructuredFormatter(logging.Formatter):
+    """Append structured fields to the message as key=value pairs."""
+
+    def format(self, record):
+        message = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            message += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return message
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per log record."""
+
+    def format(self, record):
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger adapter that turns keyword arguments into structured fields."""
+
+    def log(self, level, msg, *args, exc_info=None, **fields):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, *args, exc_info=exc_info, extra={'fields': fields})
+
+    def debug(self, msg, *args, **fields):
+        self.log(logging.DEBUG, msg, *args, **fields)
+
+    def info(self, msg, *args, **fields):
+        self.log(logging.INFO, msg, *args, **fields)
+
+    def warning(self, msg, *args, **fields):
+        self.log(logging.WARNING, msg, *args, **fields)
+
+    def error(self, msg, *args, **fields):
+        self.log(logging.ERROR, msg, *args, **fields)
+
+    def exception(self, msg, *args, **fields):
+        self.log(logging.ERROR, msg, *args, exc_info=True, **fields)
+
+def get_logger(name: Optional[str] = None) -> StructuredLogger:
+    """Get a structured logger below the ``lyrics`` namespace."""
+    full_name = f'{LOGGER_NAME}.{name}' if name else LOGGER_NAME
+    return StructuredLogger(logging.getLogger(full_name), {})
+
+def configure_logging(level: Optional[str] = None, fmt: str = '%(asctime)s %(levelname)s %(name)s: %(message)s') -> None:
+    """Send ``lyrics`` logs to stdout.
+
+    The level defaults to LYRICS_LOG_LEVEL (INFO when unset), and setting
+    LYRICS_LOG_FORMAT=json switches to JSON lines.
+    """
+    level = (level or os.environ.get('LYRICS_LOG_LEVEL', 'INFO')).upper()
+    handler = logging.StreamHandler(sys.stdout)
+    if os.environ.get('LYRICS_LOG_FORMAT', '').lower() == 'json':
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(StructuredFormatter(fmt))
+    root = logging.getLogger(LOGGER_NAME)
+    root.handlers = [handler]
+    root.setLevel(level)
+    root.propagate = False
+
+log = get_logger('tracing')
+
+class Span:
+    """A timed, named section of work with child spans.
+
+    When memory is tracked, peak_bytes and retained_bytes are the highest and
+    the final traced allocations while the span ran, relative to its start.
+    """
+    __slots__ = ('name', 'attrs', 'parent', 'children', 'start', 'duration',
+                 'memory', 'memory_start', 'memory_peak', 'peak_bytes', 'retained_bytes')
+
+    def __init__(self, name: str, attrs: dict, parent: Optional['Span'], memory: bool = False):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []
+        self.duration = None
+        self.memory = (memory or (parent is not None and parent.memory)) and tracemalloc.is_tracing()
+        self.peak_bytes = None
+        self.retained_bytes = None
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # Resetting the peak would hide the parent's peak so far; keep it on the parent
+            if parent is not None and parent.memory:
+                parent.memory_peak = max(parent.memory_peak, peak)
+            tracemalloc.reset_peak()
+            self.memory_start = self.memory_peak = current
+        if parent is not None:
+            parent.children.append(self)
+        self.start = time.perf_counter()
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self.start
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak_bytes = max(self.memory_peak, peak) - self.memory_start
+            self.retained_bytes = current - self.memory_start
+            if self.parent is not None and self.parent.memory:
+                self.parent.memory_peak = max(self.parent.memory_peak, peak)
+
+    def to_dict(self) -> dict:
+        result = {
+            'name': self.name,
+            **self.attrs,
+            'duration_ms': round((self.duration or 0) * 1000, 3),
+        }
+        if self.peak_bytes is not None:
+            result['peak_kib'] = round(self.peak_bytes / 1024, 1)
+            result['retained_kib'] = round(self.retained_bytes / 1024, 1)
+        result['children'] = [child.to_dict() for child in self.children]
+        return result
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+@contextmanager
+def span(name: str, _root: bool = False, _memory: bool = False, **attrs):
+    """Time a block as a child of the current span.
+
+    Yields the Span, or None when there is no enclosing trace and debug
+    logging is off.
+    """
+    parent = _current_span.get()
+    if parent is None and not _root and not log.logger.isEnabledFor(logging.DEBUG):
+        yield None
+        return
+    current = Span(name, attrs, parent, memory=_memory)
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        current.finish()
+        _current_span.reset(token)
+        log.debug('span', span=name, duration_ms=round(current.duration * 1000, 3), **attrs)
+
+@contextmanager
+def trace(name: str, memory: bool = False, **attrs):
+    """Start a root span that is always recorded, e.g. for a whole job.
+
+    With memory=True, tracemalloc is started for the duration of the trace
+    (unless it already runs) and every span records its memory use. Memory
+    traces wait for each other, so that concurrent jobs neither reset each
+    other's peaks nor stop tracemalloc under each other.
+    """
+    if not memory:
+        with span(name, _root=True, **attrs) as root:
+            yield root
+        return
+    global _memory_traces, _memory_started
+    with _memory_lock:
+        if _memory_traces == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _memory_started = True
+        _memory_traces += 1
+        try:
+            with span(name, _root=True, _memory=True, **attrs) as root:
+                yield root
+        finally:
+            _memory_traces -= 1
+            if _memory_traces == 0 and _memory_started:
+                tracemalloc.stop()
+                _memory_started = False
+
+def memory_by_stage(root: Span) -> Dict[str, dict]:
+    """Highest peak and total retained memory in KiB per span name below a traced root."""
+    stages = defaultdict(lambda: {'spans': 0, 'peak_kib': 0.0, 'retained_kib': 0.0})
+
+    def visit(current: Span):
+        for child in current.children:
+            if child.peak_bytes is not None:
+                stage = stages[child.name]
+                stage['spans'] += 1
+                stage['peak_kib'] = max(stage['peak_kib'], round(child.peak_bytes / 1024, 1))
+                stage['retained_kib'] = round(stage['retained_kib'] + child.retained_bytes / 1024, 1)
+            visit(child)
+
+    visit(root)
+    return dict(stages)
+
+def save_trace(root: Span, path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(root.to_dict(), f, indent=2, default=str)
+
+@contextmanager
+def profiled(output_path: str, enabled: bool = True):
+    """Profile a block with cProfile and save the stats next to the job results.
+
+    Writes ``output_path`` (loadable with pstats or snakeviz) and a
+    ``.txt`` report of the most expensive calls.
+    """
+    if not enabled:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_path)
+        with open(output_path + '.txt', 'w', encoding='utf-8') as f:
+            pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(40)
+        log.info('Profile saved', path=output_path)
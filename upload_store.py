@@ -0,0 +1,111 @@
+"""
+Content-addressed store for uploaded audio files.
+
+Files are identified by the SHA-256 of their content. The browser asks which
+hashes the server already holds and uploads only the missing ones, in chunks
+appended to a partial file. An interrupted upload resumes from the size of the
+partial file, which is the last acknowledged offset.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+from typing import Optional
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+COPY_BUFFER_SIZE = 1024 * 1024
+LOCK_STRIPES = 64
+
+class UploadError(Exception):
+    """Raised when a chunk cannot be accepted."""
+
+    def __init__(self, message: str, offset: int = 0):
+        super().__init__(message)
+        self.offset = offset
+
+def is_valid_sha256(value: str) -> bool:
+    return bool(value) and bool(SHA256_PATTERN.match(value))
+
+def file_sha256(path: str) -> str:
+    """Hash a file without loading it into memory."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class UploadStore:
+    """Completed uploads live in ``objects/<sha256>``, unfinished ones in ``partial/``."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.partial_dir = os.path.join(root, 'partial')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.partial_dir, exist_ok=True)
+        # A fixed set of lock stripes, so that hashes clients send do not grow a lock table
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def _lock_for(self, sha256: str) -> threading.Lock:
+        return self._locks[hash(sha256) % LOCK_STRIPES]
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_dir, sha256)
+
+    def partial_path(self, sha256: str) -> str:
+        return os.path.join(self.partial_dir, sha256 + '.part')
+
+    def has(self, sha256: str) -> bool:
+        return is_valid_sha256(sha256) and os.path.exists(self.object_path(sha256))
+
+    def status(self, sha256: str) -> dict:
+        """Report whether a file is present and how much of it was already received."""
+        if self.has(sha256):
+            return {'sha256': sha256, 'status': 'present', 'offset': os.path.getsize(self.object_path(sha256))}
+        partial = self.partial_path(sha256)
+        if os.path.exists(partial):
+            return {'sha256': sha256, 'status': 'partial', 'offset': os.path.getsize(partial)}
+        return {'sha256': sha256, 'status': 'missing', 'offset': 0}
+
+    def write_chunk(self, sha256: str, size: int, offset: int, stream) -> dict:
+        """Append a chunk read from a file-like stream at the given offset.
+
+        The offset has to match the bytes already received; otherwise an
+        UploadError carrying the current offset is raised so the client can
+        resume from there. When the last byte arrives the content is verified
+        against its hash and moved into the store.
+        """
+        if not is_valid_sha256(sha256):
+            raise UploadError('Invalid content hash')
+        with self._lock_for(sha256):
+            if self.has(sha256):
+                return {'sha256': sha256, 'offset': size, 'complete': True}
+            partial = self.partial_path(sha256)
+            received = os.path.getsize(partial) if os.path.exists(partial) else 0
+            if offset != received:
+                raise UploadError(f'Expected offset {received}, got {offset}', received)
+            with open(partial, 'ab') as f:
+                for block in iter(lambda: stream.read(COPY_BUFFER_SIZE), b''):
+                    received += len(block)
+                    if received > size:
+                        break
+                    f.write(block)
+            if received > size:
+                os.truncate(partial, offset)
+                raise UploadError('Chunk extends past the declared file size', offset)
+            if received < size:
+                return {'sha256': sha256, 'offset': received, 'complete': False}
+            if file_sha256(partial) != sha256:
+                os.remove(partial)
+                raise UploadError('Uploaded content does not match its hash')
+            os.replace(partial, self.object_path(sha256))
+            return {'sha256': sha256, 'offset': received, 'complete': True}
+
+    def materialize(self, sha256: str, dest_path: str) -> Optional[str]:
+        """Copy a stored file to a job's working path; the copy is what gets tagged."""
+        if not self.has(sha256):
+            return None
+        shutil.copyfile(self.object_path(sha256), dest_path)
+        return dest_path
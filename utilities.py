@@ -5,6 +5,11 @@ import os
 from providers.factory import ProviderFactory
 from providers.base_provider import LyricsProvider
 from typing import Optional
+from metrics import TAG_READ_SECONDS
+from lyrics_embedder import MP3_SOURCE_KEY, M4A_SOURCE_KEY
+from tracing import get_logger
+
+log = get_logger('utilities')
 
 def get_track_number(file_path):
     """Extract track number from audio file metadata.
@@ -15,25 +20,52 @@ def get_track_number(file_path):
     Returns:
         int or None: Track number if found, None otherwise
     """
-    try:
-        if file_path.lower().endswith('.mp3'):
-            audio = MP3Tags(file_path)
-            if 'TRCK' in audio.tags:
-                # TRCK can be a string like '1/12' or just '1'
-                track = str(audio.tags['TRCK'][0]).split('/')[0]
-                if track.isdigit():
-                    return int(track)
-        elif file_path.lower().endswith('.m4a'):
-            audio = MP4Tags(file_path)
-            if 'trkn' in audio.tags:
-                # MP4 track number is stored as [(track_number, total_tracks)]
-                track_data = audio.tags['trkn'][0]
-                if track_data and track_data[0] > 0:
-                    return track_data[0]
-        return None
-    except Exception as e:
-        print(f"Error reading track number from {file_path}: {e}")
-        return None
+    with TAG_READ_SECONDS.time(format=os.path.splitext(file_path)[1].lower().lstrip('.')):
+        try:
+            if file_path.lower().endswith('.mp3'):
+                audio = MP3Tags(file_path)
+                if 'TRCK' in audio.tags:
+                    # TRCK can be a string like '1/12' or just '1'
+                    track = str(audio.tags['TRCK'][0]).split('/')[0]
+                    if track.isdigit():
+                        return int(track)
+            elif file_path.lower().endswith('.m4a'):
+                audio = MP4Tags(file_path)
+                if 'trkn' in audio.tags:
+                    # MP4 track number is stored as [(track_number, total_tracks)]
+                    track_data = audio.tags['trkn'][0]
+                    if track_data and track_data[0] > 0:
+                        return track_data[0]
+            return None
+        except Exception as e:
+            log.warning('Error reading track number', path=file_path, error=e)
+            return None
+
+def get_embedded_lyrics(file_path):
+    """Read the lyrics embedded in an audio file and the URL they came from.
+    
+    Args:
+        file_path (str): Path to the audio file
+        
+    Returns:
+        tuple: (lyrics, source_url), either of which is None when missing
+    """
+    with TAG_READ_SECONDS.time(format=os.path.splitext(file_path)[1].lower().lstrip('.')):
+        try:
+            if file_path.lower().endswith('.mp3'):
+                tags = MP3Tags(file_path).tags or {}
+                lyrics = next((str(tags[key]) for key in tags.keys() if key.startswith('USLT')), None)
+                source = str(tags[MP3_SOURCE_KEY].text[0]) if MP3_SOURCE_KEY in tags else None
+                return lyrics, source
+            elif file_path.lower().endswith('.m4a'):
+                tags = MP4Tags(file_path).tags or {}
+                lyrics = tags['\xa9lyr'][0] if '\xa9lyr' in tags else None
+                source = bytes(tags[M4A_SOURCE_KEY][0]).decode('utf-8') if M4A_SOURCE_KEY in tags else None
+                return lyrics, source
+            return None, None
+        except Exception as e:
+            log.warning('Error reading lyrics', path=file_path, error=e)
+            return None, None
 
 def ensure_media_directory() -> Path:
     """Ensure media directory exists and return its path."""
@@ -9,81 +9,330 @@ import os
 from flask import Flask, request, jsonify, Response, render_template
 import json
 import time
+from contextlib import ExitStack
+from dataclasses import asdict
 from providers.factory import ProviderFactory
+from providers.http import deadline
 from utilities import get_track_number, ensure_media_directory
-from lyrics_embedder import add_lyrics_to_audio
-from queue import Queue
-
-# Simple message queue for SSE
-class MessageAnnouncer:
-    def __init__(self):
-        self.listeners = []
-
-    def listen(self):
-        q = Queue()
-        self.listeners.append(q)
-        return q
-
-    def announce(self, msg):
-        for i in reversed(range(len(self.listeners))):
-            try:
-                self.listeners[i].put_nowait(msg)
-            except:
-                del self.listeners[i]
+from message_announcer import MessageAnnouncer, DEFAULT_CHANNEL, format_heartbeat, is_valid_channel_id
+from upload_store import UploadStore, UploadError, is_valid_sha256
+from zip_stream import stream_zip
+from workspace import Workspace, WorkspaceQuotaExceeded
+from metrics import REGISTRY, Gauge, SSE_DELIVERY_SECONDS
+from batch import BatchItem, BatchRunner
+from lyrics_store import LyricsStore
+from jobs import JobFiles
+from pipeline import AlbumPipeline
+from prefetch import Prefetcher
+from tracing import get_logger, configure_logging, span, trace, save_trace, profiled, memory_by_stage
+import parse_pool
+
+AUDIO_EXTENSIONS = ('.mp3', '.m4a')
+
+# Seconds between SSE heartbeats; a write to a dead connection ends its stream
+HEARTBEAT_INTERVAL = 15
+
+log = get_logger('web')
 
 announcer = MessageAnnouncer()
 
-def format_sse(data, event=None):
-    msg = []
-    if event is not None:
-        msg.append(f'event: {event}\n')
-    msg.append(f'data: {json.dumps(data)}\n\n')
-    return ''.join(msg)
+def announce_track_update(job_id, data):
+    """Send a track_update event; pending updates for the same track are coalesced."""
+    announcer.announce(data, 'track_update', channel_id=job_id,
+                       coalesce_key=('track_update', data.get('track_number')))
+
+def announce_pipeline_event(job_id, name, data):
+    """Turn album pipeline progress into the job's tracks and track_update events."""
+    if name == 'matched':
+        log.debug('Matched tracks', job=job_id, tracks=data['tracks'])
+        announcer.announce({'tracks': [{
+            'title': track.title,
+            'artist': track.artist,
+            'track_number': track.track_number,
+            'url': track.url,
+            'message': 'lyrics found...' if track.url and track.url.strip() else 'lyrics not found',
+            'status': 'found' if track.url and track.url.strip() else 'error',
+        } for track in data['tracks']]}, 'tracks', channel_id=job_id)
+        return
+    
+    progress = data['index'] / data['total'] * 100
+    if name == 'fetched':
+        track = data['track']
+        update = {'track_number': track.track_number, 'track_id': track.url.split('/')[-1], 'progress': progress}
+        info = data['info']
+        if info:
+            update.update(title=info.title, artist=info.artist, url=info.url, status='processing',
+                          message='Processing...')
+        else:
+            update.update(title=f'Track {track.track_number}', artist='', url='',
+                          status='timeout' if data.get('timed_out') else 'error', message=data['error'])
+        announce_track_update(job_id, update)
+    elif name == 'embedded':
+        info = data['info']
+        if data['success']:
+            log.debug('Lyrics embedded', job=job_id, filename=data['file']['filename'])
+        else:
+            log.warning('Failed to embed lyrics', job=job_id, filename=data['file']['filename'])
+        announce_track_update(job_id, {
+            'track_id': info.url.split('/')[-1],
+            'track_number': info.track_number,
+            'status': 'success' if data['success'] else 'error',
+            'message': 'Lyrics successfully embedded' if data['success'] else data['error'],
+            'url': info.url,
+            'track_title': info.title,
+            'artist': info.artist,
+            'progress': progress
+        })
+
+def parse_last_event_id(value):
+    """Parse a Last-Event-ID header or query value; None when absent or malformed."""
+    return int(value) if value and value.isdigit() else None
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 
 # Create uploads directory in the same folder as the script
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media')
+UPLOAD_FOLDER = os.environ.get('LYRICS_UPLOAD_FOLDER',
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media'))
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
 
+app.config['WORKSPACE_QUOTA'] = int(os.environ.get('LYRICS_WORKSPACE_QUOTA', 10 * 1024 * 1024 * 1024))  # 10GB
+app.config['JOB_TTL'] = int(os.environ.get('LYRICS_JOB_TTL', 24 * 60 * 60))  # 1 day
+app.config['LYRICS_CACHE_TTL'] = int(os.environ.get('LYRICS_CACHE_TTL', 6 * 60 * 60))  # 6 hours
+app.config['UPLOAD_CONCURRENCY'] = int(os.environ.get('LYRICS_UPLOAD_CONCURRENCY', 4))  # parallel browser uploads
+app.config['TRACE_MEMORY'] = os.environ.get('LYRICS_TRACE_MEMORY') == '1'  # per-stage tracemalloc figures
+app.config['PREFETCH_WORKERS'] = int(os.environ.get('LYRICS_PREFETCH_WORKERS', 4))  # pages scraped ahead of uploads
+app.config['PREFETCH_TTL'] = int(os.environ.get('LYRICS_PREFETCH_TTL', 10 * 60))  # 10 minutes
+app.config['PARSE_PROCESSES'] = int(os.environ.get('LYRICS_PARSE_PROCESSES', 0))  # 0 parses pages in the request thread
+app.config['ATTACHMENT_TTL'] = int(os.environ.get('LYRICS_ATTACHMENT_TTL', 60 * 60))  # attached files of a job never processed
+app.config['JOB_DEADLINE'] = float(os.environ.get('LYRICS_JOB_DEADLINE', 5 * 60))  # time budget for an album's fetches
+
+# Content-addressed store for deduplicated, resumable uploads
+upload_store = UploadStore(os.path.join(UPLOAD_FOLDER, '.store'))
+
+# Quota, TTL and LRU eviction for job folders and stored uploads. Job folders
+# live in their own subfolder, so that the library, journals and indexes the
+# CLI keeps in the media folder are never expired or evicted
+workspace = Workspace(
+    os.path.join(UPLOAD_FOLDER, 'jobs'),
+    quota_bytes=app.config['WORKSPACE_QUOTA'],
+    ttl=app.config['JOB_TTL'],
+    nested=(upload_store.objects_dir, upload_store.partial_dir)
+)
+
+# Files uploaded in parallel and analyzed before their job is processed
+job_files = JobFiles()
+
+# Scraped results served by the read-only lyrics API
+lyrics_store = LyricsStore(ttl=app.config['LYRICS_CACHE_TTL'])
+
+# Albums scraped in the background while their job's files are uploading
+prefetcher = Prefetcher(workers=app.config['PREFETCH_WORKERS'], ttl=app.config['PREFETCH_TTL'])
+
+Gauge('lyrics_sse_listeners', 'Connected SSE listeners.', callback=announcer.listener_count)
+Gauge('lyrics_sse_queue_depth', 'Undelivered SSE events across all listeners.', callback=announcer.queue_depth)
+Gauge('lyrics_workspace_used_bytes', 'Bytes used by job folders and stored uploads.', callback=lambda: workspace.used_bytes)
+Gauge('lyrics_store_entries', 'Results held by the lyrics API store.', callback=lambda: len(lyrics_store))
+Gauge('lyrics_prefetch_jobs', 'Jobs with an album prefetch registered.', callback=lambda: len(prefetcher))
+
+def quota_exceeded_response(error):
+    return jsonify({'success': False, 'error': f'Server storage is full, please try again later. {error}'}), 507
+
+def analyze_file(job_id, job_folder, filename, save):
+    """Save one incoming file into the job folder and read its track number.
+
+    Returns (track_number, info): info has the path, filename and size of a
+    track, or the filename and error when there is no usable track number.
+    """
+    upload_path = os.path.join(job_folder, filename)
+    log.debug('Saving file', job=job_id, path=upload_path)
+    with span('save', filename=filename):
+        save(upload_path)
+    
+    # Verify file was saved
+    if not os.path.exists(upload_path):
+        error_msg = f"ERROR: {filename} was not saved successfully"
+        log.error(error_msg, job=job_id)
+        return None, {'filename': filename, 'error': error_msg}
+    
+    # Extract track number from metadata
+    with span('read_track_number', filename=filename):
+        track_number = get_track_number(upload_path)
+    if track_number is None:
+        error_msg = f"No track number found in metadata"
+        log.warning(error_msg, job=job_id, filename=filename)
+        # Remove the file since it doesn't have a track number
+        os.remove(upload_path)
+        return None, {'filename': filename, 'error': error_msg}
+    file_size = os.path.getsize(upload_path)
+    log.debug('Track uploaded', job=job_id, filename=filename, track=track_number, size=file_size)
+    return track_number, {'path': upload_path, 'filename': filename, 'size': file_size}
+
+def release_abandoned_attachments():
+    """Unpin the folders of jobs whose attached files were never processed, so they can expire."""
+    for job_id in job_files.expire(app.config['ATTACHMENT_TTL']):
+        log.info('Attached files abandoned', job=job_id)
+        workspace.finish_job(job_id)
+
+def track_analysis(tracks_uploaded_dictionary, files_without_track_numbers, job_folder):
+    """The track_analysis event: files with a track number first, then the rest."""
+    unified_tracks = []
+    
+    # Add valid tracks with 'processing' status
+    for num, info in sorted(tracks_uploaded_dictionary.items()):
+        unified_tracks.append({
+            'track_number': num,
+            'filename': info['filename'],
+            'size': info['size'],
+            'status': 'uploaded',
+            'message': 'File uploaded'
+        })
+    
+    # Add invalid tracks with error status
+    for track in files_without_track_numbers:
+        unified_tracks.append({
+            'track_number': track.get('track_number'),
+            'filename': track['filename'],
+            'size': 0,
+            'status': 'error',
+            'message': track.get('message', 'File does not have a track number in its metadata')
+        })
+    
+    return {
+        'success': True,
+        'tracks': unified_tracks,
+        'upload_dir': job_folder
+    }
+
+def track_upload(sha256):
+    """Update workspace accounting for a stored or partially uploaded file."""
+    for path in (upload_store.object_path(sha256), upload_store.partial_path(sha256)):
+        if os.path.exists(path):
+            workspace.track(path)
+        else:
+            workspace.forget(path)
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', upload_concurrency=app.config['UPLOAD_CONCURRENCY'])
 
 @app.route('/stream')
 def stream():
+    channel_id = request.args.get('job', DEFAULT_CHANNEL)
+    if not is_valid_channel_id(channel_id):
+        return jsonify({'success': False, 'error': 'Invalid job id'}), 400
+    last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID', request.args.get('last_event_id')))
+
     def generate():
-        print("\n=== New SSE Connection Established ===")
-        queue = announcer.listen()
+        log.debug('SSE connection established', job=channel_id)
+        listener = announcer.listen(channel_id, last_event_id)
         try:
-            while True:
-                msg = queue.get()
-                print(f"Sending SSE message: {msg[:100]}...")  # Print first 100 chars of message
-                yield msg
+            yield f'retry: {HEARTBEAT_INTERVAL * 1000}\n\n'
+            while not listener.closed:
+                event = listener.get(timeout=HEARTBEAT_INTERVAL)
+                if event is None:
+                    yield format_heartbeat()
+                    continue
+                SSE_DELIVERY_SECONDS.observe(time.monotonic() - event.published)
+                yield event.encode()
         except GeneratorExit:
-            print("SSE Client disconnected")
+            log.debug('SSE client disconnected', job=channel_id)
         except Exception as e:
-            print(f"Error in SSE stream: {e}")
+            log.warning('Error in SSE stream', job=channel_id, error=e)
+        finally:
+            announcer.unlisten(listener)
     
     response = Response(generate(), mimetype='text/event-stream')
     response.headers.add('Cache-Control', 'no-cache')
     response.headers.add('Connection', 'keep-alive')
+    response.headers.add('X-Accel-Buffering', 'no')
     return response
 
+@app.route('/upload/handshake', methods=['POST'])
+def upload_handshake():
+    """Tell the client which files (by content hash) still need to be uploaded."""
+    data = request.get_json(silent=True) or {}
+    files = data.get('files')
+    if not isinstance(files, list) or not files:
+        return jsonify({'success': False, 'error': 'No files provided'}), 400
+    statuses = []
+    for file in files:
+        sha256 = str(file.get('sha256', '')).lower() if isinstance(file, dict) else ''
+        if not is_valid_sha256(sha256):
+            return jsonify({'success': False, 'error': 'Invalid content hash'}), 400
+        status = upload_store.status(sha256)
+        if status['status'] == 'present':
+            workspace.touch(upload_store.object_path(sha256))
+        statuses.append(status)
+    return jsonify({'success': True, 'files': statuses})
+
+@app.route('/upload/<sha256>', methods=['PUT'])
+def upload_chunk(sha256):
+    """Append one chunk of a file; offset and size are passed as query arguments."""
+    try:
+        offset = int(request.args.get('offset', ''))
+        size = int(request.args.get('size', ''))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'offset and size are required'}), 400
+    sha256 = sha256.lower()
+    chunk_size = request.content_length or 0
+    try:
+        workspace.reserve(chunk_size)
+    except WorkspaceQuotaExceeded as e:
+        return quota_exceeded_response(e)
+    try:
+        result = upload_store.write_chunk(sha256, size, offset, request.stream)
+    except UploadError as e:
+        # 409 lets the client resume from the offset the server actually holds
+        return jsonify({'success': False, 'error': str(e), 'offset': e.offset}), 409
+    finally:
+        workspace.release(chunk_size)
+        if is_valid_sha256(sha256):
+            track_upload(sha256)
+    return jsonify({'success': True, **result})
+
 @app.route('/process', methods=['POST'], strict_slashes=False)
 def process_files():
+    reserved_bytes = 0
+    job_folder = None
+    job_trace = None
+    profile = False
+    trace_memory = app.config['TRACE_MEMORY']
+    stack = ExitStack()
     try:
-        # Check if files were uploaded
-        if 'files' not in request.files:
-            return jsonify({'success': False, 'error': 'No files provided'}), 400
-        # List the uploaded files
-        files = request.files.getlist('files')
-        if not files or len(files) == 0:
-            return jsonify({'success': False, 'error': 'No files provided'}), 400
+        # Refuse uploads that cannot fit in the workspace before reading them
+        workspace.reserve(request.content_length or 0)
+        reserved_bytes += request.content_length or 0
         
+        # Time every stage of the job, from reading the request body on; with
+        # profile=1 the cProfile stats and the span tree are saved in the job folder
+        job_trace = stack.enter_context(trace('job', memory=trace_memory))
+        
+        # Files are either uploaded with the request or were sent beforehand
+        # through /upload and are referenced by content hash, or were attached
+        # to the job one by one through /jobs/<job_id>/files
+        with span('upload', size=request.content_length or 0):
+            job_id = request.form.get('job_id') or ''
+            files = request.files.getlist('files')
+        job_trace.attrs['job_id'] = job_id
+        # Every job gets its own folder; a shared fallback id would let anyone download it
+        if not job_id:
+            return jsonify({'success': False, 'error': 'No job id provided'}), 400
+        if not is_valid_channel_id(job_id):
+            return jsonify({'success': False, 'error': 'Invalid job id'}), 400
+        release_abandoned_attachments()
+        
+        try:
+            stored_files = json.loads(request.form.get('uploads') or '[]')
+        except ValueError:
+            stored_files = None
+        if not isinstance(stored_files, list) or not all(isinstance(f, dict) for f in stored_files):
+            return jsonify({'success': False, 'error': 'Invalid uploads list'}), 400
+        if not files and not stored_files and not job_files.has(job_id):
+            return jsonify({'success': False, 'error': 'No files provided'}), 400
+
         url = request.form.get('url')
         if not url:
             return jsonify({'success': False, 'error': 'No URL provided'}), 400
@@ -92,95 +341,65 @@ def process_files():
         provider = ProviderFactory.get_provider_for_url(url)
         if not provider:
             return jsonify({'success': False, 'error': 'Unsupported URL. Please use a Genius or Musixmatch URL.'}), 400
+        # Reuse the album scraped while the files were uploading, if the job registered it
+        provider = prefetcher.provider_for(job_id, provider, url)
         
-        print("\n=== Processing Request ===")
-        print(f"URL: {url}")
-        print(f"Provider: {type(provider).__name__}")
-        print(f"Files: {[f.filename for f in files]}")
+        incoming_files = [(os.path.basename(f.filename or ''), f.save) for f in files]
+        incoming_files += [
+            (os.path.basename(str(f.get('filename', ''))),
+             lambda path, sha256=str(f.get('sha256', '')).lower(): upload_store.materialize(sha256, path))
+            for f in stored_files
+        ]
         
-        tracks_uploaded_dictionary = {}
-        files_without_track_numbers = []
+        stored_bytes = sum(os.path.getsize(upload_store.object_path(str(f.get('sha256', '')).lower()))
+                           for f in stored_files if upload_store.has(str(f.get('sha256', '')).lower()))
+        workspace.reserve(stored_bytes)
+        reserved_bytes += stored_bytes
         
-        success_count = 0
-            
-        print("\n=== Processing Uploaded Files ===")
-        for i, file in enumerate(files, 1):
-            upload_path = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-            print(f"Saving file to: {upload_path}")
-            file.save(upload_path)
-            
-            # Verify file was saved
-            if not os.path.exists(upload_path):
-                error_msg = f"ERROR: {file.filename} was not saved successfully"
-                print(error_msg)
-                files_without_track_numbers.append({
-                    'filename': file.filename,
-                    'error': error_msg
-                })
-                continue
-            
-            # Extract track number from metadata
-            track_number = get_track_number(upload_path)
-            if track_number is None:
-                error_msg = f"No track number found in metadata"
-                print(f"{file.filename}: {error_msg}")
-                files_without_track_numbers.append({
-                    'filename': file.filename,
-                    'error': error_msg
-                })
-                # Remove the file since it doesn't have a track number
-                os.remove(upload_path)
-            else:
-                file_size = os.path.getsize(upload_path)
-                print(f"{file.filename}: Track {track_number}, Size: {file_size} bytes")
-                tracks_uploaded_dictionary[track_number] = {
-                    'path': upload_path,
-                    'filename': file.filename,
-                    'size': file_size
-                }
+        log.info('Processing request', job=job_id, url=url, provider=provider.name, files=len(incoming_files))
+        log.debug('Request files', job=job_id, files=[filename for filename, _ in incoming_files])
         
-        # Sort tracks by track number
-        sorted_tracks = dict(sorted(tracks_uploaded_dictionary.items()))
+        # Each job works on its own copy of the files, pinned while it runs
+        job_folder = workspace.job_dir(job_id)
         
-        # Prepare unified tracks list with status information
-        unified_tracks = []
+        profile = request.form.get('profile') == '1'
+        job_trace.attrs['provider'] = provider.name
+        stack.enter_context(profiled(os.path.join(job_folder, 'profile.prof'), enabled=profile))
         
-        # Add valid tracks with 'processing' status
-        for num, info in sorted_tracks.items():
-            unified_tracks.append({
-                'track_number': num,
-                'filename': info['filename'],
-                'size': info['size'],
-                'status': 'uploaded',
-                'message': 'File uploaded'
-            })
-        
-        # Add invalid tracks with error status
-        for track in files_without_track_numbers:
-            unified_tracks.append({
-                'track_number': None,
-                'filename': track['filename'],
-                'size': 0,
-                'status': 'error',
-                'message': 'File does not have a track number in its metadata'
-            })
+        # Files attached earlier were analyzed on arrival; report any that were removed since
+        attached_tracks, files_without_track_numbers = job_files.get(job_id)
+        tracks_uploaded_dictionary = {}
+        missing_files = []
+        for num, info in attached_tracks.items():
+            if os.path.exists(info['path']):
+                tracks_uploaded_dictionary[num] = info
+            else:
+                log.warning('Attached file is gone', job=job_id, filename=info['filename'])
+                missing_files.append({'filename': info['filename'], 'track_number': num,
+                                      'error': 'File not found',
+                                      'message': 'File was removed from the server before the job ran, please upload it again'})
+        files_without_track_numbers += missing_files
         
-        # Sort unified tracks by track number (valid tracks first, then invalid)
-        unified_tracks.sort(key=lambda x: (x['track_number'] is None, x['track_number']))
+        for i, (filename, save) in enumerate(incoming_files, 1):
+            if not filename:
+                files_without_track_numbers.append({'filename': f'File {i}', 'error': 'Missing file name'})
+                continue
+            track_number, info = analyze_file(job_id, job_folder, filename, save)
+            if track_number is None:
+                files_without_track_numbers.append(info)
+            else:
+                tracks_uploaded_dictionary[track_number] = info
         
         # Prepare response data with unified tracks list
-        response_data = {
-            'success': True,
-            'tracks': unified_tracks,
-            'upload_dir': app.config['UPLOAD_FOLDER']
-        }
+        response_data = track_analysis(tracks_uploaded_dictionary, files_without_track_numbers, job_folder)
         
         # Send the track information to the client
-        print("\n=== Sending Track Information via SSE ===")
-        sse_message = format_sse(response_data, 'track_analysis')
-        print(f"Message: {sse_message}")
-        announcer.announce(sse_message)
-        print("Track information sent to client")
+        announcer.announce(response_data, 'track_analysis', channel_id=job_id)
+        for missing in missing_files:
+            announce_track_update(job_id, {'track_number': missing['track_number'], 'title': missing['filename'],
+                                           'artist': '', 'url': '', 'status': 'error', 'message': missing['message']})
+        log.info('Track analysis sent', job=job_id, tracks=len(tracks_uploaded_dictionary),
+                 without_track_number=len(files_without_track_numbers))
         
         # If no tracks with track numbers were found, return early
         if not tracks_uploaded_dictionary:
@@ -190,188 +409,269 @@ def process_files():
                 'details': response_data
             }), 400
         
-        # Fetch the list of urls for tracks lyrics from the album
-        print("\n=== Fetching Album Tracks ===")
-        unprocessed_track_info_list = provider.get_track_info_without_lyrics_list_from_album(url)
-        if not unprocessed_track_info_list:
+        # Fetch lyrics and embed them as they arrive, streaming progress to the client
+        pipeline = AlbumPipeline(provider, on_event=lambda name, data: announce_pipeline_event(job_id, name, data))
+        with deadline(app.config['JOB_DEADLINE'] or None):
+            result = pipeline.run(url, tracks_uploaded_dictionary)
+        if not result.album_tracks:
             return jsonify({'success': False, 'error': 'No tracks found for this album URL'}), 404
-        
-        # Create a list of track info that match the track numbers
-        matched_unprocessed_track_info_list = []
-        for unprocessed_track_info in unprocessed_track_info_list:
-            track_number = unprocessed_track_info.track_number
-            if track_number in tracks_uploaded_dictionary:
-                matched_unprocessed_track_info_list.append(unprocessed_track_info)
-        
-        # Print every unprocessed track_info from matched_unprocessed_track_info_list
-        for unprocessed_track_info in matched_unprocessed_track_info_list:
-            print(unprocessed_track_info)
-        
-        # Check if lyrics exist for each track and prepare track info with status
-        track_info_dicts = []
-        for track in matched_unprocessed_track_info_list:
-            # Try to get lyrics to verify they exist
-            status = 'found' if track.url and track.url.strip() else 'error'
-            message = 'lyrics found...' if status == 'found' else 'lyrics not found'
-            
-            track_info_dicts.append({
-                'title': track.title,
-                'artist': track.artist,
-                'track_number': track.track_number,
-                'url': track.url,
-                'message': message,
-                'status': status  # These tracks already passed initial validation
-            })
-        
-        # Send the list of album lyrics that matches the uploaded tracks to client
-        print("\n=== Sending Album Lyrics via SSE ===")
-        sse_message = format_sse({'tracks': track_info_dicts}, 'tracks')
-        print(f"Message: {sse_message}")
-        announcer.announce(sse_message)
-        print("Album lyrics sent to client")
-
-        # Process each track and send updates
-        processed_count = 0
-        at_least_one_lyric_successfully_processed = False
-        for i, matched_unprocessed_track_info in enumerate(matched_unprocessed_track_info_list):
-            processed_count += 1
-            track_id = matched_unprocessed_track_info.url.split('/')[-1]
-            track_number = matched_unprocessed_track_info.track_number
-            progress_number = (processed_count/len(matched_unprocessed_track_info_list))*100
-            # Simulate processing time
-            time.sleep(0.5)
-
-            # Process the track
-            try:
-                # First get track info to display
-                track_info = provider.get_track_info(matched_unprocessed_track_info.url, track_number)
-                if track_info:
-                    at_least_one_lyric_successfully_processed = True
-                    # Send processed update with track info
-                    update_msg = format_sse({
-                        'title': track_info.title,
-                        'artist': track_info.artist,
-                        'track_number': track_number,
-                        'url': track_info.url,
-                        'status': 'processing',
-                        'message': 'Processing...',
-                        'track_id': track_id,
-                        'progress': progress_number
-                    }, 'track_update')
-                    announcer.announce(update_msg)
-                    continue
-                
-                # If we get here, either track_info is None
-                error_msg = f'No lyric found for track {track_number}'
-                update_msg = format_sse({
-                    'title': f'Track {track_number}',
-                    'artist': '',
-                    'track_number': track_number,
-                    'url': '',
-                    'status': 'error',
-                    'track_id': track_id,
-                    'message': error_msg,
-                    'progress': progress_number
-                }, 'track_update')
-                announcer.announce(update_msg)
-            
-            except Exception as e:
-                error_msg = f'Error processing track {track_number}: {str(e)}'
-                track_info_dict = {
-                    'track_id': track_id,
-                    'status': 'error',
-                    'message': error_msg,
-                    'url': '',
-                    'title': f'Track {track_number}',
-                    'artist': '',
-                    'track_number': track_number,
-                    'progress': progress_number
-                }
-                update_msg = format_sse(track_info_dict, 'track_update')
-                announcer.announce(update_msg)
-        
-        if not at_least_one_lyric_successfully_processed:
+        if result.timed_out:
+            log.warning('Job time budget exceeded', job=job_id, timed_out=result.timed_out)
+        if not result.fetched:
             return jsonify({'success': False, 'error': 'No tracks were successfully processed'}), 404
-
-        for embedding_index, matched_unprocessed_track_info in enumerate(matched_unprocessed_track_info_list):
-            embedding_progress = ((embedding_index+1)/len(matched_unprocessed_track_info_list))*100
-            try:
-                matched_processed_track_info = provider.get_track_info(matched_unprocessed_track_info.url, matched_unprocessed_track_info.track_number)
-                lyrics = matched_processed_track_info.lyrics
-                if not lyrics:
-                    print(f"No lyrics found for track {matched_processed_track_info.track_number}")
-                    continue
-                # Get the saved file path from tracks_uploaded_dictionary
-                file_info = tracks_uploaded_dictionary.get(matched_processed_track_info.track_number)
-                if not file_info:
-                    print(f"File not found for track {matched_processed_track_info.track_number}")
-                    update_msg = format_sse({
-                        'track_id': track_id,
-                        'status': 'error',
-                        'track_number': matched_processed_track_info.track_number,
-                        'message': 'Failed to process track {matched_processed_track_info.track_number}',
-                        'url': matched_processed_track_info.url,
-                        'track_title': matched_processed_track_info.title,
-                        'artist': matched_processed_track_info.artist,
-                        'progress': embedding_progress
-                    }, 'track_update')
-                    announcer.announce(update_msg)
-                    continue
-                print(f"\n=== Processing file: {file_info['path']} ===")
-                print(f"Original size: {os.path.getsize(file_info['path'])} bytes")
-                success = add_lyrics_to_audio(file_info['path'], lyrics)
-                if success:
-                    success_count += 1
-                    print(f"Successfully embedded lyrics in {file_info['filename']}")
-                    update_msg = format_sse({
-                        'track_id': track_id,
-                        'track_number': matched_processed_track_info.track_number,
-                        'status': 'success',
-                        'message': f'Lyrics successfully embedded',
-                        'url': matched_processed_track_info.url,
-                        'track_title': matched_processed_track_info.title,
-                        'artist': matched_processed_track_info.artist,
-                        'progress': embedding_progress
-                    }, 'track_update')
-                    announcer.announce(update_msg)
-                else:
-                    print(f"Failed to embed lyrics in {file_info['filename']}")
-                    update_msg = format_sse({
-                        'track_id': track_id,
-                        'status': 'error',
-                        'track_number': matched_processed_track_info.track_number,
-                        'message': f'Failed to process {file_info["filename"]}',
-                        'url': matched_processed_track_info.url,
-                        'track_title': matched_processed_track_info.title,
-                        'artist': matched_processed_track_info.artist,
-                        'progress': embedding_progress
-                    }, 'track_update')
-                    announcer.announce(update_msg)
-            except FileNotFoundError:
-                print(f"File not found: {file_info['path']}")
+        
         # Small delay to ensure all messages are sent
         time.sleep(0.5)
-        print("-" * 50)
-        if success_count > 0:
-            return jsonify({'success': True, 'processed_count': processed_count, 'total_tracks': len(tracks_uploaded_dictionary), 'message': 'Lyrics embedded successfully', 'success_count': success_count}), 200
-        return jsonify({'success': False, 'processed_count': processed_count, 'total_tracks': len(tracks_uploaded_dictionary), 'message': 'Failed to embed lyrics', 'success_count': success_count}), 200
+        log.info('Job finished', job=job_id, success_count=result.embedded, total_tracks=len(tracks_uploaded_dictionary))
+        response = {
+            'processed_count': len(result.matched),
+            'total_tracks': len(tracks_uploaded_dictionary),
+            'success_count': result.embedded,
+            'timed_out_count': result.timed_out,
+        }
+        if result.embedded > 0:
+            return jsonify({'success': True, 'message': 'Lyrics embedded successfully', **response}), 200
+        return jsonify({'success': False, 'message': 'Failed to embed lyrics', **response}), 200
         
+    except WorkspaceQuotaExceeded as e:
+        return quota_exceeded_response(e)
     except Exception as e:
         error_msg = str(e)
-        print(f"Error: {error_msg}")
-        try:
-            # Try to send the error via SSE before returning
-            if 'track_id' in locals():
-                update_msg = format_sse({
-                    'track_id': track_id,
-                    'status': 'error',
-                    'message': f'Server error: {error_msg}'
-                }, 'track_update')
-                announcer.announce(update_msg)
-                time.sleep(0.5)  # Give time for message to be sent
-        except Exception as sse_error:
-            print(f"Error sending SSE error message: {sse_error}")
+        log.exception('Error processing request', error=error_msg)
         return jsonify({'success': False, 'error': f'Error processing request: {error_msg}'}), 500
+    finally:
+        stack.close()
+        if job_trace is not None:
+            job_id = job_trace.attrs.get('job_id')
+            log.info('Job timing', job=job_id, duration_ms=round(job_trace.duration * 1000, 1))
+            if job_trace.peak_bytes is not None:
+                log.info('Job memory', job=job_id, peak_kib=round(job_trace.peak_bytes / 1024, 1),
+                         retained_kib=round(job_trace.retained_bytes / 1024, 1),
+                         stages={name: stage['peak_kib'] for name, stage in memory_by_stage(job_trace).items()})
+            if job_folder and (profile or trace_memory):
+                save_trace(job_trace, os.path.join(job_folder, 'trace.json'))
+        workspace.release(reserved_bytes)
+        if job_folder:
+            job_files.discard(job_id)
+            prefetcher.discard(job_id)
+            workspace.finish_job(job_id)
+
+@app.route('/jobs/<job_id>/album', methods=['POST'])
+def register_album(job_id):
+    """Register a job's album URL before its files are uploaded.
+
+    Expects JSON {"url": ...}. The album track list and its track pages are
+    scraped in the background, and POST /process for the same job and URL
+    uses the results instead of fetching them again.
+    """
+    if not is_valid_channel_id(job_id):
+        return jsonify({'success': False, 'error': 'Invalid job id'}), 400
+    data = request.get_json(silent=True) or {}
+    url = str(data.get('url') or '').strip()
+    if not url:
+        return jsonify({'success': False, 'error': 'No URL provided'}), 400
+    provider = ProviderFactory.get_provider_for_url(url)
+    if not provider:
+        return jsonify({'success': False, 'error': 'Unsupported URL. Please use a Genius or Musixmatch URL.'}), 400
+    prefetcher.register(job_id, provider, url)
+    return jsonify({'success': True, 'job_id': job_id, 'url': url, 'provider': provider.name}), 202
+
+@app.route('/jobs/<job_id>/files', methods=['POST'])
+def attach_file(job_id):
+    """Add one file to a job and analyze it right away.
+
+    The file is sent as multipart field 'file', or as JSON {"filename", "sha256"}
+    referencing a file already in the upload store. The job's track_analysis
+    event is re-sent with every file that arrives, and POST /process with the
+    same job_id then embeds lyrics into all attached files.
+    """
+    if not is_valid_channel_id(job_id):
+        return jsonify({'success': False, 'error': 'Invalid job id'}), 400
+    release_abandoned_attachments()
+    upload = request.files.get('file')
+    if upload is not None:
+        filename = os.path.basename(upload.filename or '')
+        save = upload.save
+        size = request.content_length or 0
+    else:
+        data = request.get_json(silent=True) or {}
+        filename = os.path.basename(str(data.get('filename', '')))
+        sha256 = str(data.get('sha256', '')).lower()
+        if not is_valid_sha256(sha256) or not upload_store.has(sha256):
+            return jsonify({'success': False, 'error': 'File must be uploaded first'}), 400
+        save = lambda path: upload_store.materialize(sha256, path)
+        size = os.path.getsize(upload_store.object_path(sha256))
+    if not filename:
+        return jsonify({'success': False, 'error': 'Missing file name'}), 400
+    
+    reserved_bytes = 0
+    job_folder = None
+    try:
+        workspace.reserve(size)
+        reserved_bytes = size
+        # Stays pinned until the job is processed, or its attachments are abandoned
+        job_folder = workspace.job_dir(job_id)
+        track_number, info = analyze_file(job_id, job_folder, filename, save)
+        job_files.add(job_id, track_number, info)
+    except WorkspaceQuotaExceeded as e:
+        return quota_exceeded_response(e)
+    finally:
+        workspace.release(reserved_bytes)
+        if job_folder and not job_files.has(job_id):
+            workspace.finish_job(job_id)
+    
+    # Coalesced so that a slow listener only gets the latest full list
+    tracks, errors = job_files.get(job_id)
+    announcer.announce(track_analysis(tracks, errors, job_folder), 'track_analysis', channel_id=job_id,
+                       coalesce_key=('track_analysis',))
+    return jsonify({'success': True, 'filename': filename, 'track_number': track_number,
+                    'error': info.get('error')})
+
+@app.route('/batch', methods=['POST'])
+def process_batch():
+    """Embed lyrics for several albums whose files were sent through /upload.
+
+    Expects JSON {"job_id": ..., "albums": [{"url": ..., "uploads": [{"filename", "sha256"}]}]},
+    where the job id is required and names the job's own folder.
+    Each finished album is announced as an album_result event on the job's
+    stream, and the response is the full per-album and per-track report.
+    """
+    data = request.get_json(silent=True) or {}
+    job_id = data.get('job_id') or ''
+    albums = data.get('albums')
+    if not job_id:
+        return jsonify({'success': False, 'error': 'No job id provided'}), 400
+    if not is_valid_channel_id(job_id):
+        return jsonify({'success': False, 'error': 'Invalid job id'}), 400
+    if not isinstance(albums, list) or not albums or not all(isinstance(a, dict) for a in albums):
+        return jsonify({'success': False, 'error': 'No albums provided'}), 400
+    for album in albums:
+        album_uploads = album.get('uploads') or []
+        if not isinstance(album_uploads, list) or not all(isinstance(u, dict) for u in album_uploads):
+            return jsonify({'success': False, 'error': 'Invalid uploads list'}), 400
+    uploads = [u for album in albums for u in album.get('uploads') or []]
+    missing = [str(u.get('sha256', '')) for u in uploads if not upload_store.has(str(u.get('sha256', '')).lower())]
+    if missing:
+        return jsonify({'success': False, 'error': 'Files must be uploaded first', 'missing': missing}), 400
+    
+    stored_bytes = sum(os.path.getsize(upload_store.object_path(str(u['sha256']).lower())) for u in uploads)
+    reserved_bytes = 0
+    job_folder = None
+    try:
+        workspace.reserve(stored_bytes)
+        reserved_bytes = stored_bytes
+        job_folder = workspace.job_dir(job_id)
+        items = []
+        for index, album in enumerate(albums, 1):
+            # One folder per album so that file names from different albums cannot collide
+            album_folder = os.path.join(job_folder, f'album-{index}')
+            os.makedirs(album_folder, exist_ok=True)
+            paths = []
+            for upload in album.get('uploads') or []:
+                filename = os.path.basename(str(upload.get('filename', '')))
+                if not filename:
+                    continue
+                path = os.path.join(album_folder, filename)
+                upload_store.materialize(str(upload['sha256']).lower(), path)
+                paths.append(path)
+            items.append(BatchItem(str(album.get('url', '')), paths))
+        
+        runner = BatchRunner(album_deadline=app.config['JOB_DEADLINE'] or None,
+                             on_album=lambda report: announcer.announce(report, 'album_result', channel_id=job_id))
+        with trace('batch', job_id=job_id, albums=len(items)):
+            report = runner.run(items)
+        announcer.announce(report['summary'], 'batch_complete', channel_id=job_id)
+        return jsonify({'success': report['summary']['albums_succeeded'] > 0, **report})
+    except WorkspaceQuotaExceeded as e:
+        return quota_exceeded_response(e)
+    except Exception as e:
+        error_msg = str(e)
+        log.exception('Error processing batch', job=job_id, error=error_msg)
+        return jsonify({'success': False, 'error': f'Error processing batch: {error_msg}'}), 500
+    finally:
+        workspace.release(reserved_bytes)
+        if job_folder:
+            workspace.finish_job(job_id)
+
+@app.route('/download/<job_id>')
+def download_job(job_id):
+    """Stream a zip of the job's processed audio files."""
+    if not is_valid_channel_id(job_id):
+        return jsonify({'success': False, 'error': 'Invalid job id'}), 400
+    job_folder = workspace.job_path(job_id)
+    if not os.path.isdir(job_folder):
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    if workspace.is_pinned(job_folder):
+        return jsonify({'success': False, 'error': 'Job is still being processed'}), 409
+    # Batch jobs keep each album in its own subfolder
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(job_folder):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                path = os.path.join(dirpath, name)
+                entries.append((os.path.relpath(path, job_folder).replace(os.sep, '/'), path))
+    if not entries:
+        return jsonify({'success': False, 'error': 'No processed files for this job'}), 404
+    workspace.touch(job_folder)
+    
+    response = Response(stream_zip(entries), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="lyrics-{job_id}.zip"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def cached_lookup(kind, loader):
+    """Serve a stored lookup result with ETag and Cache-Control headers.
+
+    The loader gets the provider and the URL and returns a JSON-serializable
+    dict, or None when nothing was found.
+    """
+    url = (request.args.get('url') or '').strip()
+    if not url:
+        return jsonify({'success': False, 'error': 'No URL provided'}), 400
+    provider = ProviderFactory.get_provider_for_url(url)
+    if not provider:
+        return jsonify({'success': False, 'error': 'Unsupported URL. Please use a Genius or Musixmatch URL.'}), 400
+    result = lyrics_store.get_or_load(kind, url, lambda: loader(provider, url))
+    if result is None:
+        return jsonify({'success': False, 'error': f'No {kind} found for this URL'}), 404
+    response = jsonify(result.value)
+    response.set_etag(result.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = result.max_age
+    return response.make_conditional(request)
+
+def load_track(provider, url):
+    track_info = provider.get_track_info(url, None)
+    if not track_info or not track_info.lyrics:
+        return None
+    return asdict(track_info)
+
+def load_album(provider, url):
+    tracks = provider.get_track_info_without_lyrics_list_from_album(url)
+    if not tracks:
+        return None
+    return {'url': url, 'tracks': [asdict(track) for track in tracks]}
+
+@app.route('/api/lyrics')
+def api_lyrics():
+    """Lyrics and track info for a track URL, as TrackInfo JSON."""
+    return cached_lookup('lyrics', load_track)
+
+@app.route('/api/album')
+def api_album():
+    """Track list of an album URL, as a list of TrackInfo JSON without lyrics."""
+    return cached_lookup('album', load_album)
+
+@app.route('/metrics')
+def metrics():
+    """Expose metrics in the Prometheus text format."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/workspace')
+def workspace_stats():
+    """Report workspace disk usage and eviction counts."""
+    return jsonify({'success': True, **workspace.stats()})
 
 if __name__ == '__main__':
     # Create upload folder if it doesn't exist
@@ -384,7 +684,12 @@ if __name__ == '__main__':
     # Ensure media directory exists
     ensure_media_directory()
     
+    # Expire unused job folders and uploads in the background
+    workspace.start_cleanup()
+    
     # Run the Flask app
-    print("Starting Lyrics Embedder server...")
-    print(f"Temporary upload folder: {app.config['UPLOAD_FOLDER']}")
+    configure_logging()
+    log.info('Starting Lyrics Embedder server', upload_folder=app.config['UPLOAD_FOLDER'])
+    # Started here rather than at import, so that worker processes importing this module do not start their own
+    parse_pool.configure(app.config['PARSE_PROCESSES'])
     app.run(debug=True, host='0.0.0.0', port=5000)
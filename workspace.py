@@ -0,0 +1,216 @@
+"""
+Managed workspace for uploaded media.
+
+Tracks the disk usage of every job folder and stored upload and keeps the
+total under a byte quota. The workspace owns its root folder outright: every
+child of it is an entry that may be removed, so it must not be a folder that
+also holds anything else, such as the user's library. Entries that are not in use
+expire after a TTL, and when space is needed the least recently used ones are
+evicted first. Folders of running jobs are pinned and never evicted.
+"""
+
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+from tracing import get_logger
+
+log = get_logger('workspace')
+
+class WorkspaceQuotaExceeded(Exception):
+    """Raised when a write would not fit in the quota even after eviction."""
+
+@dataclass
+class WorkspaceEntry:
+    path: str
+    size: int
+    last_used: float
+    pinned: bool = False
+
+def path_size(path: str) -> int:
+    """Size in bytes of a file, or of every file below a directory."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+class Workspace:
+    """Quota, TTL and LRU eviction for job folders and stored uploads.
+
+    Args:
+        root: Folder of the job folders, used by nothing else; each direct
+            child is tracked as one entry
+        quota_bytes: Maximum total size of all entries
+        ttl: Seconds an unpinned entry may go unused before it is removed
+        nested: Folders, absolute or relative to root, whose children are
+            tracked individually (the upload store keeps one file per content hash)
+    """
+
+    def __init__(self, root: str, quota_bytes: int, ttl: float, nested: Iterable[str] = ()):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.ttl = ttl
+        self.nested = [os.path.join(root, path) for path in nested]
+        self.evictions = 0
+        self.expirations = 0
+        self.evicted_bytes = 0
+        self._entries: Dict[str, WorkspaceEntry] = {}
+        self._reserved = 0
+        self._lock = threading.RLock()
+        self._cleanup_thread: Optional[threading.Thread] = None
+        self.scan()
+
+    def scan(self) -> None:
+        """Rebuild the accounting from what is on disk."""
+        entries = {}
+        nested = set(self.nested)
+        os.makedirs(self.root, exist_ok=True)
+        for directory in [self.root] + self.nested:
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if path in nested or any(n.startswith(path + os.sep) for n in nested):
+                    continue
+                entries[path] = WorkspaceEntry(path, path_size(path), os.path.getmtime(path))
+        with self._lock:
+            for path, entry in entries.items():
+                previous = self._entries.get(path)
+                if previous:
+                    entry.pinned = previous.pinned
+                    entry.last_used = max(entry.last_used, previous.last_used)
+            self._entries = entries
+
+    @property
+    def used_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def track(self, path: str, pinned: Optional[bool] = None) -> None:
+        """Record the current size of an entry and mark it as just used."""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                entry = self._entries[path] = WorkspaceEntry(path, 0, time.time())
+            entry.size = path_size(path) if os.path.exists(path) else 0
+            entry.last_used = time.time()
+            if pinned is not None:
+                entry.pinned = pinned
+
+    def touch(self, path: str) -> None:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry:
+                entry.last_used = time.time()
+
+    def is_pinned(self, path: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(path)
+            return bool(entry and entry.pinned)
+
+    def forget(self, path: str) -> None:
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def job_path(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def job_dir(self, job_id: str) -> str:
+        """Create (or reuse) a job folder and pin it while the job runs."""
+        path = self.job_path(job_id)
+        os.makedirs(path, exist_ok=True)
+        self.track(path, pinned=True)
+        return path
+
+    def finish_job(self, job_id: str) -> None:
+        """Unpin a job folder so it can expire or be evicted."""
+        self.track(self.job_path(job_id), pinned=False)
+
+    def reserve(self, nbytes: int) -> None:
+        """Make room for nbytes, evicting least recently used entries if needed.
+
+        Raises:
+            WorkspaceQuotaExceeded: If the space cannot be freed
+        """
+        with self._lock:
+            needed = self.used_bytes + self._reserved + nbytes - self.quota_bytes
+            if needed > 0:
+                self._evict_lru(needed)
+            if self.used_bytes + self._reserved + nbytes > self.quota_bytes:
+                raise WorkspaceQuotaExceeded(
+                    f'Workspace quota of {self.quota_bytes} bytes reached ({self.used_bytes} bytes in use)')
+            self._reserved += nbytes
+
+    def release(self, nbytes: int) -> None:
+        """Return a reservation once the bytes were written and tracked."""
+        with self._lock:
+            self._reserved = max(0, self._reserved - nbytes)
+
+    def _remove(self, entry: WorkspaceEntry) -> None:
+        if os.path.isdir(entry.path):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        elif os.path.exists(entry.path):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+        self._entries.pop(entry.path, None)
+
+    def _evict_lru(self, needed: int) -> None:
+        candidates = sorted((e for e in self._entries.values() if not e.pinned), key=lambda e: e.last_used)
+        for entry in candidates:
+            if needed <= 0:
+                break
+            log.info('Evicting', path=entry.path, size=entry.size)
+            needed -= entry.size
+            self.evictions += 1
+            self.evicted_bytes += entry.size
+            self._remove(entry)
+
+    def expire(self) -> int:
+        """Remove unpinned entries that were not used within the TTL."""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [e for e in self._entries.values() if not e.pinned and e.last_used < cutoff]
+            for entry in expired:
+                self.expirations += 1
+                self.evicted_bytes += entry.size
+                self._remove(entry)
+        return len(expired)
+
+    def start_cleanup(self, interval: float = 60.0) -> None:
+        """Run expiry in a background daemon thread."""
+        if self._cleanup_thread and self._cleanup_thread.is_alive():
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.expire()
+                except Exception as e:
+                    log.error('Workspace cleanup failed', error=e)
+
+        self._cleanup_thread = threading.Thread(target=run, name='workspace-cleanup', daemon=True)
+        self._cleanup_thread.start()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'quota_bytes': self.quota_bytes,
+                'used_bytes': self.used_bytes,
+                'reserved_bytes': self._reserved,
+                'entries': len(self._entries),
+                'pinned_entries': sum(1 for e in self._entries.values() if e.pinned),
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'evicted_bytes': self.evicted_bytes,
+            }
@@ -0,0 +1,53 @@
+"""
+Streaming zip archives.
+
+Builds a zip on the fly while it is being sent, without a temporary archive
+on disk. Entries are stored uncompressed (audio does not compress further)
+and copied in fixed-size chunks, so memory use does not depend on the size of
+the album and the first bytes are available immediately.
+"""
+
+import io
+import zipfile
+from typing import Iterable, Iterator, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only, non-seekable sink that hands written bytes back to the caller.
+
+    Because it cannot seek, zipfile writes sizes and CRCs in data descriptors
+    after each entry instead of patching the local headers.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> Iterator[bytes]:
+        """Yield everything written since the last drain as a single chunk."""
+        if self._chunks:
+            data = b''.join(self._chunks)
+            self._chunks.clear()
+            yield data
+
+def stream_zip(entries: Iterable[Tuple[str, str]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a zip archive of (archive name, file path) entries chunk by chunk."""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for arcname, path in entries:
+            zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            zinfo.compress_type = zipfile.ZIP_STORED
+            with open(path, 'rb') as src, archive.open(zinfo, 'w') as dest:
+                for block in iter(lambda: src.read(chunk_size), b''):
+                    dest.write(block)
+                    yield from buffer.drain()
+            yield from buffer.drain()
+    yield from buffer.drain()